@@ -1,5 +1,15 @@
-from django.contrib import admin
-from .models import UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount, SocialVouch, SavingsDeposit
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils import timezone
+from . import savings_import
+from .models import (
+    UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount, SocialVouch, SavingsDeposit,
+    SavingsAccount, PricingPolicy, PricingTier, DailyPortfolioRollup
+)
 
 # ============================================
 # USER PROFILE ADMIN
@@ -10,7 +20,7 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number', 'national_id', 'current_credit_score', 'is_verified', 'account_created')
     list_filter = ('is_verified', 'employment_status', 'district')
     search_fields = ('user__username', 'phone_number', 'national_id')
-    readonly_fields = ('current_credit_score', 'last_score_update', 'account_created')
+    readonly_fields = ('current_credit_score', 'last_score_update', 'score_computed_at', 'account_created')
     fieldsets = (
         ('Personal Information', {
             'fields': ('user', 'phone_number', 'national_id', 'date_of_birth')
@@ -22,7 +32,7 @@ class UserProfileAdmin(admin.ModelAdmin):
             'fields': ('employment_status', 'monthly_income')
         }),
         ('Credit Information', {
-            'fields': ('current_credit_score', 'last_score_update', 'account_created', 'is_verified')
+            'fields': ('current_credit_score', 'last_score_update', 'score_computed_at', 'account_created', 'is_verified')
         }),
     )
     ordering = ('-current_credit_score',)
@@ -36,7 +46,7 @@ class MicroLoanAdmin(admin.ModelAdmin):
     list_display = ('user', 'amount', 'status', 'due_date', 'is_overdue', 'days_overdue', 'score_at_application')
     list_filter = ('status', 'due_date')
     search_fields = ('user__username',)
-    readonly_fields = ('applied_at', 'score_at_application', 'total_amount_due', 'amount_paid')
+    readonly_fields = ('applied_at', 'score_at_application', 'pricing_version', 'total_amount_due', 'amount_paid')
     fieldsets = (
         ('Loan Details', {
             'fields': ('user', 'amount', 'interest_rate', 'duration_days', 'total_amount_due')
@@ -45,17 +55,24 @@ class MicroLoanAdmin(admin.ModelAdmin):
             'fields': ('status', 'applied_at', 'approved_at', 'due_date', 'paid_at')
         }),
         ('Repayment', {
-            'fields': ('amount_paid', 'score_at_application')
+            'fields': ('amount_paid', 'score_at_application', 'pricing_version')
         }),
     )
     actions = ['mark_as_approved', 'mark_as_rejected']
 
     def mark_as_approved(self, request, queryset):
-        queryset.update(status='approved', approved_at=timezone.now())
+        now = timezone.now()
+        # update() skips the signals that keep the portfolio rollups current
+        DailyPortfolioRollup.mark_dirty(
+            [DailyPortfolioRollup.local_day(day) for day in queryset.values_list('approved_at', flat=True)]
+            + [DailyPortfolioRollup.local_day(now)])
+        queryset.update(status='approved', approved_at=now)
         self.message_user(request, "Selected loans have been approved.")
     mark_as_approved.short_description = "Mark selected loans as approved"
 
     def mark_as_rejected(self, request, queryset):
+        DailyPortfolioRollup.mark_dirty(
+            [DailyPortfolioRollup.local_day(day) for day in queryset.values_list('approved_at', flat=True)])
         queryset.update(status='rejected')
         self.message_user(request, "Selected loans have been rejected.")
     mark_as_rejected.short_description = "Mark selected loans as rejected"
@@ -127,8 +144,13 @@ class SocialVouchAdmin(admin.ModelAdmin):
 # SAVINGS DEPOSIT ADMIN
 # ============================================
 
+class StatementUploadForm(forms.Form):
+    statement = forms.FileField(help_text="CSV with an 'amount' column and a 'username' or 'phone_number' column")
+
+
 @admin.register(SavingsDeposit)
 class SavingsDepositAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/core/savingsdeposit/change_list.html'
     list_display = ('user', 'amount', 'deposit_date', 'balance_after')
     list_filter = ('deposit_date',)
     search_fields = ('user__username',)
@@ -140,4 +162,101 @@ class SavingsDepositAdmin(admin.ModelAdmin):
         ('Details', {
             'fields': ('deposit_date',)
         }),
-    )
\ No newline at end of file
+    )
+
+    def get_readonly_fields(self, request, obj=None):
+        # Posted transactions have already moved the user's SavingsAccount
+        if obj is not None:
+            return ('user', 'amount', *self.readonly_fields)
+        return self.readonly_fields
+
+    def get_urls(self):
+        return [
+            path('import-statement/', self.admin_site.admin_view(self.import_statement),
+                 name='core_savingsdeposit_import'),
+        ] + super().get_urls()
+
+    def import_statement(self, request):
+        """
+        Upload a mobile money statement CSV and import its deposits
+        """
+        form = StatementUploadForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            lines = io.TextIOWrapper(form.cleaned_data['statement'].file, encoding='utf-8-sig', newline='')
+            try:
+                report = savings_import.import_deposits(lines)
+            except (UnicodeDecodeError, ValueError) as e:
+                self.message_user(request, f"Import failed: {e}", level=messages.ERROR)
+            else:
+                self.message_user(request, (
+                    f"Imported {report['imported']} of {report['rows']} rows for {len(report['users'])} users "
+                    f"in {report['seconds']:.1f}s."
+                ))
+                for line_number, reason in report['rejected'][:20]:
+                    self.message_user(request, f"Line {line_number} rejected: {reason}", level=messages.WARNING)
+                return redirect('admin:core_savingsdeposit_changelist')
+        return render(request, 'admin/core/savingsdeposit/import_statement.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Import savings statement',
+        })
+
+
+@admin.register(SavingsAccount)
+class SavingsAccountAdmin(admin.ModelAdmin):
+    list_display = ('user', 'balance', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'balance', 'updated_at')  # Maintained from the ledger
+
+# ============================================
+# PRICING POLICY ADMIN
+# ============================================
+
+class PricingTierInline(admin.TabularInline):
+    model = PricingTier
+    extra = 0
+
+    # Tiers of a version that has been activated are frozen
+    def has_add_permission(self, request, obj=None):
+        return obj is None or obj.activated_at is None
+
+    def has_change_permission(self, request, obj=None):
+        return obj is None or obj.activated_at is None
+
+    def has_delete_permission(self, request, obj=None):
+        return obj is None or obj.activated_at is None
+
+@admin.register(PricingPolicy)
+class PricingPolicyAdmin(admin.ModelAdmin):
+    list_display = ('version', 'description', 'is_active', 'created_at', 'activated_at')
+    readonly_fields = ('is_active', 'created_at', 'activated_at')
+    inlines = [PricingTierInline]
+    actions = ['activate_policy']
+
+    def activate_policy(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one policy version to activate.", level='error')
+            return
+        policy = queryset.get()
+        policy.activate()
+        self.message_user(request, f"Pricing v{policy.version} is now active.")
+    activate_policy.short_description = "Activate selected pricing version"
+
+# ============================================
+# PORTFOLIO ROLLUP ADMIN
+# ============================================
+
+@admin.register(DailyPortfolioRollup)
+class DailyPortfolioRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'district', 'employment_status', 'loans_originated', 'amount_disbursed',
+                    'loans_defaulted', 'amount_repaid', 'revenue', 'amount_saved')
+    list_filter = ('employment_status', 'district')
+    date_hierarchy = 'day'
+
+    # Written by rollup_portfolio_daily only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
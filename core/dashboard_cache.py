@@ -0,0 +1,138 @@
+"""
+Per-section cache for the superuser dashboard.
+
+Each section (KPIs, ML prediction distribution, recent activity) is cached
+on its own with its own TTL. Keys carry a per-section generation token:
+invalidate() replaces the token, so a write to any model that feeds a
+section (wired up in signals.py, plus stored credit scores for the KPIs)
+retires every cached variant of it at once. The ML distribution scores the
+whole user base, so it follows only its TTL and the model version.
+
+With the default local-memory backend a process only sees its own
+invalidations and the TTL bounds staleness elsewhere; point CACHES at a
+shared backend to invalidate across processes.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+from . import dashboard_sections, kpis, loan_ml_predictor
+from .models import UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount, SocialVouch
+
+
+class Section:
+    def __init__(self, build, ttl, models, variant=None):
+        self.build = build
+        self.ttl = ttl
+        self.models = models            # Writes to these invalidate the section
+        self.variant = variant          # Extra key parts for the build arguments
+        self.hits = self.misses = self.rebuilds = self.invalidations = 0
+        self.rebuild_seconds = self.last_rebuild_seconds = 0.0
+
+
+def model_version(path=loan_ml_predictor.MODEL_PATH):
+    try:
+        return (path, *loan_ml_predictor.ModelRegistry._signature(path))
+    except FileNotFoundError:
+        return (path, 'missing')
+
+
+SECTIONS = {
+    'kpis': Section(
+        build=kpis.compute_kpis,
+        ttl=60,
+        models=(UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount, SocialVouch),
+    ),
+    'ml_distribution': Section(
+        build=loan_ml_predictor.prediction_distribution,
+        ttl=600,
+        # Rebuilding on every feature write would rescore everyone on nearly
+        # every dashboard load; a new model version gets a fresh key instead
+        models=(),
+        variant=model_version,
+    ),
+    'recent_activity': Section(
+        build=lambda: dashboard_sections.page('loans', {'limit': 5})['results'],
+        ttl=30,
+        models=(MicroLoan,),
+    ),
+}
+
+_lock = threading.Lock()
+
+
+def _generation(name):
+    key = f'dashboard:{name}:generation'
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def get(name, *args):
+    """
+    The cached value of section name (built with args), rebuilt on a miss
+    """
+    section = SECTIONS[name]
+    variant = section.variant(*args) if section.variant else args
+    key = ':'.join(str(part) for part in ('dashboard', name, _generation(name), *variant))
+    value = cache.get(key)
+    if value is not None:
+        with _lock:
+            section.hits += 1
+        return value
+
+    started = time.perf_counter()
+    value = section.build(*args)
+    elapsed = time.perf_counter() - started
+    cache.set(key, value, section.ttl)
+    with _lock:
+        section.misses += 1
+        section.rebuilds += 1
+        section.rebuild_seconds += elapsed
+        section.last_rebuild_seconds = elapsed
+    return value
+
+
+def invalidate(*names):
+    names = names or tuple(SECTIONS)
+    cache.set_many({f'dashboard:{name}:generation': uuid.uuid4().hex for name in names}, None)
+    with _lock:
+        for name in names:
+            SECTIONS[name].invalidations += 1
+
+
+def sections_for(model):
+    return [name for name, section in SECTIONS.items() if model in section.models]
+
+
+def stats():
+    """
+    {section: hits, misses, hit_ratio, rebuilds, avg/last rebuild ms,
+    invalidations, ttl} for this process
+    """
+    report = {}
+    for name, section in SECTIONS.items():
+        lookups = section.hits + section.misses
+        report[name] = {
+            'ttl': section.ttl,
+            'hits': section.hits,
+            'misses': section.misses,
+            'hit_ratio': round(section.hits / lookups, 3) if lookups else 0.0,
+            'rebuilds': section.rebuilds,
+            'avg_rebuild_ms': round(section.rebuild_seconds / section.rebuilds * 1000, 1) if section.rebuilds else 0.0,
+            'last_rebuild_ms': round(section.last_rebuild_seconds * 1000, 1),
+            'invalidations': section.invalidations,
+        }
+    return report
+
+
+def reset_stats():
+    with _lock:
+        for section in SECTIONS.values():
+            section.hits = section.misses = section.rebuilds = section.invalidations = 0
+            section.rebuild_seconds = section.last_rebuild_seconds = 0.0
@@ -0,0 +1,262 @@
+"""
+Keyset-paginated JSON sections of the superuser dashboard.
+
+Each section is a queryset plus the sorts and filters it accepts and a row
+serializer. A page is ordered by (sort field, pk) and the next page starts
+strictly after the last row's (value, pk), carried in an opaque cursor, so
+every page costs one indexed range query however deep it is.
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import BooleanField, DateField, Q
+
+from .models import UserProfile, MicroLoan, LoanPayment, SocialVouch, SavingsDeposit, MobileMoneyAccount
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class Section:
+    def __init__(self, queryset, sorts, default_sort, row, search=(), filters=None):
+        self.queryset = queryset
+        self.sorts = sorts            # {name: field path}, sortable both ways
+        self.default_sort = default_sort
+        self.row = row
+        self.search = search          # icontains lookups OR-ed together for ?q=
+        self.filters = filters or {}  # {query param: lookup}
+
+    @property
+    def model(self):
+        return self.queryset().model
+
+
+def field_for(model, path):
+    """
+    The model field at the end of a lookup path such as 'loan__user__username'
+    """
+    parts = path.split('__')
+    field = None
+    for part in parts:
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            break  # A lookup suffix such as 'gte'
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+
+def value_of(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def encode_cursor(value, pk):
+    # Full-precision isoformat: DjangoJSONEncoder would drop microseconds
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    The (value, pk) in a cursor from encode_cursor. Raises ValueError for
+    anything else, including well-formed JSON of the wrong shape.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(data, list) or len(data) != 2:
+        raise ValueError('invalid cursor')
+    value, pk = data
+    # bool is an int subclass but never a pk or a sort value
+    if type(pk) is not int or not (value is None or type(value) in (str, int, float)):
+        raise ValueError('invalid cursor')
+    return value, pk
+
+
+SECTIONS = {
+    'users': Section(
+        queryset=lambda: UserProfile.objects.select_related('user'),
+        sorts={'joined': 'account_created', 'score': 'current_credit_score', 'username': 'user__username'},
+        default_sort='-joined',
+        search=('user__username', 'user__email', 'phone_number', 'national_id'),
+        filters={
+            'district': 'district',
+            'employment_status': 'employment_status',
+            'min_score': 'current_credit_score__gte',
+            'max_score': 'current_credit_score__lte',
+        },
+        row=lambda p: {
+            'id': p.pk,
+            'username': p.user.username,
+            'email': p.user.email,
+            'phone_number': p.phone_number,
+            'national_id': p.national_id,
+            'district': p.district,
+            'village': p.village,
+            'credit_score': p.current_credit_score,
+            'employment_status': p.get_employment_status_display(),
+            'joined': p.account_created,
+        },
+    ),
+    'loans': Section(
+        queryset=lambda: MicroLoan.objects.select_related('user'),
+        sorts={'applied': 'applied_at', 'amount': 'amount'},
+        default_sort='-applied',
+        search=('user__username',),
+        filters={'status': 'status', 'since': 'applied_at__date__gte', 'until': 'applied_at__date__lte'},
+        row=lambda loan: {
+            'id': loan.pk,
+            'username': loan.user.username,
+            'amount': loan.amount,
+            'interest_rate': loan.interest_rate,
+            'status': loan.status,
+            'status_display': loan.get_status_display(),
+            'applied_at': loan.applied_at,
+        },
+    ),
+    'payments': Section(
+        queryset=lambda: LoanPayment.objects.select_related('loan__user'),
+        sorts={'date': 'payment_date', 'amount': 'amount'},
+        default_sort='-date',
+        search=('loan__user__username', 'transaction_reference'),
+        filters={
+            'method': 'payment_method',
+            'on_time': 'was_on_time',
+            'since': 'payment_date__date__gte',
+            'until': 'payment_date__date__lte',
+        },
+        row=lambda p: {
+            'id': p.pk,
+            'username': p.loan.user.username,
+            'loan_id': p.loan_id,
+            'amount': p.amount,
+            'payment_method': p.get_payment_method_display(),
+            'was_on_time': p.was_on_time,
+            'payment_date': p.payment_date,
+        },
+    ),
+    'savings': Section(
+        queryset=lambda: SavingsDeposit.objects.select_related('user'),
+        sorts={'date': 'deposit_date', 'amount': 'amount'},
+        default_sort='-date',
+        search=('user__username',),
+        filters={
+            'transaction_type': 'transaction_type',
+            'since': 'deposit_date__date__gte',
+            'until': 'deposit_date__date__lte',
+        },
+        row=lambda s: {
+            'id': s.pk,
+            'username': s.user.username,
+            'amount': s.amount,
+            'balance_after': s.balance_after,
+            'transaction_type': s.get_transaction_type_display(),
+            'deposit_date': s.deposit_date,
+        },
+    ),
+    'vouches': Section(
+        queryset=lambda: SocialVouch.objects.select_related('voucher', 'vouchee'),
+        sorts={'date': 'created_at', 'trust': 'trust_level'},
+        default_sort='-date',
+        search=('voucher__username', 'vouchee__username', 'relationship'),
+        filters={'trust_level': 'trust_level', 'active': 'is_active'},
+        row=lambda v: {
+            'id': v.pk,
+            'voucher': v.voucher.username,
+            'vouchee': v.vouchee.username,
+            'trust_level': v.trust_level,
+            'trust_level_display': v.get_trust_level_display(),
+            'relationship': v.relationship,
+            'is_active': v.is_active,
+            'created_at': v.created_at,
+        },
+    ),
+    'mobile_accounts': Section(
+        queryset=lambda: MobileMoneyAccount.objects.select_related('user'),
+        sorts={'created': 'created_at', 'transactions': 'transaction_count_30days'},
+        default_sort='-created',
+        search=('user__username', 'phone_number'),
+        filters={'provider': 'provider', 'verified': 'is_verified'},
+        row=lambda a: {
+            'id': a.pk,
+            'username': a.user.username,
+            'provider': a.get_provider_display(),
+            'phone_number': a.phone_number,
+            'is_verified': a.is_verified,
+            'transaction_count_30days': a.transaction_count_30days,
+            'created_at': a.created_at,
+        },
+    ),
+}
+
+
+def page(name, params):
+    """
+    One page of section name for the query params (a QueryDict or dict):
+    sort (a sort name, '-' for descending), q, the section's filters,
+    limit and cursor. Raises KeyError for an unknown section and
+    ValueError for bad parameters.
+    """
+    section = SECTIONS[name]
+    queryset = section.queryset()
+
+    sort = params.get('sort') or section.default_sort
+    descending = sort.startswith('-')
+    if sort.lstrip('-') not in section.sorts:
+        raise ValueError(f"unknown sort {sort!r}, expected one of {sorted(section.sorts)}")
+    field = section.sorts[sort.lstrip('-')]
+
+    try:
+        limit = min(max(int(params.get('limit') or PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+
+    try:
+        for param, lookup in section.filters.items():
+            value = params.get(param)
+            if value not in (None, ''):
+                field_type = DateField() if '__date__' in lookup else field_for(section.model, lookup)
+                if isinstance(field_type, BooleanField):
+                    value = value.capitalize()  # ?verified=true
+                queryset = queryset.filter(**{lookup: field_type.to_python(value)})
+
+        query = (params.get('q') or '').strip()
+        if query and section.search:
+            match = Q()
+            for lookup in section.search:
+                match |= Q(**{f'{lookup}__icontains': query})
+            queryset = queryset.filter(match)
+
+        cursor = params.get('cursor')
+        if cursor:
+            value, pk = decode_cursor(cursor)
+            value = field_for(section.model, field).to_python(value)
+            after = 'lt' if descending else 'gt'
+            queryset = queryset.filter(Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'pk__{after}': pk}))
+    except ValidationError as e:
+        raise ValueError('; '.join(e.messages))
+    except TypeError:
+        # A value of the wrong type for its field, such as a number for a date
+        raise ValueError('invalid cursor' if params.get('cursor') else 'invalid filter')
+
+    prefix = '-' if descending else ''
+    rows = list(queryset.order_by(f'{prefix}{field}', f'{prefix}pk')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(value_of(rows[-1], field), rows[-1].pk)
+    return {
+        'section': name,
+        'sort': sort,
+        'results': [section.row(obj) for obj in rows],
+        'next': next_cursor,
+    }
@@ -0,0 +1,159 @@
+"""
+NumPy inference for the loan approval random forest.
+
+ForestEngine.from_sklearn flattens every tree of a fitted
+RandomForestClassifier into shared node arrays (feature, threshold,
+left/right child, per-leaf class probabilities). predict_proba walks all
+trees for all rows together, one tree level per step, so one applicant
+costs a few dozen small array operations instead of sklearn's validation
+and per-tree dispatch.
+
+Probabilities are byte-identical to sklearn: inputs are compared as
+float32 like sklearn's trees do, leaf values are normalized the same way,
+and trees are summed in estimator order before dividing by their count.
+
+Saved engines are a directory of .npy files that load memory-mapped, so
+worker processes share the pages. Each save writes a new arrays-<stamp>
+subdirectory and then points meta.json at it, so files that running
+workers have mapped are never rewritten in place.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'leaf_proba', 'roots')
+META_FILE = 'meta.json'
+
+
+class ForestEngine:
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots, classes, n_features,
+                 source_signature=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = n_features
+        # ModelRegistry signature of the .pkl this was exported from
+        self.source_signature = tuple(source_signature) if source_signature else None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Flatten a fitted RandomForestClassifier (single output)
+        """
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            # Leaves point at themselves so finished rows stay put
+            nodes = np.arange(offset, offset + tree.node_count)
+            lefts.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            rights.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            # Normalized exactly as DecisionTreeClassifier.predict_proba does
+            value = tree.value[:, 0, :model.n_classes_]
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            probas.append(value / normalizer)
+            offset += tree.node_count
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            leaf_proba=np.ascontiguousarray(np.concatenate(probas), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=model.classes_,
+            n_features=model.n_features_in_,
+        )
+
+    def save(self, directory):
+        """
+        Write the arrays to a fresh subdirectory, then atomically replace
+        meta.json to point at it: readers key reloads on meta.json. The
+        previous version is kept for readers still loading it; older ones
+        are removed (unlinking keeps already-mapped pages valid).
+        """
+        os.makedirs(directory, exist_ok=True)
+        previous = self._read_meta(directory).get('arrays')
+        arrays = f'arrays-{time.time_ns():016x}'
+        os.makedirs(os.path.join(directory, arrays))
+        for name in ARRAYS:
+            np.save(os.path.join(directory, arrays, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'classes': self.classes_.tolist(),
+            'n_features': self.n_features_in_,
+            'n_trees': len(self.roots),
+            'arrays': arrays,
+            'source_signature': list(self.source_signature) if self.source_signature else None,
+        }
+        tmp = os.path.join(directory, META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(directory, META_FILE))
+
+        for entry in os.listdir(directory):
+            if entry.startswith('arrays-') and entry not in (arrays, previous):
+                shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+    @staticmethod
+    def _read_meta(directory):
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        # Exports written before versioned subdirectories keep their arrays at the top level
+        arrays_dir = os.path.join(directory, meta.get('arrays', ''))
+        arrays = {name: np.load(os.path.join(arrays_dir, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(classes=meta['classes'], n_features=meta['n_features'],
+                   source_signature=meta.get('source_signature'), **arrays)
+
+    def apply(self, X):
+        """
+        Global leaf index reached in each tree: shape (n_rows, n_trees)
+        """
+        X = np.asarray(X)
+        if X.dtype == object:
+            X = X.astype(np.float64)
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features_in_)
+        if np.isnan(X).any():
+            raise ValueError('ForestEngine does not support missing values')
+
+        n_rows, n_trees = len(X), len(self.roots)
+        leaves = np.empty(n_rows * n_trees, dtype=np.intp)
+        # One (row, tree) pair per slot; pairs that reach a leaf drop out
+        slots = np.arange(n_rows * n_trees)
+        rows = slots // n_trees
+        nodes = self.roots[slots % n_trees]
+        while len(slots):
+            # float32 inputs against float64 thresholds, as in sklearn's trees
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            done = next_nodes == nodes
+            leaves[slots[done]] = nodes[done]
+            active = ~done
+            slots, rows, nodes = slots[active], rows[active], next_nodes[active]
+        return leaves.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X):
+        leaf_proba = self.leaf_proba[self.apply(X)]  # (n_rows, n_trees, n_classes)
+        # cumsum adds trees left to right, the order sklearn accumulates them in
+        return np.cumsum(leaf_proba, axis=1)[:, -1, :] / len(self.roots)
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -85,6 +85,4 @@ class ProfileForm(forms.ModelForm):
         profile.is_verified = profile.all_documents_verified()
         if commit:
             profile.save()
-            from .models import CreditScoreCalculator
-            CreditScoreCalculator.calculate_score(profile.user)
         return profile
@@ -0,0 +1,104 @@
+"""
+Portfolio KPIs for the superuser dashboard, the KPI API and metrics.
+
+compute_kpis makes one conditional-aggregation query per table (profiles,
+loans, payments, mobile money accounts, vouches) and returns a frozen
+PortfolioKPIs, so every consumer reads the same numbers the same way.
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+
+from .models import UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount, SocialVouch
+
+
+@dataclass(frozen=True)
+class PortfolioKPIs:
+    as_of: datetime
+    total_users: int
+    average_credit_score: float
+    total_loans: int
+    active_loans: int
+    active_loan_amount: Decimal
+    defaulted_loans: int
+    today_loans: int
+    today_payments: int
+    total_revenue: Decimal
+    mobile_accounts: int
+    verified_mobile_accounts: int
+    active_vouches: int
+
+    @property
+    def default_rate(self):
+        """
+        Percentage of all loans that defaulted
+        """
+        return self.defaulted_loans / self.total_loans * 100 if self.total_loans else 0.0
+
+    @property
+    def verification_rate(self):
+        return self.verified_mobile_accounts / self.mobile_accounts * 100 if self.mobile_accounts else 0.0
+
+    @property
+    def today_activity(self):
+        return self.today_loans + self.today_payments
+
+    def as_dict(self):
+        """
+        JSON-friendly values, derived rates included
+        """
+        data = asdict(self)
+        data.update(
+            as_of=self.as_of.isoformat(),
+            active_loan_amount=str(self.active_loan_amount),
+            total_revenue=str(self.total_revenue),
+            default_rate=round(self.default_rate, 2),
+            verification_rate=round(self.verification_rate, 2),
+            today_activity=self.today_activity,
+        )
+        return data
+
+
+def compute_kpis(now=None):
+    now = now or timezone.now()
+    today_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    users = UserProfile.objects.aggregate(
+        total=Count('pk'),
+        average_score=Avg('current_credit_score'),
+    )
+    loans = MicroLoan.objects.aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(status='active')),
+        active_amount=Sum('amount', filter=Q(status='active')),
+        defaulted=Count('pk', filter=Q(status='defaulted')),
+        today=Count('pk', filter=Q(applied_at__gte=today_start)),
+    )
+    payments = LoanPayment.objects.aggregate(
+        revenue=Sum('amount'),
+        today=Count('pk', filter=Q(payment_date__gte=today_start)),
+    )
+    mobile = MobileMoneyAccount.objects.aggregate(
+        total=Count('pk'),
+        verified=Count('pk', filter=Q(is_verified=True)),
+    )
+    vouches = SocialVouch.objects.aggregate(active=Count('pk', filter=Q(is_active=True)))
+
+    return PortfolioKPIs(
+        as_of=now,
+        total_users=users['total'],
+        average_credit_score=float(users['average_score'] or 0),
+        total_loans=loans['total'],
+        active_loans=loans['active'],
+        active_loan_amount=loans['active_amount'] or Decimal('0'),
+        defaulted_loans=loans['defaulted'],
+        today_loans=loans['today'],
+        today_payments=payments['today'],
+        total_revenue=payments['revenue'] or Decimal('0'),
+        mobile_accounts=mobile['total'],
+        verified_mobile_accounts=mobile['verified'],
+        active_vouches=vouches['active'],
+    )
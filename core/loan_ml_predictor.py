@@ -1,20 +1,331 @@
+import hashlib
 import joblib
 import numpy as np
-from core.management.commands.extract_user_ml_data import extract_user_features, FEATURES
+from django.core.cache import cache
+from core.management.commands.extract_user_ml_data import extract_user_features, extract_features_many
+from core.models import UserProfile
+from core.forest_engine import ForestEngine, META_FILE
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 
 MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loan_approval_model.pkl')
 
-class LoanMLPredictor:
+# 'sklearn' runs the pickled forest; 'numpy' runs its ForestEngine export
+ENGINES = ('sklearn', 'numpy')
+
+
+def forest_path(path=MODEL_PATH):
+    """
+    Where the ForestEngine export of the model at path lives
+    """
+    return os.path.splitext(path)[0] + '.forest'
+
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory():
+    """
+    Current resident set size of this process in bytes (0 if unknown)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models, keyed by path. A directory path
+    is loaded as a ForestEngine export and watched through its meta.json.
+
+    A model is loaded on first use and shared by every LoanMLPredictor.
+    Each access stats the file, and a changed mtime, size or inode
+    triggers a reload. Replace the .pkl by writing a new file and
+    renaming it over the old one. Arrays are memory-mapped read-only, so
+    workers forked after warm() (e.g. gunicorn --preload) share those
+    pages instead of holding private copies.
+    """
+
     def __init__(self):
-        self.model = joblib.load(MODEL_PATH)
+        self._lock = threading.Lock()
+        self._models = {}
+
+    @staticmethod
+    def _signature(path):
+        if os.path.isdir(path):
+            path = os.path.join(path, META_FILE)
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def get(self, path=MODEL_PATH):
+        return self.entry(path)['model']
+
+    def entry(self, path=MODEL_PATH):
+        """
+        The current entry for path: its 'model' and the file 'signature'
+        it was loaded from, which doubles as the model version
+        """
+        signature = self._signature(path)
+        entry = self._models.get(path)
+        if entry is not None and entry['signature'] == signature:
+            return entry
+        with self._lock:
+            entry = self._models.get(path)
+            if entry is None or entry['signature'] != signature:
+                entry = self._load(path, signature, previous=entry)
+                self._models[path] = entry
+        return entry
+
+    def _load(self, path, signature, previous=None):
+        rss_before = resident_memory()
+        started = time.perf_counter()
+        if os.path.isdir(path):
+            model = ForestEngine.load(path, mmap_mode='r')
+        else:
+            model = joblib.load(path, mmap_mode='r')
+        load_seconds = time.perf_counter() - started
+        rss_after = resident_memory()
+        entry = {
+            'model': model,
+            'signature': signature,
+            'loaded_at': time.time(),
+            'load_seconds': load_seconds,
+            'rss_delta_bytes': rss_after - rss_before,
+            'reloads': previous['reloads'] + 1 if previous else 0,
+        }
+        logger.info(
+            f"{'Reloaded' if previous else 'Loaded'} ML model {path} in {load_seconds * 1000:.0f}ms "
+            f"(RSS +{entry['rss_delta_bytes'] / 2**20:.1f} MiB, now {rss_after / 2**20:.1f} MiB)"
+        )
+        return entry
+
+    def stats(self, path=MODEL_PATH):
+        """
+        Load time, reload count and memory figures for a loaded model
+        """
+        entry = self._models.get(path)
+        stats = {'path': path, 'loaded': entry is not None, 'rss_bytes': resident_memory()}
+        if entry is not None:
+            stats.update({key: value for key, value in entry.items() if key not in ('model', 'signature')})
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+registry = ModelRegistry()
+
+
+def warm(path=MODEL_PATH):
+    """
+    Load the model now, e.g. in a pre-fork master so workers inherit it
+    """
+    return registry.get(path)
+
+
+class PredictionCache:
+    """
+    LRU cache of (label, probability) keyed by model version and a hash of
+    the feature vector, so unchanged applicants are not re-scored.
+
+    The version is the model file's signature: when the registry reloads a
+    model, lookups see the new version and drop that path's old entries.
+    With shared=True entries are also written to the Django cache, so
+    processes reuse each other's predictions.
+    """
+
+    def __init__(self, max_size=10000, shared=False, timeout=3600):
+        self.max_size = max_size
+        self.shared = shared
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = self.shared_hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def row_key(row):
+        return hashlib.blake2b(np.ascontiguousarray(row, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def shared_key(path, version, digest):
+        return 'ml_prediction:' + ':'.join(str(part) for part in (path, *version, digest))
+
+    def _check_version(self, path, version):
+        if self._versions.get(path) != version:
+            stale = [key for key in self._entries if key[0] == path]
+            for key in stale:
+                del self._entries[key]
+            if path in self._versions:
+                self.invalidations += 1
+            self._versions[path] = version
+
+    def get_many(self, path, version, digests):
+        """
+        {digest: (label, probability)} for the digests already cached
+        """
+        digests = set(digests)
+        found = {}
+        with self._lock:
+            self._check_version(path, version)
+            for digest in digests:
+                key = (path, *version, digest)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[digest] = self._entries[key]
+        from_shared = {}
+        if self.shared and len(found) < len(digests):
+            keys = {self.shared_key(path, version, digest): digest for digest in digests - found.keys()}
+            for key, result in cache.get_many(keys).items():
+                from_shared[keys[key]] = tuple(result)
+            self._store(path, version, from_shared)
+        with self._lock:
+            self.hits += len(found)
+            self.shared_hits += len(from_shared)
+            self.misses += len(digests) - len(found) - len(from_shared)
+        return {**found, **from_shared}
+
+    def set_many(self, path, version, results):
+        self._store(path, version, results)
+        if self.shared and results:
+            cache.set_many({self.shared_key(path, version, digest): result for digest, result in results.items()}, self.timeout)
+
+    def _store(self, path, version, results):
+        with self._lock:
+            self._check_version(path, version)
+            for digest, result in results.items():
+                self._entries[(path, *version, digest)] = result
+                self._entries.move_to_end((path, *version, digest))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.hits = self.shared_hits = self.misses = self.evictions = self.invalidations = 0
+
+
+prediction_cache = PredictionCache()
+
+# (export path, export signature, source signature) already warned about
+_stale_exports = set()
+
+
+class LoanMLPredictor:
+    def __init__(self, path=MODEL_PATH, engine='sklearn', prediction_cache=prediction_cache):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        self.engine = engine
+        self.source_path = path
+        self.path = forest_path(path) if engine == 'numpy' else path
+        self.prediction_cache = prediction_cache
+
+    def _entry(self):
+        """
+        (path, registry entry) of the model to run. A numpy export whose
+        source .pkl has since been replaced (or that does not record its
+        source) is stale, so the .pkl is run with sklearn instead.
+        """
+        entry = registry.entry(self.path)
+        if self.engine == 'numpy':
+            try:
+                source_signature = ModelRegistry._signature(self.source_path)
+            except FileNotFoundError:
+                return self.path, entry  # Export deployed without its .pkl
+            if entry['model'].source_signature != source_signature:
+                if (self.path, entry['signature'], source_signature) not in _stale_exports:
+                    _stale_exports.add((self.path, entry['signature'], source_signature))
+                    logger.warning(f"{self.path} was not exported from the current {self.source_path}; "
+                                   f"running it with sklearn until export_forest_engine is rerun")
+                return self.source_path, registry.entry(self.source_path)
+        return self.path, entry
+
+    @property
+    def model(self):
+        return self._entry()[1]['model']
+
+    def predict_matrix(self, X):
+        """
+        (labels, probabilities of being a good borrower) from one
+        predict_proba call; labels are what model.predict would return.
+        Rows already in the prediction cache are not scored again.
+        """
+        path, entry = self._entry()
+        model = entry['model']
+        if self.prediction_cache is None:
+            probas = model.predict_proba(X)
+            return model.classes_.take(np.argmax(probas, axis=1)), probas[:, 1]
+
+        X = np.asarray(X, dtype=np.float64)
+        digests = [self.prediction_cache.row_key(row) for row in X]
+        results = self.prediction_cache.get_many(path, entry['signature'], digests)
+        todo = [i for i, digest in enumerate(digests) if digest not in results]
+        if todo:
+            probas = model.predict_proba(X[todo])
+            labels = model.classes_.take(np.argmax(probas, axis=1))
+            computed = {digests[i]: (label.item(), float(proba)) for i, label, proba in zip(todo, labels, probas[:, 1])}
+            self.prediction_cache.set_many(path, entry['signature'], computed)
+            results.update(computed)
+        labels = np.array([results[digest][0] for digest in digests], dtype=model.classes_.dtype)
+        probas = np.array([results[digest][1] for digest in digests], dtype=np.float64)
+        return labels, probas
 
     def predict_user(self, user_profile):
         features = extract_user_features(user_profile)
         X = np.array(features).reshape(1, -1)
-        proba = self.model.predict_proba(X)[0][1]  # Probability of being a good borrower
-        pred = self.model.predict(X)[0]
+        labels, probas = self.predict_matrix(X)
         return {
-            'prediction': int(pred),
-            'probability': float(proba)
+            'prediction': int(labels[0]),
+            'probability': float(probas[0])
         }
+
+    def predict_many(self, profiles):
+        """
+        Score a UserProfile queryset with one feature query batch and one
+        predict_proba call. Returns (user_ids, labels, probabilities).
+        """
+        user_ids, X = extract_features_many(profiles)
+        if not user_ids:
+            return user_ids, np.array([], dtype=int), np.array([])
+        labels, probas = self.predict_matrix(X)
+        return user_ids, labels, probas
+
+
+def prediction_distribution(path=MODEL_PATH):
+    """
+    Good/risky counts and average probability over every profile. The
+    dashboard reads this through dashboard_cache's 'ml_distribution' section.
+    """
+    if not os.path.exists(path):
+        return {'good': 0, 'risky': 0, 'avg_proba': 0, 'available': False}
+
+    started = time.perf_counter()
+    _, labels, probas = LoanMLPredictor(path).predict_many(UserProfile.objects.all())
+    logger.info(f"Scored {len(labels)} users for the dashboard in {time.perf_counter() - started:.2f}s")
+    return {
+        'good': int((labels == 1).sum()),
+        'risky': int((labels != 1).sum()),
+        'avg_proba': round(float(probas.mean()), 2) if len(probas) else 0,
+        'available': True,
+    }
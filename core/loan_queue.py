@@ -0,0 +1,228 @@
+"""
+Database-backed loan application queue.
+
+apply_for_loan enqueues a pending MicroLoan with a LoanApplicationJob and
+returns immediately; process_loan_queue workers claim jobs oldest first and
+run them through LoanApprovalEngine. Claims are a conditional UPDATE, so any
+number of worker processes can share the queue without an external broker.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import OperationalError, transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import (
+    MicroLoan, SavingsDeposit, LoanApplicationJob, LoanApprovalEngine, CreditScoreCalculator
+)
+
+logger = logging.getLogger(__name__)
+
+# Jobs left 'processing' longer than this belonged to a worker that died
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Claims per job before it is failed, and the backoff between them
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(seconds=2)
+MAX_RETRY_DELAY = timedelta(minutes=5)
+
+
+def has_open_application(user):
+    return LoanApplicationJob.objects.filter(
+        loan__user=user, status__in=['queued', 'processing']).exists()
+
+
+def enqueue(user, amount, duration_days):
+    """
+    Record the application as a pending loan and queue it for a decision
+    """
+    score = user.userprofile.current_credit_score
+    with transaction.atomic():
+        loan = MicroLoan.objects.create(
+            user=user,
+            amount=amount,
+            interest_rate=CreditScoreCalculator.get_interest_rate(score),  # Quoted; final rate set on approval
+            duration_days=duration_days,
+            status='pending',
+            score_at_application=score,
+        )
+        LoanApplicationJob.objects.create(loan=loan)
+    return loan
+
+
+def claim_next(worker):
+    """
+    Atomically take the oldest queued job that is not backing off, or None
+    when there is none
+    """
+    while True:
+        job_id = (
+            LoanApplicationJob.objects.filter(status='queued')
+            .filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()))
+            .order_by('enqueued_at', 'pk').values_list('pk', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        claimed = LoanApplicationJob.objects.filter(pk=job_id, status='queued').update(
+            status='processing', started_at=timezone.now(), worker=worker, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return LoanApplicationJob.objects.select_related('loan__user__userprofile').get(pk=job_id)
+        # Another worker got it first; try the next one
+
+
+def process(job):
+    """
+    Decide a claimed application: activate and fund the loan, or reject it.
+    Does nothing if the claim was lost (requeued as stale and taken by
+    another worker) or the loan was already decided.
+    """
+    try:
+        with transaction.atomic():
+            owned = LoanApplicationJob.objects.select_for_update().filter(
+                pk=job.pk, status='processing', worker=job.worker).exists()
+            loan = (
+                MicroLoan.objects.select_for_update(of=('self',)).select_related('user__userprofile')
+                .filter(pk=job.loan_id, status='pending').first()
+            )
+            if not owned or loan is None:
+                logger.warning(f"Loan application {job.pk} no longer claimed by {job.worker}; skipped")
+                return False
+            user = loan.user
+
+            result = LoanApprovalEngine.evaluate_application(user, loan.amount)
+            now = timezone.now()
+            decision = {'score_at_application': result['score']}
+            if result['approved']:
+                decision.update(
+                    status='active',
+                    interest_rate=result['interest_rate'],
+                    pricing_version=result['pricing_version'],
+                    total_amount_due=loan.amount + loan.amount * (result['interest_rate'] / Decimal('100')),
+                    approved_at=now,
+                    due_date=now.date() + timedelta(days=loan.duration_days),
+                )
+                reason = result['message']
+            else:
+                decision['status'] = 'rejected'
+                reason = result['reason']
+            if not MicroLoan.objects.filter(pk=loan.pk, status='pending').update(**decision):
+                return False
+            for field, value in decision.items():
+                setattr(loan, field, value)
+            # update() sends no signals; the score, rollup and dashboard receivers need this one
+            post_save.send(sender=MicroLoan, instance=loan, created=False, update_fields=None, raw=False,
+                           using=loan._state.db)
+
+            if result['approved']:
+                # Add loan amount to savings
+                SavingsDeposit.objects.create(
+                    user=user,
+                    amount=loan.amount,
+                    transaction_type='LOAN_DEPOSIT',
+                    balance_after=0,  # Set from the savings account on save
+                )
+            LoanApplicationJob.objects.filter(pk=job.pk, status='processing', worker=job.worker).update(
+                status='done',
+                finished_at=now,
+                decision_reason=reason,
+                rejected_stage=result.get('rejected_stage', ''),
+                **{f'{stage}_ms': ms for stage, ms in result['stage_ms'].items()},
+            )
+    except OperationalError as e:
+        # Transient (e.g. lock timeout): retry later, up to MAX_ATTEMPTS claims
+        if job.attempts >= MAX_ATTEMPTS:
+            logger.error(f"Loan application {job.pk} failed after {job.attempts} attempts", exc_info=True)
+            fail(job, f"Database error after {job.attempts} attempts: {e}")
+        else:
+            logger.warning(f"Loan application {job.pk} requeued after a database error", exc_info=True)
+            LoanApplicationJob.objects.filter(pk=job.pk).update(
+                status='queued', worker='', not_before=timezone.now() + retry_delay(job.attempts))
+        return False
+    except Exception as e:
+        logger.exception(f"Loan application {job.pk} failed")
+        fail(job, str(e))
+        return False
+    return True
+
+
+def fail(job, reason):
+    """
+    Give up on a job and reject its loan together, so the applicant is not
+    left with a pending loan that no worker will decide
+    """
+    with transaction.atomic():
+        MicroLoan.objects.filter(pk=job.loan_id, status='pending').update(status='rejected')
+        LoanApplicationJob.objects.filter(pk=job.pk).update(
+            status='failed', finished_at=timezone.now(), decision_reason=reason)
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def requeue_stale_claims():
+    """
+    Put back jobs claimed by workers that never finished them, failing those
+    already claimed MAX_ATTEMPTS times. Workers call this periodically.
+    """
+    stale = LoanApplicationJob.objects.filter(status='processing', started_at__lt=timezone.now() - CLAIM_TIMEOUT)
+    for job in stale.filter(attempts__gte=MAX_ATTEMPTS):
+        fail(job, f"Abandoned by workers {job.attempts} times")
+    return stale.filter(attempts__lt=MAX_ATTEMPTS).update(status='queued', worker='', not_before=None)
+
+
+def status(loan):
+    """
+    What the applicant's status poll returns
+    """
+    job = getattr(loan, 'application_job', None)
+    data = {'loan_id': loan.pk, 'loan_status': loan.status}
+    if job is not None:
+        data.update(queue_status=job.status, reason=job.decision_reason)
+        if job.status == 'queued':
+            data['position'] = LoanApplicationJob.objects.filter(status='queued', pk__lte=job.pk).count()
+    return data
+
+
+def queue_stats(window=timedelta(hours=1)):
+    """
+    Queue depth, oldest wait, and average wait/decision latency (in seconds)
+    of jobs decided within the window, with runs, rejections and average
+    latency per approval stage
+    """
+    now = timezone.now()
+    jobs = LoanApplicationJob.objects.aggregate(
+        depth=Count('pk', filter=Q(status='queued')),
+        processing=Count('pk', filter=Q(status='processing')),
+        oldest_enqueued=Min('enqueued_at', filter=Q(status='queued')),
+    )
+    decided = LoanApplicationJob.objects.filter(
+        status='done', finished_at__gte=now - window,
+    ).aggregate(
+        decided=Count('pk'),
+        avg_wait=Avg(F('started_at') - F('enqueued_at')),
+        avg_decision=Avg(F('finished_at') - F('started_at')),
+        **{f'{stage}_runs': Count(f'{stage}_ms') for stage in LoanApprovalEngine.STAGES},
+        **{f'{stage}_avg_ms': Avg(f'{stage}_ms') for stage in LoanApprovalEngine.STAGES},
+        **{f'{stage}_rejections': Count('pk', filter=Q(rejected_stage=stage)) for stage in LoanApprovalEngine.STAGES},
+    )
+    oldest = jobs.pop('oldest_enqueued')
+    return {
+        **jobs,
+        'oldest_wait_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+        'decided_last_window': decided['decided'],
+        'avg_wait_seconds': decided['avg_wait'].total_seconds() if decided['avg_wait'] else 0.0,
+        'avg_decision_seconds': decided['avg_decision'].total_seconds() if decided['avg_decision'] else 0.0,
+        'stages': {
+            stage: {
+                'runs': decided[f'{stage}_runs'],
+                'rejections': decided[f'{stage}_rejections'],
+                'avg_ms': round(decided[f'{stage}_avg_ms'] or 0.0, 2),
+            }
+            for stage in LoanApprovalEngine.STAGES
+        },
+    }
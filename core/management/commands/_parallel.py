@@ -0,0 +1,24 @@
+"""
+Helpers shared by the management commands that fan work out to a process pool
+"""
+import multiprocessing
+
+from django.db import connections
+
+
+def init_worker():
+    """
+    Pool initializer. Under the spawn start method the child starts with a
+    fresh interpreter, so Django has to be set up again (a no-op under fork).
+    """
+    import django
+    django.setup()
+
+
+def worker_pool(workers):
+    """
+    Process pool for Django work. Connections are closed first so forked
+    children never share the parent's database handle.
+    """
+    connections.close_all()
+    return multiprocessing.Pool(workers, initializer=init_worker)
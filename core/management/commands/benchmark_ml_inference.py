@@ -0,0 +1,48 @@
+import os
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from core.forest_engine import ForestEngine
+from core.loan_ml_predictor import MODEL_PATH, registry
+
+DATA_PATH = os.path.join(os.path.dirname(MODEL_PATH), 'synthetic_loan_data.csv')
+
+
+def seconds_per_call(predict, batches):
+    started = time.perf_counter()
+    for X in batches:
+        predict(X)
+    return (time.perf_counter() - started) / len(batches)
+
+
+class Command(BaseCommand):
+    help = 'Check the NumPy forest engine matches sklearn exactly and compare their prediction latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=MODEL_PATH)
+        parser.add_argument('--data', default=DATA_PATH, help="CSV of features (a 'target' column is ignored)")
+        parser.add_argument('--repeat', type=int, default=200, help='Single-row predictions timed per engine')
+
+    def handle(self, *args, **options):
+        try:
+            model = registry.get(options['path'])
+        except FileNotFoundError:
+            raise CommandError(f"No model at {options['path']}; train one with core/train_loan_model.py")
+        engine = ForestEngine.from_sklearn(model)
+        X = pd.read_csv(options['data']).drop(columns='target', errors='ignore').values
+
+        expected = model.predict_proba(X)
+        if expected.tobytes() != engine.predict_proba(X).tobytes():
+            mismatched = int((expected != engine.predict_proba(X)).any(axis=1).sum())
+            raise CommandError(f"NumPy engine disagrees with sklearn on {mismatched} of {len(X)} rows")
+        self.stdout.write(f"Probabilities identical to sklearn on {len(X)} rows")
+
+        rows = [X[i:i + 1] for i in range(min(options['repeat'], len(X)))]
+        for name, predict in (('sklearn', model.predict_proba), ('numpy', engine.predict_proba)):
+            single = seconds_per_call(predict, rows)
+            batch = seconds_per_call(predict, [X] * 3)
+            self.stdout.write(
+                f"{name:>8}: {single * 1000:.3f} ms per applicant, "
+                f"{batch * 1000:.1f} ms per {len(X)}-row batch"
+            )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
+from core.models import SavingsDeposit, SavingsCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Verify each user's latest savings checkpoint against the raw ledger rows it covers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Delete every checkpoint of users whose latest one is wrong")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        checked = bad = 0
+        last_pk = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk, savings_checkpoints__isnull=False).distinct()
+                .order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+
+            latest = SavingsCheckpoint.objects.filter(user=OuterRef('user_id')).order_by('-last_deposit_id')
+            checkpoints = SavingsCheckpoint.objects.filter(
+                user_id__in=user_ids, pk=Subquery(latest.values('pk')[:1]))
+            ledger = SavingsCheckpoint.ledger_totals(SavingsDeposit.objects.filter(
+                user_id__in=user_ids, pk__lte=Subquery(latest.values('last_deposit_id')[:1])))
+
+            wrong = []
+            for checkpoint in checkpoints:
+                checked += 1
+                expected = ledger.get(checkpoint.user_id)
+                mismatched = [
+                    field for field in SavingsCheckpoint.TOTALS
+                    if getattr(checkpoint, field) != (expected[field] if expected else 0)
+                ]
+                if mismatched:
+                    wrong.append(checkpoint.user_id)
+                    self.stdout.write(
+                        f"user {checkpoint.user_id} @ deposit {checkpoint.last_deposit_id}: " + ', '.join(
+                            f"{field} checkpoint={getattr(checkpoint, field)} "
+                            f"ledger={expected[field] if expected else 0}" for field in mismatched)
+                    )
+            bad += len(wrong)
+            if options['fix'] and wrong:
+                SavingsCheckpoint.objects.filter(user_id__in=wrong).delete()
+
+        summary = f"Checked {checked} checkpoints: {bad} disagree with the ledger"
+        if options['fix'] and bad:
+            summary += '. Deleted; totals fall back to the ledger until the next roll-forward.'
+        self.stdout.write((self.style.WARNING if bad else self.style.SUCCESS)(summary))
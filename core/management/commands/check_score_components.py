@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from core.models import CreditScoreCalculator, CreditScoreComponents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild credit score components from the raw tables and report drift from the stored ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Overwrite drifted or missing components and mark those scores stale')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = missing = 0
+        drift = {field: 0 for field in CreditScoreComponents.STORED_FIELDS}
+        last_pk = 0
+
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk, userprofile__isnull=False)
+                .order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+
+            rebuilt = CreditScoreComponents.build(user_ids)
+            stored = CreditScoreComponents.objects.in_bulk(user_ids, field_name='user_id')
+            to_fix = []
+            for user_id, expected in rebuilt.items():
+                checked += 1
+                actual = stored.get(user_id)
+                if actual is None:
+                    missing += 1
+                    to_fix.append(expected)
+                    continue
+                drifted = [
+                    field for field in CreditScoreComponents.STORED_FIELDS
+                    if getattr(actual, field) != getattr(expected, field)
+                ]
+                for field in drifted:
+                    drift[field] += 1
+                    self.stdout.write(
+                        f"user {user_id}: {field} stored={getattr(actual, field)} "
+                        f"rebuilt={getattr(expected, field)}"
+                    )
+                if drifted:
+                    to_fix.append(expected)
+
+            if options['fix'] and to_fix:
+                CreditScoreComponents.upsert(to_fix)
+                CreditScoreCalculator.mark_stale(*[c.user_id for c in to_fix])
+
+        drifted_total = sum(drift.values())
+        summary = f"Checked {checked} users: {missing} missing, {drifted_total} drifted components"
+        if drifted_total:
+            summary += ' (' + ', '.join(f'{field}: {count}' for field, count in drift.items() if count) + ')'
+        if options['fix']:
+            summary += '. Fixed.'
+        style = self.style.SUCCESS if not (missing or drifted_total) else self.style.WARNING
+        self.stdout.write(style(summary))
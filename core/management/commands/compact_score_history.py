@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import CreditScoreHistory
+
+
+class Command(BaseCommand):
+    help = 'Collapse old credit score history to one point per user per day or week.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=90)
+        parser.add_argument('--granularity', choices=['day', 'week'], default='day')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        granularity = options['granularity']
+        batch_size = options['batch_size']
+
+        points = (
+            CreditScoreHistory.objects.filter(recorded_at__lt=cutoff)
+            .order_by('user_id', 'recorded_at', 'pk')
+            .values_list('pk', 'user_id', 'recorded_at', 'score')
+            .iterator(chunk_size=batch_size)
+        )
+
+        # The last point of each (user, bucket) survives, unless it repeats the
+        # score kept before it. Deletes wait until the scan is done, since SQLite
+        # does not isolate a streaming read from writes to the same table.
+        scanned = 0
+        to_delete = []
+        kept = {}  # user_id -> last kept score
+        pending = pending_key = None
+
+        for point in points:
+            scanned += 1
+            pk, user_id, recorded_at, score = point
+            key = (user_id, CreditScoreHistory.bucket(recorded_at, granularity))
+            if pending is not None:
+                self.settle(pending, superseded=pending_key == key, kept=kept, to_delete=to_delete)
+            pending, pending_key = point, key
+        if pending is not None:
+            self.settle(pending, superseded=False, kept=kept, to_delete=to_delete)
+
+        deleted = 0
+        for i in range(0, len(to_delete), batch_size):
+            deleted += CreditScoreHistory.objects.filter(pk__in=to_delete[i:i + batch_size]).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} points older than {cutoff:%Y-%m-%d}, deleted {deleted} ({granularity} granularity)"
+        ))
+
+    @staticmethod
+    def settle(point, superseded, kept, to_delete):
+        pk, user_id, recorded_at, score = point
+        if superseded or kept.get(user_id) == score:
+            to_delete.append(pk)
+        else:
+            kept[user_id] = score
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.forest_engine import ForestEngine
+from core.loan_ml_predictor import MODEL_PATH, forest_path, registry
+
+
+class Command(BaseCommand):
+    help = "Export the loan approval forest to NumPy node arrays for LoanMLPredictor(engine='numpy')."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=MODEL_PATH)
+        parser.add_argument('--output', help='Export directory (default: next to the model, .forest)')
+
+    def handle(self, *args, **options):
+        try:
+            entry = registry.entry(options['path'])
+        except FileNotFoundError:
+            raise CommandError(f"No model at {options['path']}; train one with core/train_loan_model.py")
+        output = options['output'] or forest_path(options['path'])
+        engine = ForestEngine.from_sklearn(entry['model'])
+        # Lets LoanMLPredictor notice when the .pkl is replaced after this export
+        engine.source_signature = entry['signature']
+        engine.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {len(engine.roots)} trees ({len(engine.feature)} nodes) to {output}"
+        ))
@@ -0,0 +1,54 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import exports
+
+
+class Command(BaseCommand):
+    help = ('Stream the loans, payments or savings table to a gzip-compressed CSV file, '
+            'reading it in chunks so memory stays flat however large the table is.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--since', help='First date to include (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help="Loan status (the loan's status for payments; "
+                                             'transaction type for savings)')
+        parser.add_argument('--output', help="Output file (default <table>.csv.gz, '-' for stdout)")
+        parser.add_argument('--no-gzip', action='store_true', help='Write plain CSV')
+        parser.add_argument('--chunk-size', type=int, default=exports.ROWS_PER_CHUNK, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        table = options['table']
+        started = time.monotonic()
+        try:
+            chunks = exports.csv_chunks(
+                table, rows_per_chunk=options['chunk_size'],
+                since=options['since'], until=options['until'], status=options['status'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['no_gzip']:
+            data = (chunk.encode() for chunk in chunks)
+            default = f"{table}.csv"
+        else:
+            data = exports.gzip_chunks(chunks)
+            default = f"{table}.csv.gz"
+        output = options['output'] or default
+
+        written = 0
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for block in data:
+                out.write(block)
+                written += len(block)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {table} to {output} ({written / 1024:.0f} KiB) in {time.monotonic() - started:.1f}s"
+            ))
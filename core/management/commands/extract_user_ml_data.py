@@ -1,9 +1,11 @@
+import numpy as np
 import pandas as pd
 
 from django.core.management.base import BaseCommand
-from core.models import UserProfile, MicroLoan, LoanPayment, SocialVouch, SavingsDeposit, MobileMoneyAccount
-from django.contrib.auth.models import User
-from django.db.models import Sum
+from core.models import (
+    UserProfile, MicroLoan, LoanPayment, SocialVouch, SavingsDeposit, SavingsCheckpoint, MobileMoneyAccount
+)
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
 
 FEATURES = [
     'age', 'monthly_income', 'employment_status', 'num_loans', 'num_defaults',
@@ -37,7 +39,7 @@ def extract_user_features(user_profile):
     is_verified = 1 if user_profile.is_verified else 0
     num_mobile_accounts = MobileMoneyAccount.objects.filter(user=user, is_verified=True).count()
     # For ML, use most recent loan or zeros
-    last_loan = loans.order_by('-applied_at').first()
+    last_loan = loans.order_by('-applied_at', '-pk').first()
     loan_amount = last_loan.amount if last_loan else 0
     loan_duration_days = last_loan.duration_days if last_loan else 0
     return [
@@ -46,22 +48,85 @@ def extract_user_features(user_profile):
         is_verified, num_mobile_accounts, loan_amount, loan_duration_days
     ]
 
+def _grouped(queryset, key, **aggregates):
+    return {
+        row[key]: row for row in queryset.order_by().values(key).annotate(**aggregates)
+    }
+
+
+def extract_features_many(profiles):
+    """
+    Feature rows for a UserProfile queryset, identical to calling
+    extract_user_features on each, in five queries for any number of users.
+    Returns (user_ids, matrix) with one float64 row per profile in FEATURES order.
+    """
+    user_ids = profiles.values('user_id')
+    last_loan = MicroLoan.objects.filter(user=OuterRef('user_id')).order_by('-applied_at', '-pk')
+    savings = SavingsCheckpoint.total_expressions('user_id')
+    rows = profiles.order_by('user_id').annotate(
+        last_loan_amount=Subquery(last_loan.values('amount')[:1]),
+        last_loan_duration=Subquery(last_loan.values('duration_days')[:1]),
+        num_savings=savings['transaction_count'],
+        total_saved=savings['balance'],
+    ).values_list(
+        'user_id', 'date_of_birth', 'monthly_income', 'employment_status', 'is_verified',
+        'num_savings', 'total_saved', 'last_loan_amount', 'last_loan_duration',
+    )
+    loans = _grouped(
+        MicroLoan.objects.filter(user__in=user_ids), 'user_id',
+        num_loans=Count('pk'),
+        num_defaults=Count('pk', filter=Q(status='defaulted')),
+        num_paid_loans=Count('pk', filter=Q(status='paid')),
+    )
+    payments = _grouped(
+        LoanPayment.objects.filter(loan__user__in=user_ids), 'loan__user_id',
+        total=Count('pk'), on_time=Count('pk', filter=Q(was_on_time=True)),
+    )
+    vouches = _grouped(SocialVouch.objects.filter(vouchee__in=user_ids), 'vouchee_id', num_vouches=Count('pk'))
+    mobile = _grouped(
+        MobileMoneyAccount.objects.filter(user__in=user_ids, is_verified=True), 'user_id',
+        num_mobile_accounts=Count('pk'),
+    )
+
+    today = pd.Timestamp.now().date()
+    no_loans = {'num_loans': 0, 'num_defaults': 0, 'num_paid_loans': 0}
+    ids = []
+    matrix = []
+    for (user_id, date_of_birth, monthly_income, employment_status, is_verified,
+         num_savings, total_saved, last_loan_amount, last_loan_duration) in rows:
+        user_loans = loans.get(user_id, no_loans)
+        user_payments = payments.get(user_id)
+        ids.append(user_id)
+        matrix.append([
+            (today - date_of_birth).days // 365,
+            monthly_income or 0,
+            EMPLOYMENT_MAP.get(employment_status, 3),
+            user_loans['num_loans'],
+            user_loans['num_defaults'],
+            user_loans['num_paid_loans'],
+            user_payments['on_time'] / user_payments['total'] if user_payments else 1.0,
+            vouches.get(user_id, {}).get('num_vouches', 0),
+            num_savings,
+            total_saved,
+            1 if is_verified else 0,
+            mobile.get(user_id, {}).get('num_mobile_accounts', 0),
+            last_loan_amount or 0,
+            last_loan_duration or 0,
+        ])
+    return ids, np.array(matrix, dtype=float).reshape(-1, len(FEATURES))
+
+
 class Command(BaseCommand):
     help = 'Extracts user and loan features for ML model training.'
 
     def handle(self, *args, **kwargs):
-        rows = []
-        for profile in UserProfile.objects.all():
-            features = extract_user_features(profile)
-            # Use defaulted (0) or paid (1) as target if user has loans
-            loans = MicroLoan.objects.filter(user=profile.user)
-            if loans.exists():
-                # Use worst outcome as target
-                if loans.filter(status='defaulted').exists():
-                    target = 0
-                else:
-                    target = 1
-                rows.append(features + [target])
-        df = pd.DataFrame(rows, columns=FEATURES + ['target'])
+        # Only users with loans have an outcome to learn from
+        profiles = UserProfile.objects.filter(user_id__in=MicroLoan.objects.values('user_id'))
+        _, features = extract_features_many(profiles)
+        df = pd.DataFrame(features, columns=FEATURES)
+        counts = [f for f in FEATURES if f not in ('monthly_income', 'on_time_payment_rate', 'total_saved', 'loan_amount')]
+        df[counts] = df[counts].astype(int)
+        # Use worst outcome as target: defaulted (0) or not (1)
+        df['target'] = (df['num_defaults'] == 0).astype(int)
         df.to_csv('real_user_loan_data.csv', index=False)
-        self.stdout.write(self.style.SUCCESS(f'Extracted {len(rows)} user records to real_user_loan_data.csv'))
+        self.stdout.write(self.style.SUCCESS(f'Extracted {len(df)} user records to real_user_loan_data.csv'))
@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from core import savings_import
+
+
+class Command(BaseCommand):
+    help = "Import savings deposits from a mobile money statement CSV (columns: username or phone_number, amount)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, or '-' for stdin")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--show-rejected', type=int, default=20, help='How many rejected rows to list')
+
+    def handle(self, *args, **options):
+        def progress(report, elapsed):
+            self.stdout.write(
+                f"{report['rows']} rows, {report['imported']} imported, "
+                f"{len(report['rejected'])} rejected, {report['rows'] / elapsed:,.0f} rows/sec"
+            )
+
+        try:
+            if options['path'] == '-':
+                report = savings_import.import_deposits(sys.stdin, options['batch_size'], progress)
+            else:
+                with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                    report = savings_import.import_deposits(f, options['batch_size'], progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        for line_number, reason in report['rejected'][:options['show_rejected']]:
+            self.stdout.write(self.style.WARNING(f"line {line_number}: {reason}"))
+        rate = report['rows'] / report['seconds'] if report['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} of {report['rows']} rows for {len(report['users'])} users "
+            f"in {report['seconds']:.1f}s ({rate:,.0f} rows/sec); {len(report['rejected'])} rejected"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.loan_ml_predictor import MODEL_PATH, registry
+
+
+class Command(BaseCommand):
+    help = 'Load the loan approval model through the shared registry and report load time and memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=MODEL_PATH)
+
+    def handle(self, *args, **options):
+        try:
+            registry.get(options['path'])
+        except FileNotFoundError:
+            raise CommandError(f"No model at {options['path']}; train one with core/train_loan_model.py")
+        stats = registry.stats(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['path']}: loaded in {stats['load_seconds'] * 1000:.0f}ms, "
+            f"RSS +{stats['rss_delta_bytes'] / 2**20:.1f} MiB (process {stats['rss_bytes'] / 2**20:.1f} MiB)"
+        ))
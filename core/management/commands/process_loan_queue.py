@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from core import loan_queue
+from ._parallel import init_worker
+
+
+# How often each worker puts back claims abandoned by crashed workers
+REQUEUE_INTERVAL = 60
+
+
+def run_worker(worker, once, poll_interval):
+    """
+    Claim and decide applications until the queue is empty (--once) or forever.
+    Returns the number of applications decided.
+    """
+    decided = 0
+    requeued_at = time.monotonic()
+    while True:
+        if time.monotonic() - requeued_at >= REQUEUE_INTERVAL:
+            loan_queue.requeue_stale_claims()
+            requeued_at = time.monotonic()
+        job = loan_queue.claim_next(worker)
+        if job is None:
+            if once:
+                return decided
+            time.sleep(poll_interval)
+            continue
+        if loan_queue.process(job):
+            decided += 1
+
+
+def worker_main(worker, once, poll_interval):
+    init_worker()
+    run_worker(worker, once, poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Decide queued loan applications with one or more worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        requeued = loan_queue.requeue_stale_claims()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Requeued {requeued} abandoned applications"))
+
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        started = time.monotonic()
+
+        if options['workers'] > 1:
+            connections.close_all()
+            processes = [
+                multiprocessing.Process(
+                    target=worker_main,
+                    args=(f"{prefix}/{n}", options['once'], options['poll_interval']),
+                )
+                for n in range(options['workers'])
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        else:
+            decided = run_worker(prefix, options['once'], options['poll_interval'])
+            self.stdout.write(f"Decided {decided} applications in {time.monotonic() - started:.1f}s")
+
+        stats = loan_queue.queue_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Queue depth {stats['depth']} (oldest waiting {stats['oldest_wait_seconds']:.0f}s), "
+            f"{stats['decided_last_window']} decided in the last hour, "
+            f"avg wait {stats['avg_wait_seconds']:.1f}s, avg decision {stats['avg_decision_seconds']:.2f}s"
+        ))
+        self.stdout.write('Stages: ' + ', '.join(
+            f"{stage} {data['avg_ms']:.1f}ms x{data['runs']} ({data['rejections']} rejected)"
+            for stage, data in stats['stages'].items()
+        ))
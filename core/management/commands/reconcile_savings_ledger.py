@@ -0,0 +1,92 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from core.models import SavingsDeposit
+from ._parallel import worker_pool
+
+
+def reconcile_range(task):
+    """
+    Stream the ledger of users first_pk..last_pk in (user, deposit_date)
+    order, recompute running balances and collect every divergent row.
+    With fix, divergent rows are rewritten in batches once the stream is
+    done, since SQLite does not isolate a streaming read from writes to the
+    same table.
+    """
+    (first_pk, last_pk), fix, batch_size = task
+    rows = (
+        SavingsDeposit.objects.filter(user_id__gte=first_pk, user_id__lte=last_pk)
+        .order_by('user_id', 'deposit_date', 'pk')
+        .values_list('pk', 'user_id', 'amount', 'balance_after')
+        .iterator(chunk_size=batch_size)
+    )
+    checked = 0
+    divergent = []
+    user_id = balance = None
+    for pk, row_user_id, amount, balance_after in rows:
+        if row_user_id != user_id:
+            user_id, balance = row_user_id, 0
+        balance += amount
+        checked += 1
+        if balance_after != balance:
+            divergent.append((pk, user_id, balance_after, balance))
+
+    if fix:
+        for i in range(0, len(divergent), batch_size):
+            SavingsDeposit.objects.bulk_update(
+                [SavingsDeposit(pk=pk, balance_after=expected) for pk, _, _, expected in divergent[i:i + batch_size]],
+                ['balance_after'],
+            )
+    return checked, divergent
+
+
+class Command(BaseCommand):
+    help = "Recompute running savings balances from the ledger and report (or --fix) rows whose balance_after is wrong."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite divergent balance_after values')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--users-per-task', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows fetched and rows fixed per round trip')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        pks = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        size = options['users_per_task']
+        tasks = [
+            ((pks[i], pks[min(i + size, len(pks)) - 1]), options['fix'], options['batch_size'])
+            for i in range(0, len(pks), size)
+        ]
+
+        if options['workers'] > 1 and len(tasks) > 1:
+            pool = worker_pool(options['workers'])
+            results = pool.imap_unordered(reconcile_range, tasks)
+        else:
+            pool = None
+            results = map(reconcile_range, tasks)
+
+        checked = divergent_rows = 0
+        users = set()
+        try:
+            for task_checked, divergent in results:
+                checked += task_checked
+                divergent_rows += len(divergent)
+                for pk, user_id, stored, expected in divergent:
+                    users.add(user_id)
+                    self.stdout.write(f"deposit {pk} (user {user_id}): balance_after={stored} expected={expected}")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        elapsed = time.monotonic() - started
+        summary = (
+            f"Checked {checked} ledger rows in {elapsed:.1f}s ({checked / elapsed:,.0f} rows/sec): "
+            f"{divergent_rows} divergent rows across {len(users)} users"
+        )
+        if options['fix'] and divergent_rows:
+            summary += '. Fixed.'
+        style = self.style.WARNING if divergent_rows and not options['fix'] else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from core.models import CreditScoreCalculator
+from ._parallel import worker_pool
+
+
+def score_chunk(bounds):
+    """
+    Score users with first_pk <= pk <= last_pk using set-based queries.
+    Runs in a worker; the parent does all the writing.
+    """
+    first_pk, last_pk = bounds
+    user_ids = User.objects.filter(pk__gte=first_pk, pk__lte=last_pk).values('pk')
+    return bounds, CreditScoreCalculator.evaluation_rows(user_ids)
+
+
+class Command(BaseCommand):
+    help = 'Recalculate every credit score in parallel, chunked by user id, with resume support.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--checkpoint', default='rescore_all.checkpoint.json',
+                            help='File recording the last user id whose chunk (and all before it) finished')
+        parser.add_argument('--resume', action='store_true', help='Skip users up to the checkpoint')
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        start_after = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                start_after = json.load(f)['last_pk']
+            self.stdout.write(f"Resuming after user {start_after}")
+
+        chunks = self.chunk_bounds(start_after, options['chunk_size'])
+        if not chunks:
+            self.stdout.write(self.style.SUCCESS('Nothing to rescore.'))
+            return
+
+        started = time.monotonic()
+        scored = 0
+        done = set()
+        next_chunk = 0  # Chunks before this index have all been written
+
+        if options['workers'] > 1:
+            pool = worker_pool(options['workers'])
+            results = pool.imap_unordered(score_chunk, chunks)
+        else:
+            pool = None
+            results = map(score_chunk, chunks)
+
+        try:
+            for bounds, rows in results:
+                CreditScoreCalculator.store_many(rows)
+                scored += len(rows)
+                done.add(bounds)
+                while next_chunk < len(chunks) and chunks[next_chunk] in done:
+                    next_chunk += 1
+                if next_chunk:
+                    with open(checkpoint, 'w') as f:
+                        json.dump({'last_pk': chunks[next_chunk - 1][1]}, f)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{len(done)}/{len(chunks)} chunks, {scored} users, {scored / elapsed:,.0f} users/sec"
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {scored} users in {elapsed:.1f}s ({scored / elapsed:,.0f} users/sec)"
+        ))
+
+    @staticmethod
+    def chunk_bounds(start_after, chunk_size):
+        """
+        (first_pk, last_pk) for each chunk of users after start_after
+        """
+        pks = list(
+            User.objects.filter(pk__gt=start_after, userprofile__isnull=False)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        return [
+            (pks[i], pks[min(i + chunk_size, len(pks)) - 1])
+            for i in range(0, len(pks), chunk_size)
+        ]
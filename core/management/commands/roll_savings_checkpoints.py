@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db.models import Max
+from django.utils import timezone
+from core.models import SavingsDeposit, SavingsCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Roll per-user savings checkpoints forward so totals only sum rows since the last one. Run on a schedule.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=50,
+                            help='Only checkpoint users with at least this many rows since their last checkpoint')
+        parser.add_argument('--settle-seconds', type=int, default=300,
+                            help='Leave rows newer than this out, so no in-flight insert falls under the watermark')
+        parser.add_argument('--keep', type=int, default=2, help='Checkpoints to keep per user')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['settle_seconds'])
+        watermark = SavingsDeposit.objects.filter(deposit_date__lte=cutoff).aggregate(m=Max('pk'))['m']
+        if watermark is None:
+            self.stdout.write(self.style.SUCCESS('No settled ledger rows to checkpoint.'))
+            return
+
+        created = pruned = 0
+        last_pk = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+            created += len(SavingsCheckpoint.roll_forward(user_ids, watermark, options['min_rows']))
+            pruned += SavingsCheckpoint.prune(user_ids, options['keep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checkpointed {created} users up to deposit {watermark}; pruned {pruned} old checkpoints"
+        ))
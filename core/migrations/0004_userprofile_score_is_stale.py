@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_savingsdeposit_transaction_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='score_is_stale',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_userprofile_score_is_stale'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditScoreComponents',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_history', models.FloatField(default=0)),
+                ('credit_utilization', models.IntegerField(default=50)),
+                ('account_age', models.IntegerField(default=0)),
+                ('social_trust', models.IntegerField(default=0)),
+                ('savings', models.IntegerField(default=0)),
+                ('verification', models.IntegerField(default=0)),
+                ('documents', models.IntegerField(default=0)),
+                ('savings_count', models.IntegerField(default=0)),
+                ('total_saved', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='score_components', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
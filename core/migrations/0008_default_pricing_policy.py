@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.utils import timezone
+
+# The score ladder that was hard-coded in CreditScoreCalculator
+TIERS = [
+    (0, 5000, Decimal('25.0')),
+    (500, 10000, Decimal('22.0')),
+    (550, 25000, Decimal('18.0')),
+    (600, 50000, Decimal('15.0')),
+    (650, 100000, Decimal('12.0')),
+    (700, 250000, Decimal('8.0')),
+    (750, 500000, Decimal('5.0')),
+]
+
+
+def create_default_policy(apps, schema_editor):
+    PricingPolicy = apps.get_model('core', 'PricingPolicy')
+    PricingTier = apps.get_model('core', 'PricingTier')
+    policy = PricingPolicy.objects.create(
+        version=1,
+        description='Original score ladder',
+        is_active=True,
+        activated_at=timezone.now(),
+    )
+    PricingTier.objects.bulk_create([
+        PricingTier(policy=policy, min_score=min_score, max_loan_amount=amount, interest_rate=rate)
+        for min_score, amount, rate in TIERS
+    ])
+
+
+def remove_default_policy(apps, schema_editor):
+    apps.get_model('core', 'PricingPolicy').objects.filter(version=1).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_pricing_policy'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_policy, remove_default_policy),
+    ]
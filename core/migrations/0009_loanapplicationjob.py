@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_default_pricing_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanApplicationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Decided'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('attempts', models.IntegerField(default=0)),
+                ('decision_reason', models.TextField(blank=True)),
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='application_job', to='core.microloan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'enqueued_at'], name='core_loanap_status_68f34b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def backfill_balances(apps, schema_editor):
+    SavingsAccount = apps.get_model('core', 'SavingsAccount')
+    SavingsDeposit = apps.get_model('core', 'SavingsDeposit')
+    now = timezone.now()
+    SavingsAccount.objects.bulk_create([
+        SavingsAccount(user_id=row['user_id'], balance=row['total'] or 0, updated_at=now)
+        for row in SavingsDeposit.objects.values('user_id').annotate(total=Sum('amount')).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_loanapplicationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavingsAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='savings_account', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_savingscheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loanpayment',
+            index=models.Index(fields=['payment_date', 'id'], name='core_loanpa_payment_ccef86_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='microloan',
+            index=models.Index(fields=['applied_at', 'id'], name='core_microl_applied_a4dfa8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savingsdeposit',
+            index=models.Index(fields=['deposit_date', 'id'], name='core_saving_deposit_5181df_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_portfolio_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='score_computed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
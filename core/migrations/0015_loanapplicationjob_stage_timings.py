@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_userprofile_score_computed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplicationjob',
+            name='amount_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loanapplicationjob',
+            name='documents_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loanapplicationjob',
+            name='eligibility_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loanapplicationjob',
+            name='rejected_stage',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='loanapplicationjob',
+            name='scoring_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
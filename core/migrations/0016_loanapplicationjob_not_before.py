@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_loanapplicationjob_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplicationjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,11 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
 import os
 import logging
-from django.db.models import Sum  # Add this import
+import time
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
 
 logger = logging.getLogger(__name__)
 
@@ -55,14 +58,49 @@ class UserProfile(models.Model):
     # Credit Score
     current_credit_score = models.IntegerField(default=300)
     last_score_update = models.DateTimeField(auto_now=True)
+    score_computed_at = models.DateTimeField(null=True, blank=True)  # Written only when the score is stored
+    score_is_stale = models.BooleanField(default=True)  # Set when any score input changes
     
     # Account Info
     account_created = models.DateTimeField(auto_now_add=True)
     is_verified = models.BooleanField(default=False)  # Overall verification (phone/ID)
     
+    # Profile fields the credit score depends on
+    SCORE_INPUT_FIELDS = ('monthly_income', 'is_verified', 'id_verified', 'address_verified', 'income_verified')
+    # Profile fields the portfolio rollups segment borrowers by
+    SEGMENT_FIELDS = ('district', 'employment_status')
+
     def __str__(self):
         return f"{self.user.username} - Score: {self.current_credit_score}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_score_inputs = instance._score_inputs()
+        instance._loaded_segment = instance._segment()
+        return instance
+
+    def _score_inputs(self):
+        return tuple(self.__dict__.get(field) for field in self.SCORE_INPUT_FIELDS)
+
+    def _segment(self):
+        return tuple(self.__dict__.get(field) for field in self.SEGMENT_FIELDS)
+
+    def save(self, *args, **kwargs):
+        """
+        Mark the score stale when a field it depends on has changed, and
+        note a segment change for the portfolio rollups
+        """
+        self._score_inputs_changed = self._score_inputs() != getattr(self, '_loaded_score_inputs', None)
+        self._segment_changed = self._segment() != getattr(self, '_loaded_segment', None)
+        if self._score_inputs_changed:
+            self.score_is_stale = True
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'score_is_stale'}
+        super().save(*args, **kwargs)
+        self._loaded_score_inputs = self._score_inputs()
+        self._loaded_segment = self._segment()
+
     def all_documents_verified(self):
         """Check if all required documents are verified"""
         return self.id_verified and self.address_verified and self.income_verified
@@ -108,6 +146,13 @@ class MicroLoan(models.Model):
     # Credit score at time of application
     score_at_application = models.IntegerField()
     
+    # Pricing policy version that set the amount cap and interest rate
+    pricing_version = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        # Keyset pagination of the superuser dashboard sections
+        indexes = [models.Index(fields=['applied_at', 'id'])]
+
     def save(self, *args, **kwargs):
         if not self.total_amount_due:
             # Calculate total with interest
@@ -128,6 +173,46 @@ class MicroLoan(models.Model):
     def __str__(self):
         return f"{self.user.username} - MWK {self.amount} ({self.status})"
 
+# ============================================
+# LOAN APPLICATION QUEUE
+# ============================================
+
+class LoanApplicationJob(models.Model):
+    """
+    A pending MicroLoan waiting for a background worker to decide it
+    """
+    STATUS = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('done', 'Decided'),
+        ('failed', 'Failed'),
+    ]
+
+    loan = models.OneToOneField(MicroLoan, on_delete=models.CASCADE, related_name='application_job')
+    status = models.CharField(max_length=20, choices=STATUS, default='queued')
+
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.IntegerField(default=0)
+    not_before = models.DateTimeField(null=True, blank=True)  # Retry backoff after a database error
+    decision_reason = models.TextField(blank=True)
+
+    # Time spent in each LoanApprovalEngine stage (null if the stage never ran)
+    documents_ms = models.FloatField(null=True, blank=True)
+    eligibility_ms = models.FloatField(null=True, blank=True)
+    scoring_ms = models.FloatField(null=True, blank=True)
+    amount_ms = models.FloatField(null=True, blank=True)
+    rejected_stage = models.CharField(max_length=20, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'enqueued_at'])]
+
+    def __str__(self):
+        return f"Application for loan {self.loan_id} ({self.status})"
+
 # ============================================
 # LOAN PAYMENTS - Track Every Payment
 # ============================================
@@ -153,7 +238,11 @@ class LoanPayment(models.Model):
     
     # Receipt
     transaction_reference = models.CharField(max_length=100)
-    
+
+    class Meta:
+        # Keyset pagination of the superuser dashboard sections
+        indexes = [models.Index(fields=['payment_date', 'id'])]
+
     def __str__(self):
         return f"Payment MWK {self.amount} - {self.payment_date.date()}"
 
@@ -227,17 +316,28 @@ class SavingsDeposit(models.Model):
     deposit_date = models.DateTimeField(auto_now_add=True)
     balance_after = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES, default='DEPOSIT')
-    
+
+    class Meta:
+        # Keyset pagination of the superuser dashboard sections
+        indexes = [models.Index(fields=['deposit_date', 'id'])]
+
     def save(self, *args, **kwargs):
         """
-        Update balance_after based on previous transactions
+        Post new transactions to the user's SavingsAccount in the same
+        transaction and record the resulting balance in balance_after
         """
         if not self.pk:  # Only for new transactions
-            last_transaction = SavingsDeposit.objects.filter(user=self.user).order_by('-deposit_date').first()
-            current_balance = last_transaction.balance_after if last_transaction else 0
-            self.balance_after = current_balance + self.amount
+            with transaction.atomic():
+                self.balance_after = SavingsAccount.post(self.user_id, self.amount)
+                super().save(*args, **kwargs)
             # Log transaction for fraud detection
             logger.info(f"Savings transaction: {self.user.username}, {self.transaction_type}, MWK {self.amount}")
+            return
+        # The account only moves on insert and delete: correct a posted
+        # transaction with a new (reversing) one instead
+        posted = SavingsDeposit.objects.filter(pk=self.pk).values_list('user_id', 'amount').first()
+        if posted is not None and posted != (self.user_id, self.amount):
+            raise ValidationError("The user and amount of a posted savings transaction cannot be changed.")
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -246,219 +346,1233 @@ class SavingsDeposit(models.Model):
     @classmethod
     def get_current_balance(cls, user):
         """
-        Calculate the current savings balance for a user
+        Current savings balance for a user, read from their SavingsAccount
+        """
+        return SavingsAccount.balance_for(user)
+
+    @classmethod
+    def ledger_balance(cls, user_id):
+        """
+        Balance recomputed from the ledger (latest checkpoint plus later rows)
+        """
+        return SavingsCheckpoint.totals([user_id]).get(user_id, {}).get('balance', Decimal('0'))
+
+
+class SavingsAccount(models.Model):
+    """
+    Materialized savings balance: one row per user, moved in the same
+    transaction as every SavingsDeposit insert or delete
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='savings_account')
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - MWK {self.balance}"
+
+    @classmethod
+    def balance_for(cls, user):
+        user_id = getattr(user, 'pk', user)
+        balance = cls.objects.filter(user_id=user_id).values_list('balance', flat=True).first()
+        if balance is None:
+            return SavingsDeposit.ledger_balance(user_id)  # No account yet
+        return balance
+
+    @classmethod
+    def post(cls, user_id, amount):
+        """
+        Add amount to the user's balance and return the new balance. The
+        account row is locked until the surrounding transaction commits.
+        """
+        with transaction.atomic():
+            account, created = cls.objects.select_for_update().get_or_create(
+                user_id=user_id, defaults={'balance': lambda: SavingsDeposit.ledger_balance(user_id)},
+            )
+            cls.objects.filter(pk=account.pk).update(balance=F('balance') + amount, updated_at=timezone.now())
+            return cls.objects.filter(pk=account.pk).values_list('balance', flat=True).get()
+
+    @staticmethod
+    def ledger_balances(user_ids):
+        """
+        {user_id: balance} summed from the ledger in one query
+        """
+        totals = dict(
+            SavingsDeposit.objects.filter(user_id__in=user_ids)
+            .values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total')
+        )
+        return {user_id: totals.get(user_id) or Decimal('0') for user_id in user_ids}
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        Overwrite balances with the ledger totals. Returns {user_id: balance}.
+        """
+        with transaction.atomic():
+            balances = cls.ledger_balances(user_ids)
+            now = timezone.now()
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, balance=balance, updated_at=now) for user_id, balance in balances.items()],
+                update_conflicts=True, unique_fields=['user'], update_fields=['balance', 'updated_at'],
+            )
+        return balances
+
+class SavingsCheckpoint(models.Model):
+    """
+    A user's savings totals over every ledger row with pk <= last_deposit_id.
+    Totals are read as the latest checkpoint plus the rows after it, so
+    heavy savers never pay for a scan of their whole history.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='savings_checkpoints')
+    last_deposit_id = models.BigIntegerField()
+    as_of = models.DateTimeField()
+
+    transaction_count = models.IntegerField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    total_deposited = models.DecimalField(max_digits=14, decimal_places=2)  # Positive transactions only
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    TOTALS = ('transaction_count', 'balance', 'total_deposited')
+
+    class Meta:
+        unique_together = ('user', 'last_deposit_id')
+
+    def __str__(self):
+        return f"{self.user.username} - MWK {self.balance} as of {self.as_of:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def _latest(cls, user_ref):
+        return cls.objects.filter(user_id=user_ref).order_by('-last_deposit_id')
+
+    @classmethod
+    def total_expressions(cls, user_field='user_id'):
+        """
+        Annotations giving each TOTALS field as the latest checkpoint plus
+        the ledger rows after it, for a queryset with a user id in user_field
         """
-        return cls.objects.filter(user=user).aggregate(total=Sum('amount'))['total'] or 0
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        after_checkpoint = SavingsDeposit.objects.filter(
+            user_id=OuterRef(user_field),
+            pk__gt=Coalesce(Subquery(cls._latest(OuterRef('user_id')).values('last_deposit_id')[:1]), 0),
+        ).order_by().values('user_id')
+
+        def checkpoint(field, output_field):
+            return Coalesce(Subquery(cls._latest(OuterRef(user_field)).values(field)[:1]), 0, output_field=output_field)
+
+        def since(aggregate, output_field):
+            return Coalesce(Subquery(after_checkpoint.annotate(v=aggregate).values('v')), 0, output_field=output_field)
+
+        return {
+            'transaction_count': ExpressionWrapper(
+                checkpoint('transaction_count', models.IntegerField())
+                + since(Count('pk'), models.IntegerField()),
+                output_field=models.IntegerField()),
+            'balance': ExpressionWrapper(
+                checkpoint('balance', money) + since(Sum('amount'), money), output_field=money),
+            'total_deposited': ExpressionWrapper(
+                checkpoint('total_deposited', money)
+                + since(Sum('amount', filter=Q(amount__gt=0)), money),
+                output_field=money),
+        }
+
+    @classmethod
+    def totals(cls, user_ids):
+        """
+        {user_id: {'transaction_count', 'balance', 'total_deposited'}} in one query
+        """
+        rows = User.objects.filter(pk__in=user_ids).annotate(**cls.total_expressions('pk'))
+        return {row['pk']: row for row in rows.values('pk', *cls.TOTALS)}
+
+    @classmethod
+    def ledger_totals(cls, queryset):
+        """
+        The same totals aggregated straight from ledger rows, per user
+        """
+        return {
+            row['user_id']: row for row in queryset.order_by().values('user_id').annotate(
+                transaction_count=Count('pk'),
+                balance=Coalesce(Sum('amount'), Decimal('0')),
+                total_deposited=Coalesce(Sum('amount', filter=Q(amount__gt=0)), Decimal('0')),
+            )
+        }
+
+    @classmethod
+    def roll_forward(cls, user_ids, watermark, min_rows=1):
+        """
+        Add a checkpoint at watermark (a SavingsDeposit pk) for users with at
+        least min_rows ledger rows since their latest one. Returns the new checkpoints.
+        """
+        latest = {
+            c.user_id: c for c in cls.objects.filter(
+                user_id__in=user_ids,
+                pk=Subquery(cls._latest(OuterRef('user_id')).values('pk')[:1]),
+            )
+        }
+        new_rows = cls.ledger_totals(SavingsDeposit.objects.filter(
+            user_id__in=user_ids,
+            pk__gt=Coalesce(Subquery(cls._latest(OuterRef('user_id')).values('last_deposit_id')[:1]), 0),
+            pk__lte=watermark,
+        ))
+        now = timezone.now()
+        checkpoints = []
+        for user_id, rows in new_rows.items():
+            if rows['transaction_count'] < min_rows:
+                continue
+            previous = latest.get(user_id)
+            checkpoints.append(cls(
+                user_id=user_id, last_deposit_id=watermark, as_of=now,
+                **{field: rows[field] + (getattr(previous, field) if previous else 0) for field in cls.TOTALS},
+            ))
+        return cls.objects.bulk_create(checkpoints)
+
+    @classmethod
+    def prune(cls, user_ids, keep=2):
+        """
+        Delete all but each user's keep most recent checkpoints
+        """
+        seen = {}
+        stale = []
+        for pk, user_id in (
+            cls.objects.filter(user_id__in=user_ids)
+            .order_by('user_id', '-last_deposit_id').values_list('pk', 'user_id')
+        ):
+            seen[user_id] = seen.get(user_id, 0) + 1
+            if seen[user_id] > keep:
+                stale.append(pk)
+        return cls.objects.filter(pk__in=stale).delete()[0]
+
+    @classmethod
+    def invalidate(cls, user_id, deposit_id):
+        """
+        Drop checkpoints that cover a ledger row that was edited or deleted
+        """
+        cls.objects.filter(user_id=user_id, last_deposit_id__gte=deposit_id).delete()
 
 # ============================================
 # CREDIT SCORE CALCULATOR
 # ============================================
 
 class CreditScoreCalculator:
+    BASE_SCORE = 300
+    MIN_SCORE = 300
+    MAX_SCORE = 850
+
+    # A clean stored score is still recomputed after this long, since
+    # account-age points change with time alone
+    SCORE_MAX_AGE = timedelta(days=1)
+
+    # Order in which factor points are added to the base score
+    FACTORS = (
+        'payment_history', 'credit_utilization', 'account_age',
+        'social_trust', 'savings', 'verification', 'documents',
+    )
+
+    # Most points each factor can add (verification grows per mobile account)
+    FACTOR_CAPS = {
+        'payment_history': 200,
+        'credit_utilization': 100,
+        'account_age': 80,
+        'social_trust': 60,
+        'savings': 50,
+        'verification': None,
+        'documents': 30,
+    }
+
     @staticmethod
-    def calculate_score(user):
+    def scoring_profiles(user_ids):
         """
-        Calculate score with additional document verification factor
+        Profiles annotated with every per-user scoring input, in one query
         """
-        profile = user.userprofile
-        score = 300  # Base score
-        
-        # FACTOR 1: Payment History (50% weight, max 200 points)
-        loans = MicroLoan.objects.filter(user=user).exclude(status__in=['pending', 'rejected'])
+        def count(queryset, field):
+            return Coalesce(Subquery(
+                queryset.order_by().values(field).annotate(c=Count('pk')).values('c')
+            ), 0)
+
+        savings = SavingsCheckpoint.total_expressions('user_id')
+        return UserProfile.objects.filter(user_id__in=user_ids).annotate(
+            vouch_count=count(
+                SocialVouch.objects.filter(vouchee=OuterRef('user_id'), is_active=True), 'vouchee'),
+            bad_vouch_count=count(
+                SocialVouch.objects.filter(voucher=OuterRef('user_id'), vouchee_defaulted=True), 'voucher'),
+            savings_count=savings['transaction_count'],
+            total_saved=savings['balance'],
+            verified_mobile_count=count(
+                MobileMoneyAccount.objects.filter(user=OuterRef('user_id'), is_verified=True), 'user'),
+        )
+
+    @staticmethod
+    def loan_rows(user_ids):
+        """
+        (user_id, status, amount, total_payments, on_time_payments) for every
+        scored loan, in one query
+        """
+        return (
+            MicroLoan.objects.filter(user_id__in=user_ids)
+            .exclude(status__in=['pending', 'rejected'])
+            .annotate(
+                total_payments=Count('payments'),
+                on_time_payments=Count('payments', filter=Q(payments__was_on_time=True)),
+            )
+            .order_by('pk')
+            .values_list('user_id', 'status', 'amount', 'total_payments', 'on_time_payments')
+        )
+
+    # FACTOR 1: Payment History (50% weight, max 200 points)
+    @staticmethod
+    def payment_points(loans):
         payment_score = 0
-        for loan in loans:
-            payments = loan.payments.all()
-            if payments.exists():
-                on_time_payments = payments.filter(was_on_time=True).count()
-                total_payments = payments.count()
-                points_per_payment = 200 / total_payments if total_payments > 0 else 0
-                payment_score += on_time_payments * points_per_payment
-            
-            late_payments = payments.filter(was_on_time=False).count()
-            payment_score -= (late_payments * 50)
-            
-            if loan.status == 'defaulted':
+        for _, status, amount, total_payments, on_time_payments in loans:
+            if total_payments:
+                payment_score += on_time_payments * (200 / total_payments)
+            payment_score -= (total_payments - on_time_payments) * 50
+            if status == 'defaulted':
                 payment_score -= 100
-        
-        payment_score = max(0, min(200, payment_score))
-        score += payment_score
-        
-        # FACTOR 2: Credit Utilization (30% weight)
-        active_loans = loans.filter(status='active')
-        if active_loans.exists():
-            total_borrowed = sum(loan.amount for loan in active_loans)
-            max_borrowing_capacity = profile.monthly_income * 3 if profile.monthly_income else 50000
-            utilization = float(total_borrowed) / float(max_borrowing_capacity)
-            
-            if utilization < 0.3:
-                score += 100
-            elif utilization < 0.5:
-                score += 50
-            elif utilization < 0.7:
-                score += 20
-        else:
-            score += 50
-        
-        # FACTOR 3: Length of History (15% weight)
-        account_age = (timezone.now() - profile.account_created).days
+        return max(0, min(200, payment_score))
+
+    # FACTOR 2: Credit Utilization (30% weight)
+    @staticmethod
+    def utilization_points(loans, monthly_income):
+        active_amounts = [row[2] for row in loans if row[1] == 'active']
+        if not active_amounts:
+            return 50
+        total_borrowed = sum(active_amounts)
+        max_borrowing_capacity = monthly_income * 3 if monthly_income else 50000
+        utilization = float(total_borrowed) / float(max_borrowing_capacity)
+        if utilization < 0.3:
+            return 100
+        elif utilization < 0.5:
+            return 50
+        elif utilization < 0.7:
+            return 20
+        return 0
+
+    # FACTOR 3: Length of History (15% weight)
+    @staticmethod
+    def account_age_points(account_created, now):
+        account_age = (now - account_created).days
         if account_age > 365:
-            score += 80
+            return 80
         elif account_age > 180:
-            score += 60
+            return 60
         elif account_age > 90:
-            score += 40
+            return 40
         elif account_age > 30:
-            score += 20
-        
-        # FACTOR 4: Social Trust (10% weight)
-        vouches = SocialVouch.objects.filter(vouchee=user, is_active=True)
-        vouch_count = vouches.count()
+            return 20
+        return 0
+
+    # FACTOR 4: Social Trust (10% weight)
+    @staticmethod
+    def social_points(vouch_count, bad_vouch_count):
         if vouch_count >= 5:
-            score += 60
+            social_trust = 60
         elif vouch_count >= 3:
-            score += 40
+            social_trust = 40
         elif vouch_count >= 1:
-            score += 20
-        bad_vouches = SocialVouch.objects.filter(voucher=user, vouchee_defaulted=True).count()
-        score -= (bad_vouches * 30)
-        
-        # FACTOR 5: Savings Behavior (5% weight)
-        savings = SavingsDeposit.objects.filter(user=user)
-        if savings.exists():
-            total_saved = sum(s.amount for s in savings)
+            social_trust = 20
+        else:
+            social_trust = 0
+        return social_trust - bad_vouch_count * 30
+
+    # FACTOR 5: Savings Behavior (5% weight)
+    @staticmethod
+    def savings_points(savings_count, total_saved):
+        if savings_count:
             if total_saved > 50000:
-                score += 50
+                return 50
             elif total_saved > 20000:
-                score += 30
+                return 30
             elif total_saved > 5000:
-                score += 15
-        
-        # FACTOR 6: Account Verification (5% weight)
-        if profile.is_verified:
-            score += 30
-        mobile_accounts = MobileMoneyAccount.objects.filter(user=user, is_verified=True)
-        score += (mobile_accounts.count() * 10)
-        
-        # FACTOR 7: Document Verification (5% weight, max 30 points)
-        document_score = 0
-        if profile.id_verified:
-            document_score += 10
-        if profile.address_verified:
-            document_score += 10
-        if profile.income_verified:
-            document_score += 10
-        score += document_score
-        
-        # CAP SCORE BETWEEN 300-850
-        score = max(300, min(850, score))
-        
-        profile.current_credit_score = score
-        profile.save()
-        
-        return score
+                return 15
+        return 0
+
+    # FACTOR 6: Account Verification (5% weight)
+    @staticmethod
+    def verification_points(is_verified, verified_mobile_count):
+        return (30 if is_verified else 0) + verified_mobile_count * 10
+
+    # FACTOR 7: Document Verification (5% weight, max 30 points)
+    @staticmethod
+    def document_points(id_verified, address_verified, income_verified):
+        return 10 * (id_verified + address_verified + income_verified)
+
+    @classmethod
+    def score_points(cls, profile, loans, now=None):
+        """
+        Points per factor for an annotated profile and its loan rows
+        """
+        return {
+            'payment_history': cls.payment_points(loans),
+            'credit_utilization': cls.utilization_points(loans, profile.monthly_income),
+            'account_age': cls.account_age_points(profile.account_created, now or timezone.now()),
+            'social_trust': cls.social_points(profile.vouch_count, profile.bad_vouch_count),
+            'savings': cls.savings_points(profile.savings_count, profile.total_saved),
+            'verification': cls.verification_points(profile.is_verified, profile.verified_mobile_count),
+            'documents': cls.document_points(profile.id_verified, profile.address_verified, profile.income_verified),
+        }
+
+    @classmethod
+    def total_score(cls, points):
+        """
+        Add factor points to the base score and cap between 300-850
+        """
+        score = cls.BASE_SCORE
+        for factor in cls.FACTORS:
+            score += points[factor]
+        return max(cls.MIN_SCORE, min(cls.MAX_SCORE, score))
+
+    @classmethod
+    def evaluate_many(cls, user_ids, now=None):
+        """
+        Yield (annotated profile, factor points) per user, using two queries
+        whatever their loan count
+        """
+        loans_by_user = {}
+        for row in cls.loan_rows(user_ids):
+            loans_by_user.setdefault(row[0], []).append(row)
+        for profile in cls.scoring_profiles(user_ids):
+            yield profile, cls.score_points(profile, loans_by_user.get(profile.user_id, []), now)
+
+    @classmethod
+    def score_many(cls, user_ids, now=None):
+        """
+        Score many users at once. Returns {user_id: score}
+        """
+        return {
+            profile.user_id: cls.total_score(points)
+            for profile, points in cls.evaluate_many(user_ids, now)
+        }
+
+    @classmethod
+    def evaluate(cls, user, now=None):
+        """
+        Score a user in one pass and explain it: points, inputs and cap per factor
+        """
+        now = now or timezone.now()
+        loans = list(cls.loan_rows([user.pk]))
+        profile = cls.scoring_profiles([user.pk]).get()
+        points = cls.score_points(profile, loans, now)
+
+        active_amounts = [row[2] for row in loans if row[1] == 'active']
+        borrowing_capacity = profile.monthly_income * 3 if profile.monthly_income else 50000
+        inputs = {
+            'payment_history': {
+                'loans': len(loans),
+                'payments': sum(row[3] for row in loans),
+                'on_time_payments': sum(row[4] for row in loans),
+                'defaulted_loans': sum(1 for row in loans if row[1] == 'defaulted'),
+            },
+            'credit_utilization': {
+                'active_loans': len(active_amounts),
+                'total_borrowed': sum(active_amounts),
+                'borrowing_capacity': borrowing_capacity,
+            },
+            'account_age': {'account_age_days': (now - profile.account_created).days},
+            'social_trust': {'vouch_count': profile.vouch_count, 'bad_vouch_count': profile.bad_vouch_count},
+            'savings': {'savings_count': profile.savings_count, 'total_saved': profile.total_saved or 0},
+            'verification': {
+                'is_verified': profile.is_verified,
+                'verified_mobile_count': profile.verified_mobile_count,
+            },
+            'documents': {
+                'id_verified': profile.id_verified,
+                'address_verified': profile.address_verified,
+                'income_verified': profile.income_verified,
+            },
+        }
+        return {
+            'score': cls.total_score(points),
+            'base_score': cls.BASE_SCORE,
+            'factors': {
+                factor: {'points': points[factor], 'max_points': cls.FACTOR_CAPS[factor], 'inputs': inputs[factor]}
+                for factor in cls.FACTORS
+            },
+        }
+
+    @classmethod
+    def calculate_breakdown(cls, user):
+        """
+        Evaluate from the raw tables and persist the result
+        """
+        return cls.store_breakdown(user, cls.evaluate(user))
+
+    @classmethod
+    def get_breakdown(cls, user):
+        """
+        Evaluate once, persisting only if the stored score is stale or disagrees
+        """
+        profile = user.userprofile
+        result = cls.evaluate(user)
+        if profile.score_is_stale or int(result['score']) != profile.current_credit_score:
+            cls.store_breakdown(user, result)
+        return result
+
+    @classmethod
+    def store_breakdown(cls, user, result):
+        """
+        Save an evaluation as the user's score components and stored score
+        """
+        savings = result['factors']['savings']['inputs']
+        CreditScoreComponents.upsert([CreditScoreComponents(
+            user_id=user.pk,
+            savings_count=savings['savings_count'],
+            total_saved=savings['total_saved'],
+            **{factor: data['points'] for factor, data in result['factors'].items()},
+        )])
+        cls.store_score(user.userprofile, result['score'])
+        return result
+
+    @classmethod
+    def calculate_score(cls, user):
+        """
+        Recalculate from the raw tables, rebuilding the user's persisted components
+        """
+        return cls.calculate_breakdown(user)['score']
+
+    @classmethod
+    def get_score(cls, user):
+        """
+        Serve the stored score while it is fresh. Otherwise sum the persisted
+        components, falling back to a full recalculation if there are none.
+        """
+        profile = user.userprofile
+        computed_at = profile.score_computed_at
+        if not profile.score_is_stale and computed_at and timezone.now() - computed_at < cls.SCORE_MAX_AGE:
+            return profile.current_credit_score
+
+        components = CreditScoreComponents.objects.filter(user=user).first()
+        if components is None:
+            return int(cls.calculate_score(user))
+
+        account_age = components.account_age
+        score = components.total(profile)
+        if components.account_age != account_age:
+            CreditScoreComponents.objects.filter(pk=components.pk).update(account_age=components.account_age)
+        cls.store_score(profile, score)
+        return profile.current_credit_score
+
+    @staticmethod
+    def store_score(profile, score):
+        previous_score = profile.current_credit_score
+        profile.current_credit_score = int(score)
+        profile.score_is_stale = False
+        profile.last_score_update = profile.score_computed_at = timezone.now()
+        UserProfile.objects.filter(pk=profile.pk).update(
+            current_credit_score=profile.current_credit_score,
+            score_is_stale=False,
+            last_score_update=profile.last_score_update,
+            score_computed_at=profile.score_computed_at,
+        )
+        if profile.current_credit_score != previous_score:
+            CreditScoreHistory.objects.create(
+                user_id=profile.user_id,
+                score=profile.current_credit_score,
+                recorded_at=profile.score_computed_at,
+            )
+            CreditScoreCalculator._scores_changed()
+
+    @staticmethod
+    def evaluation_rows(user_ids, now=None):
+        """
+        Plain tuples of evaluate_many results, as store_many takes them
+        """
+        return [
+            (profile.pk, profile.user_id, profile.current_credit_score, points,
+             profile.savings_count, profile.total_saved or 0)
+            for profile, points in CreditScoreCalculator.evaluate_many(user_ids, now)
+        ]
+
+    @classmethod
+    def store_many(cls, rows):
+        """
+        Bulk store_score plus components for evaluation_rows output
+        """
+        now = timezone.now()
+        profiles = []
+        components = []
+        history = []
+        for profile_pk, user_id, previous_score, points, savings_count, total_saved in rows:
+            score = int(cls.total_score(points))
+            profiles.append(UserProfile(
+                pk=profile_pk,
+                current_credit_score=score,
+                score_is_stale=False,
+                last_score_update=now,
+                score_computed_at=now,
+            ))
+            if score != previous_score:
+                history.append(CreditScoreHistory(user_id=user_id, score=score, recorded_at=now))
+            components.append(CreditScoreComponents(
+                user_id=user_id, savings_count=savings_count, total_saved=total_saved, **points
+            ))
+        UserProfile.objects.bulk_update(
+            profiles, ['current_credit_score', 'score_is_stale', 'last_score_update', 'score_computed_at'], batch_size=500
+        )
+        CreditScoreComponents.upsert(components)
+        CreditScoreHistory.objects.bulk_create(history, batch_size=500)
+        if history:
+            cls._scores_changed()
+
+    @staticmethod
+    def _scores_changed():
+        # Scores are written with update(), which sends no signals
+        from . import dashboard_cache
+        dashboard_cache.invalidate('kpis')
+
+    @classmethod
+    def rescore_many(cls, user_ids, chunk_size=1000):
+        """
+        Recalculate and store the scores of many users, chunk by chunk
+        """
+        user_ids = list(user_ids)
+        for i in range(0, len(user_ids), chunk_size):
+            with transaction.atomic():
+                cls.store_many(cls.evaluation_rows(user_ids[i:i + chunk_size]))
+
+    @staticmethod
+    def mark_stale(*user_ids):
+        """
+        Flag scores for recalculation on their next read
+        """
+        UserProfile.objects.filter(user_id__in=user_ids).update(score_is_stale=True)
     
     @staticmethod
     def get_max_loan_amount(score):
         """
-        Determine maximum loan amount based on score
-        """
-        if score >= 750:
-            return 500000  # MWK 500,000
-        elif score >= 700:
-            return 250000  # MWK 250,000
-        elif score >= 650:
-            return 100000  # MWK 100,000
-        elif score >= 600:
-            return 50000   # MWK 50,000
-        elif score >= 550:
-            return 25000   # MWK 25,000
-        elif score >= 500:
-            return 10000   # MWK 10,000
-        else:
-            return 5000    # MWK 5,000 (starter loan)
+        Determine maximum loan amount based on score (active pricing policy)
+        """
+        from .pricing import quote
+        return quote(score)['max_loan_amount']
     
     @staticmethod
     def get_interest_rate(score):
         """
-        Interest rate based on credit score
-        """
-        if score >= 750:
-            return Decimal('5.0')   # 5% interest
-        elif score >= 700:
-            return Decimal('8.0')   # 8%
-        elif score >= 650:
-            return Decimal('12.0')  # 12%
-        elif score >= 600:
-            return Decimal('15.0')  # 15%
-        elif score >= 550:
-            return Decimal('18.0')  # 18%
-        elif score >= 500:
-            return Decimal('22.0')  # 22%
-        else:
-            return Decimal('25.0')  # 25% (high risk)
+        Interest rate based on credit score (active pricing policy)
+        """
+        from .pricing import quote
+        return quote(score)['interest_rate']
+
+# ============================================
+# PRICING POLICY
+# ============================================
+
+class PricingPolicy(models.Model):
+    """
+    A versioned set of score tiers that set max loan amount and interest rate.
+    Exactly one version is active at a time.
+    """
+    version = models.PositiveIntegerField(unique=True)
+    description = models.CharField(max_length=200, blank=True)
+    is_active = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Pricing v{self.version}{' (active)' if self.is_active else ''}"
+
+    def activate(self):
+        """
+        Make this the only active version
+        """
+        with transaction.atomic():
+            PricingPolicy.objects.filter(is_active=True).exclude(pk=self.pk).update(is_active=False)
+            self.is_active = True
+            self.activated_at = timezone.now()
+            self.save(update_fields=['is_active', 'activated_at'])
+
+
+class PricingTier(models.Model):
+    """
+    Scores at or above min_score (up to the next tier) get these terms
+    """
+    policy = models.ForeignKey(PricingPolicy, on_delete=models.CASCADE, related_name='tiers')
+    min_score = models.IntegerField()
+    max_loan_amount = models.PositiveIntegerField()  # MWK
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+
+    class Meta:
+        ordering = ['min_score']
+        unique_together = [('policy', 'min_score')]
+
+    def __str__(self):
+        return f"v{self.policy.version}: {self.min_score}+ -> MWK {self.max_loan_amount:,} at {self.interest_rate}%"
+
+    def _check_editable(self):
+        # Processes cache the active table by version, so a version's terms
+        # are frozen once it has been activated; changes need a new version
+        if PricingPolicy.objects.filter(pk=self.policy_id, activated_at__isnull=False).exists():
+            raise ValidationError(
+                f"Pricing v{self.policy.version} has been activated; create a new version to change its tiers.")
+
+    def save(self, *args, **kwargs):
+        self._check_editable()
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self._check_editable()
+        return super().delete(*args, **kwargs)
+
+# ============================================
+# CREDIT SCORE HISTORY
+# ============================================
+
+class CreditScoreHistory(models.Model):
+    """
+    Append-only score trajectory: a point is written only when the score changes
+    """
+    GRANULARITIES = ('raw', 'day', 'week', 'month')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='score_history')
+    score = models.IntegerField()
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'recorded_at'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.score} at {self.recorded_at}"
+
+    @staticmethod
+    def bucket(recorded_at, granularity):
+        """
+        Start of the day/week/month a point falls in
+        """
+        day = timezone.localtime(recorded_at).date()
+        if granularity == 'week':
+            return day - timedelta(days=day.weekday())
+        if granularity == 'month':
+            return day.replace(day=1)
+        return day
+
+    @classmethod
+    def series(cls, user, start=None, end=None, granularity='day'):
+        """
+        [(time, score)] for charts, keeping the last score in each bucket.
+        One range scan over the (user, recorded_at) index.
+        """
+        points = cls.objects.filter(user=user)
+        if start:
+            points = points.filter(recorded_at__gte=start)
+        if end:
+            points = points.filter(recorded_at__lte=end)
+        points = points.order_by('recorded_at').values_list('recorded_at', 'score')
+        if granularity == 'raw':
+            return list(points)
+
+        buckets = {}
+        for recorded_at, score in points:
+            buckets[cls.bucket(recorded_at, granularity)] = score
+        return list(buckets.items())
+
+    @classmethod
+    def score_at(cls, user, when):
+        """
+        The user's score as of a past moment, or None before their first point
+        """
+        return (
+            cls.objects.filter(user=user, recorded_at__lte=when)
+            .order_by('-recorded_at').values_list('score', flat=True).first()
+        )
+
+# ============================================
+# PERSISTED SCORE COMPONENTS
+# ============================================
+
+class CreditScoreComponents(models.Model):
+    """
+    Per-factor points kept up to date as loans, payments, savings, vouches
+    and mobile accounts are written, so a score is a sum instead of a scan
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='score_components')
+
+    payment_history = models.FloatField(default=0)
+    credit_utilization = models.IntegerField(default=50)
+    account_age = models.IntegerField(default=0)
+    social_trust = models.IntegerField(default=0)
+    savings = models.IntegerField(default=0)
+    verification = models.IntegerField(default=0)
+    documents = models.IntegerField(default=0)
+
+    # Running savings inputs, incremented per deposit
+    savings_count = models.IntegerField(default=0)
+    total_saved = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    STORED_FIELDS = CreditScoreCalculator.FACTORS + ('savings_count', 'total_saved')
+
+    def __str__(self):
+        return f"{self.user.username} - score components"
+
+    def points(self):
+        return {factor: getattr(self, factor) for factor in CreditScoreCalculator.FACTORS}
+
+    def total(self, profile, now=None):
+        """
+        Score from the stored points, with account age brought up to date
+        """
+        self.account_age = CreditScoreCalculator.account_age_points(profile.account_created, now or timezone.now())
+        return CreditScoreCalculator.total_score(self.points())
+
+    @classmethod
+    def build(cls, user_ids, now=None):
+        """
+        Components recomputed from the raw tables, unsaved
+        """
+        return {
+            profile.user_id: cls(
+                user_id=profile.user_id,
+                savings_count=profile.savings_count,
+                total_saved=profile.total_saved or 0,
+                **points,
+            )
+            for profile, points in CreditScoreCalculator.evaluate_many(user_ids, now)
+        }
+
+    @classmethod
+    def upsert(cls, components):
+        cls.objects.bulk_create(
+            components,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[*cls.STORED_FIELDS, 'updated_at'],
+        )
+
+    @classmethod
+    def rebuild(cls, user_ids, now=None):
+        components = cls.build(user_ids, now)
+        cls.upsert(components.values())
+        return components
+
+    @classmethod
+    def add_savings(cls, user_id, amount):
+        """
+        Count a new savings transaction without re-reading the ledger
+        """
+        rows = cls.objects.filter(user_id=user_id)
+        if rows.update(savings_count=F('savings_count') + 1, total_saved=F('total_saved') + amount):
+            savings_count, total_saved = rows.values_list('savings_count', 'total_saved').get()
+            rows.update(savings=CreditScoreCalculator.savings_points(savings_count, total_saved))
+
+    @classmethod
+    def refresh(cls, user_id, *inputs):
+        """
+        Recompute only the components fed by the given inputs:
+        'loans', 'social', 'savings', 'mobile' and/or 'profile'
+        """
+        rows = cls.objects.filter(user_id=user_id)
+        if not rows.exists():
+            return  # Built in full on the next score read
+
+        updates = {}
+        if {'loans', 'mobile', 'profile'} & set(inputs):
+            profile = UserProfile.objects.filter(user_id=user_id).values(*UserProfile.SCORE_INPUT_FIELDS).first()
+            if profile is None:
+                return  # User is being deleted
+        if {'loans', 'profile'} & set(inputs):
+            loans = list(CreditScoreCalculator.loan_rows([user_id]))
+            updates['payment_history'] = CreditScoreCalculator.payment_points(loans)
+            updates['credit_utilization'] = CreditScoreCalculator.utilization_points(loans, profile['monthly_income'])
+        if 'social' in inputs:
+            counts = SocialVouch.objects.filter(Q(vouchee_id=user_id) | Q(voucher_id=user_id)).aggregate(
+                vouch_count=Count('pk', filter=Q(vouchee_id=user_id, is_active=True)),
+                bad_vouch_count=Count('pk', filter=Q(voucher_id=user_id, vouchee_defaulted=True)),
+            )
+            updates['social_trust'] = CreditScoreCalculator.social_points(**counts)
+        if 'savings' in inputs:
+            totals = SavingsCheckpoint.totals([user_id])[user_id]
+            totals = {'savings_count': totals['transaction_count'], 'total_saved': totals['balance']}
+            updates.update(totals, savings=CreditScoreCalculator.savings_points(**totals))
+        if {'mobile', 'profile'} & set(inputs):
+            verified_mobile_count = MobileMoneyAccount.objects.filter(user_id=user_id, is_verified=True).count()
+            updates['verification'] = CreditScoreCalculator.verification_points(
+                profile['is_verified'], verified_mobile_count)
+        if 'profile' in inputs:
+            updates['documents'] = CreditScoreCalculator.document_points(
+                profile['id_verified'], profile['address_verified'], profile['income_verified'])
+        rows.update(**updates)
 
 # ============================================
 # LOAN APPLICATION APPROVAL
 # ============================================
 
 class LoanApprovalEngine:
-    @staticmethod
-    def evaluate_application(user, requested_amount):
+    """
+    Runs an application through ordered stages, cheapest first, so most
+    rejections never pay for scoring. Each stage is timed; the queue stores
+    the timings on the LoanApplicationJob.
+    """
+    STAGES = ('documents', 'eligibility', 'scoring', 'amount')
+
+    @classmethod
+    def evaluate_application(cls, user, requested_amount):
         """
         Evaluate if user can get the loan
         """
         profile = user.userprofile
-        # Check document verification
-        if not profile.all_documents_verified():
+        application = {
+            'user': user,
+            'profile': profile,
+            'requested_amount': requested_amount,
+            'score': profile.current_credit_score,
+        }
+        stage_ms = {}
+        for stage in cls.STAGES:
+            started = time.perf_counter()
+            rejection = getattr(cls, f'check_{stage}')(application)
+            stage_ms[stage] = (time.perf_counter() - started) * 1000
+            if rejection:
+                logger.info(f"Loan application by {user.username} rejected at {stage}: {cls._timings(stage_ms)}")
+                return {**rejection, 'stage_ms': stage_ms, 'rejected_stage': stage}
+        logger.info(f"Loan application by {user.username} approved: {cls._timings(stage_ms)}")
+
+        interest_rate = application['interest_rate']
+        return {
+            'approved': True,
+            'amount': requested_amount,
+            'interest_rate': interest_rate,
+            'pricing_version': application['pricing_version'],
+            'score': application['score'],
+            'message': f'Congratulations! Approved at {interest_rate}% interest.',
+            'stage_ms': stage_ms,
+        }
+
+    @staticmethod
+    def _timings(stage_ms):
+        return ', '.join(f"{stage} {ms:.1f}ms" for stage, ms in stage_ms.items())
+
+    @staticmethod
+    def check_documents(application):
+        if not application['profile'].all_documents_verified():
             return {
                 'approved': False,
                 'reason': 'Please verify all required documents (ID, address, income) before applying.',
-                'score': profile.current_credit_score
+                'score': application['score']
             }
-        
-        # Recalculate current score
-        score = CreditScoreCalculator.calculate_score(user)
-        
-        # Get max allowed
-        max_amount = CreditScoreCalculator.get_max_loan_amount(score)
-        interest_rate = CreditScoreCalculator.get_interest_rate(score)
-        
-        # Check if they have active loans
-        active_loans = MicroLoan.objects.filter(user=user, status='active')
-        if active_loans.exists():
+
+    @staticmethod
+    def check_eligibility(application):
+        """
+        Active loan and recent default checks in one query
+        """
+        loans = MicroLoan.objects.filter(user=application['user']).aggregate(
+            active=Count('pk', filter=Q(status='active')),
+            recent_defaults=Count('pk', filter=Q(
+                status='defaulted', approved_at__gte=timezone.now() - timedelta(days=90))),
+        )
+        if loans['active']:
             return {
                 'approved': False,
                 'reason': 'You have an active loan. Pay it off first.',
-                'score': score
+                'score': application['score']
             }
-        
-        # Check if they defaulted recently
-        recent_defaults = MicroLoan.objects.filter(
-            user=user, 
-            status='defaulted',
-            approved_at__gte=timezone.now() - timedelta(days=90)
-        )
-        if recent_defaults.exists():
+        if loans['recent_defaults']:
             return {
                 'approved': False,
                 'reason': 'Recent default detected. Build your credit first.',
-                'score': score
+                'score': application['score']
             }
-        
-        # Check amount requested
-        if requested_amount > max_amount:
+
+    @staticmethod
+    def check_scoring(application):
+        # Current score (recalculated only if its inputs changed)
+        application['score'] = CreditScoreCalculator.get_score(application['user'])
+
+        # Get max allowed and rate from the active pricing policy
+        from .pricing import quote
+        terms = quote(application['score'])
+        application['max_amount'] = terms['max_loan_amount']
+        application['interest_rate'] = terms['interest_rate']
+        application['pricing_version'] = terms['pricing_version']
+
+    @staticmethod
+    def check_amount(application):
+        max_amount = application['max_amount']
+        if application['requested_amount'] > max_amount:
             return {
                 'approved': False,
                 'reason': f'Maximum loan for your score: MWK {max_amount:,.0f}',
                 'max_amount': max_amount,
-                'score': score
+                'score': application['score']
             }
-        
-        # APPROVED!
-        return {
-            'approved': True,
-            'amount': requested_amount,
-            'interest_rate': interest_rate,
-            'score': score,
-            'message': f'Congratulations! Approved at {interest_rate}% interest.'
-        }
+
+
+# ============================================
+# LOAN REPAYMENTS
+# ============================================
+
+class LoanPaymentService:
+    """
+    Posts a repayment as one transaction: the payment, the savings deduction
+    and the loan balance commit together or not at all. The payer's profile
+    row and the loan row are locked (always in that order) so concurrent
+    payments queue up instead of reading the same balance; on SQLite the
+    IMMEDIATE transaction mode gives the same serialization.
+    """
+
+    @staticmethod
+    def post_payment(user, loan_id, amount, payment_method, transaction_reference=''):
+        """
+        Returns {'success', 'message', 'loan', 'payment', 'fully_paid'}
+        """
+        if amount <= 0:
+            return {'success': False, 'message': 'Repayment amount must be positive.'}
+
+        with transaction.atomic():
+            UserProfile.objects.select_for_update().filter(user=user).exists()
+            loan = MicroLoan.objects.select_for_update().filter(pk=loan_id, user=user).first()
+            if loan is None:
+                return {'success': False, 'message': 'Loan not found.'}
+
+            # A retried mobile money callback carries the same reference
+            if transaction_reference:
+                existing = loan.payments.filter(transaction_reference=transaction_reference).first()
+                if existing is not None:
+                    return {
+                        'success': True, 'message': 'Payment already received.',
+                        'loan': loan, 'payment': existing, 'fully_paid': loan.status == 'paid',
+                    }
+
+            if loan.status not in ['approved', 'active']:
+                return {'success': False, 'message': 'This loan cannot be repaid.', 'loan': loan}
+            if amount > SavingsDeposit.get_current_balance(user):
+                return {'success': False, 'message': 'Insufficient savings balance for repayment.', 'loan': loan}
+
+            now = timezone.now()
+            MicroLoan.objects.filter(pk=loan.pk).update(amount_paid=F('amount_paid') + amount)
+            fully_paid = MicroLoan.objects.filter(
+                pk=loan.pk, amount_paid__gte=F('total_amount_due'),
+            ).update(status='paid', paid_at=now)
+            loan.refresh_from_db()
+
+            # Created after the loan update so its signal rescores the final state
+            days_from_due = (now.date() - loan.due_date).days if loan.due_date else 0
+            payment = LoanPayment.objects.create(
+                loan=loan,
+                amount=amount,
+                payment_method=payment_method,
+                transaction_reference=transaction_reference,
+                was_on_time=days_from_due <= 0,
+                days_from_due=days_from_due,
+            )
+            SavingsDeposit.objects.create(
+                user=user,
+                amount=-amount,
+                transaction_type='REPAYMENT_DEDUCTION',
+                balance_after=0,  # Set from the savings account on save
+            )
+
+        if fully_paid:
+            message = 'Congratulations! Loan fully paid. Your credit score will increase!'
+        else:
+            message = f'Payment of MWK {amount:,.0f} received.'
+        return {'success': True, 'message': message, 'loan': loan, 'payment': payment, 'fully_paid': bool(fully_paid)}
+
+
+# ============================================
+# PORTFOLIO ANALYTICS ROLLUPS
+# ============================================
+# One row per (day, district, employment_status) so dashboards and trend
+# charts read a few hundred rows instead of scanning every loan, payment
+# and ledger row. New facts are picked up from per-table high-water marks;
+# edits and deletes mark their days dirty. rollup_portfolio_daily recomputes
+# those days whole.
+
+class RollupWatermark(models.Model):
+    """
+    Highest primary key of a fact table already folded into the rollups
+    """
+    source = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} <= {self.last_id}"
+
+
+class RollupDirtyDay(models.Model):
+    """
+    A day whose rollup rows are out of date because an existing fact changed
+    """
+    day = models.DateField(unique=True)
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.day)
+
+
+class DailyPortfolioRollup(models.Model):
+    """
+    Portfolio activity on one day for one borrower segment (the user's
+    current district and employment status).
+
+    Loans count on the day they were approved: loans_defaulted is how many
+    of that day's originations are now in default. Repayments count on the
+    payment day; revenue is the interest share of each payment. New savings
+    are DEPOSIT ledger rows (loan disbursements and repayment deductions
+    are excluded).
+    """
+    day = models.DateField()
+    district = models.CharField(max_length=100)
+    employment_status = models.CharField(max_length=50)
+
+    loans_originated = models.IntegerField(default=0)
+    amount_disbursed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    loans_defaulted = models.IntegerField(default=0)
+    repayments = models.IntegerField(default=0)
+    amount_repaid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    savings_deposits = models.IntegerField(default=0)
+    amount_saved = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    METRICS = (
+        'loans_originated', 'amount_disbursed', 'loans_defaulted', 'repayments',
+        'amount_repaid', 'revenue', 'savings_deposits', 'amount_saved',
+    )
+    # source: (model, date field the facts roll up on)
+    SOURCES = {
+        'loans': (MicroLoan, 'approved_at'),
+        'payments': (LoanPayment, 'payment_date'),
+        'savings': (SavingsDeposit, 'deposit_date'),
+    }
+    # source: path from a fact to its borrower
+    USER_PATHS = {'loans': 'user_id', 'payments': 'loan__user_id', 'savings': 'user_id'}
+
+    class Meta:
+        unique_together = ('day', 'district', 'employment_status')
+
+    def __str__(self):
+        return f"{self.day} {self.district}/{self.employment_status}"
+
+    @staticmethod
+    def local_day(moment):
+        return timezone.localtime(moment).date() if moment else None
+
+    @classmethod
+    def mark_dirty(cls, days):
+        days = {day for day in days if day is not None}
+        if days:
+            RollupDirtyDay.objects.bulk_create([RollupDirtyDay(day=day) for day in days], ignore_conflicts=True)
+
+    @classmethod
+    def mark_user_dirty(cls, user_id):
+        """
+        Mark every day with one of the user's facts, whose rows move to
+        another segment when the user's district or employment status changes
+        """
+        days = set()
+        for source, (model, date_field) in cls.SOURCES.items():
+            days.update(
+                model.objects.filter(**{cls.USER_PATHS[source]: user_id, f'{date_field}__isnull': False})
+                .annotate(day=TruncDate(date_field)).order_by().values_list('day', flat=True).distinct()
+            )
+        cls.mark_dirty(days)
+
+    @classmethod
+    def _facts(cls, days):
+        """
+        {(day, district, employment_status): {metric: value}} straight from
+        the fact tables for the given days
+        """
+        money = models.DecimalField(max_digits=14, decimal_places=2)
+        rows = {}
+
+        def collect(queryset, date_field, profile_path, **aggregates):
+            queryset = queryset.annotate(day=TruncDate(date_field)).filter(day__in=days)
+            grouped = queryset.order_by().values(
+                'day', district=F(f'{profile_path}__district'), employment_status=F(f'{profile_path}__employment_status'),
+            ).annotate(**aggregates)
+            for row in grouped:
+                key = (row.pop('day'), row.pop('district') or '', row.pop('employment_status') or '')
+                rows.setdefault(key, {}).update(row)
+
+        collect(
+            MicroLoan.objects.exclude(status__in=['pending', 'rejected']).filter(approved_at__isnull=False),
+            'approved_at', 'user__userprofile',
+            loans_originated=Count('pk'),
+            amount_disbursed=Sum('amount'),
+            loans_defaulted=Count('pk', filter=Q(status='defaulted')),
+        )
+        collect(
+            LoanPayment.objects.all(), 'payment_date', 'loan__user__userprofile',
+            repayments=Count('pk'),
+            amount_repaid=Sum('amount'),
+            revenue=Sum(ExpressionWrapper(
+                F('amount') * (F('loan__total_amount_due') - F('loan__amount')) / F('loan__total_amount_due'),
+                output_field=money)),
+        )
+        collect(
+            SavingsDeposit.objects.filter(transaction_type='DEPOSIT', amount__gt=0), 'deposit_date', 'user__userprofile',
+            savings_deposits=Count('pk'),
+            amount_saved=Sum('amount'),
+        )
+        return rows
+
+    @classmethod
+    def rebuild_days(cls, days):
+        """
+        Replace the rollup rows of days with fresh aggregates. Returns the
+        number of rows written.
+        """
+        days = sorted(set(days))
+        if not days:
+            return 0
+        with transaction.atomic():
+            # Cleared first, so a day marked again mid-rebuild stays dirty
+            RollupDirtyDay.objects.filter(day__in=days).delete()
+            rollups = cls._rollups(days)
+            cls.objects.filter(day__in=days).delete()
+            cls.objects.bulk_create(rollups)
+        return len(rollups)
+
+    @classmethod
+    def _rollups(cls, days):
+        cent = Decimal('0.01')
+        facts = cls._facts(days)
+        rollups = []
+        for (day, district, employment_status), values in facts.items():
+            rollup = cls(day=day, district=district, employment_status=employment_status)
+            for metric in cls.METRICS:
+                value = values.get(metric) or 0
+                if isinstance(cls._meta.get_field(metric), models.DecimalField):
+                    value = Decimal(value).quantize(cent)
+                setattr(rollup, metric, value)
+            rollups.append(rollup)
+        return rollups
+
+    @classmethod
+    def pending_days(cls, full=False):
+        """
+        Days with facts past the watermarks or marked dirty (every day with
+        facts if full), and the new watermarks {source: last_id} covering them
+        """
+        days = set(RollupDirtyDay.objects.values_list('day', flat=True))
+        marks = {} if full else dict(RollupWatermark.objects.values_list('source', 'last_id'))
+        watermarks = {}
+        for source, (model, date_field) in cls.SOURCES.items():
+            new = model.objects.filter(pk__gt=marks.get(source, 0))
+            last_id = new.aggregate(last=models.Max('pk'))['last']
+            if last_id is None:
+                continue
+            watermarks[source] = last_id
+            days.update(
+                new.filter(pk__lte=last_id, **{f'{date_field}__isnull': False})
+                .annotate(day=TruncDate(date_field)).order_by().values_list('day', flat=True).distinct()
+            )
+        return days, watermarks
+
+    @classmethod
+    def advance(cls, watermarks):
+        for source, last_id in watermarks.items():
+            RollupWatermark.objects.update_or_create(source=source, defaults={'last_id': last_id})
+
+    @classmethod
+    def series(cls, start, end, **segment):
+        """
+        Portfolio totals per day from start to end inclusive, optionally for
+        one district and/or employment_status
+        """
+        rows = cls.objects.filter(day__gte=start, day__lte=end, **segment).order_by('day').values('day').annotate(
+            **{metric: Sum(metric) for metric in cls.METRICS})
+        return list(rows)
@@ -0,0 +1,111 @@
+"""
+Process-level cache of the active pricing policy.
+
+The active PricingPolicy is loaded once into sorted tier boundaries and
+looked up with bisect (or numpy.searchsorted for bulk quotes). Saving a
+policy or tier drops this process's cache; other processes notice a newly
+activated version within RECHECK_SECONDS. That check compares versions
+only, which is enough because an activated version's tiers are frozen.
+"""
+import bisect
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from .models import PricingPolicy
+
+# Terms used when no policy is active: the original hard-coded ladder
+DEFAULT_TIERS = [
+    (0, 5000, Decimal('25.0')),     # MWK 5,000 starter loan, high risk
+    (500, 10000, Decimal('22.0')),
+    (550, 25000, Decimal('18.0')),
+    (600, 50000, Decimal('15.0')),
+    (650, 100000, Decimal('12.0')),
+    (700, 250000, Decimal('8.0')),
+    (750, 500000, Decimal('5.0')),
+]
+
+# How often a process checks whether another version was activated
+RECHECK_SECONDS = 60
+
+
+class PricingTable:
+    """
+    Tiers of one policy version as sorted parallel arrays
+    """
+    def __init__(self, version, tiers):
+        tiers = sorted(tiers)
+        self.version = version
+        self.boundaries = [min_score for min_score, _, _ in tiers]
+        self.max_loan_amounts = [amount for _, amount, _ in tiers]
+        self.interest_rates = [rate for _, _, rate in tiers]
+        self._boundary_array = np.array(self.boundaries)
+        self._amount_array = np.array(self.max_loan_amounts)
+        self._rate_array = np.array([float(rate) for rate in self.interest_rates])
+
+    def quote(self, score):
+        # Scores below the lowest boundary get the lowest tier
+        i = max(bisect.bisect_right(self.boundaries, score) - 1, 0)
+        return {
+            'max_loan_amount': self.max_loan_amounts[i],
+            'interest_rate': self.interest_rates[i],
+            'pricing_version': self.version,
+        }
+
+    def quote_many(self, scores):
+        i = np.maximum(np.searchsorted(self._boundary_array, scores, side='right') - 1, 0)
+        return {
+            'max_loan_amount': self._amount_array[i],
+            'interest_rate': self._rate_array[i],
+            'pricing_version': self.version,
+        }
+
+
+_lock = threading.Lock()
+_table = None
+_checked_at = 0.0
+
+
+def _load():
+    policy = PricingPolicy.objects.filter(is_active=True).prefetch_related('tiers').first()
+    if policy is None or not policy.tiers.all():
+        return PricingTable(None, DEFAULT_TIERS)
+    return PricingTable(
+        policy.version,
+        [(tier.min_score, tier.max_loan_amount, tier.interest_rate) for tier in policy.tiers.all()],
+    )
+
+
+def active_table():
+    global _table, _checked_at
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < RECHECK_SECONDS:
+        return _table
+    with _lock:
+        if _table is None or now - _checked_at >= RECHECK_SECONDS:
+            active_version = PricingPolicy.objects.filter(is_active=True).values_list('version', flat=True).first()
+            if _table is None or active_version != _table.version:
+                _table = _load()
+            _checked_at = now
+    return _table
+
+
+def invalidate():
+    global _table
+    _table = None
+
+
+def quote(score):
+    """
+    {'max_loan_amount', 'interest_rate', 'pricing_version'} for one score
+    """
+    return active_table().quote(score)
+
+
+def price_many(scores):
+    """
+    Vectorized quote for bulk offers: arrays aligned with scores
+    """
+    return active_table().quote_many(np.asarray(scores))
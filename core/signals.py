@@ -1,26 +1,176 @@
-from django.db.models.signals import post_save
+import threading
+
+from django.db.models.signals import post_save, post_delete
+from django.db.models import F
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import (
+    UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount,
+    SocialVouch, SavingsDeposit, SavingsAccount, SavingsCheckpoint, CreditScoreCalculator, CreditScoreComponents,
+    PricingPolicy, PricingTier, DailyPortfolioRollup
+)
+from . import dashboard_cache, pricing
 from django.utils import timezone
 
+# Bulk jobs (e.g. seed_data) set thread_local.disable_signals = True
+thread_local = threading.local()
+
+
+def signals_disabled():
+    return getattr(thread_local, 'disable_signals', False)
+
+
 @receiver(post_save, sender=User)
 def manage_user_profile(sender, instance, created, **kwargs):
     """
-    Create or update UserProfile when User is created or saved
-    """
-    if created:
-        UserProfile.objects.create(
-            user=instance,
-            current_credit_score=300,
-            phone_number=None,  # Placeholder (allows unique constraint)
-            national_id=None,   # Placeholder (allows unique constraint)
-            date_of_birth=timezone.now().date(),  # Placeholder
-            district="Unknown",
-            traditional_authority="Unknown",
-            village="Unknown",
-            employment_status="unemployed",
-        )
-    else:
-        if hasattr(instance, 'userprofile'):
-            instance.userprofile.save()
\ No newline at end of file
+    Create the UserProfile when a User is created. Later User saves (such as
+    each login's last_login update) leave the profile alone.
+    """
+    if signals_disabled() or not created:
+        return
+    UserProfile.objects.create(
+        user=instance,
+        current_credit_score=300,
+        phone_number=None,  # Placeholder (allows unique constraint)
+        national_id=None,   # Placeholder (allows unique constraint)
+        date_of_birth=timezone.now().date(),  # Placeholder
+        district="Unknown",
+        traditional_authority="Unknown",
+        village="Unknown",
+        employment_status="unemployed",
+    )
+
+# ============================================
+# CREDIT SCORE MAINTENANCE
+# ============================================
+# Each write updates only the score components it feeds and marks the
+# affected scores stale; the next read sums the components.
+
+@receiver(post_save, sender=UserProfile)
+def update_profile_components(sender, instance, created, **kwargs):
+    if not signals_disabled() and not created and getattr(instance, '_score_inputs_changed', False):
+        CreditScoreComponents.refresh(instance.user_id, 'profile')
+
+
+@receiver([post_save, post_delete], sender=MicroLoan)
+def update_loan_components(sender, instance, **kwargs):
+    if not signals_disabled():
+        CreditScoreComponents.refresh(instance.user_id, 'loans')
+        CreditScoreCalculator.mark_stale(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=LoanPayment)
+def update_payment_components(sender, instance, **kwargs):
+    if signals_disabled():
+        return
+    try:
+        user_id = instance.loan.user_id
+    except MicroLoan.DoesNotExist:
+        return  # Loan deleted along with its payments
+    CreditScoreComponents.refresh(user_id, 'loans')
+    CreditScoreCalculator.mark_stale(user_id)
+
+
+@receiver([post_save, post_delete], sender=SavingsDeposit)
+def update_savings_components(sender, instance, created=False, **kwargs):
+    if not signals_disabled():
+        if created:
+            CreditScoreComponents.add_savings(instance.user_id, instance.amount)
+        else:
+            CreditScoreComponents.refresh(instance.user_id, 'savings')
+        CreditScoreCalculator.mark_stale(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=SocialVouch)
+def update_vouch_components(sender, instance, **kwargs):
+    """
+    A vouch counts for the vouchee and, once defaulted, against the voucher
+    """
+    if not signals_disabled():
+        CreditScoreComponents.refresh(instance.voucher_id, 'social')
+        CreditScoreComponents.refresh(instance.vouchee_id, 'social')
+        CreditScoreCalculator.mark_stale(instance.voucher_id, instance.vouchee_id)
+
+
+@receiver([post_save, post_delete], sender=MobileMoneyAccount)
+def update_mobile_components(sender, instance, **kwargs):
+    if not signals_disabled():
+        CreditScoreComponents.refresh(instance.user_id, 'mobile')
+        CreditScoreCalculator.mark_stale(instance.user_id)
+
+
+# ============================================
+# SAVINGS BALANCE
+# ============================================
+# Inserts post to the account in SavingsDeposit.save; deletes are reversed
+# here, and edits or deletes drop the checkpoints covering the row. Not
+# gated on signals_disabled: these must always match the ledger.
+
+@receiver(post_delete, sender=SavingsDeposit)
+def reverse_savings_deposit(sender, instance, **kwargs):
+    SavingsAccount.objects.filter(user_id=instance.user_id).update(
+        balance=F('balance') - instance.amount, updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=SavingsDeposit)
+def invalidate_savings_checkpoints(sender, instance, created=False, **kwargs):
+    """
+    Checkpoints are only valid while the rows they cover are unchanged
+    """
+    if not created:
+        SavingsCheckpoint.invalidate(instance.user_id, instance.pk)
+
+
+# ============================================
+# PORTFOLIO ROLLUPS
+# ============================================
+# New facts reach the rollups through their high-water marks; edits and
+# deletes of existing facts mark the day they roll up on as dirty, as does
+# a change to the segment of a borrower with facts on that day.
+
+@receiver([post_save, post_delete], sender=MicroLoan)
+@receiver([post_save, post_delete], sender=LoanPayment)
+@receiver([post_save, post_delete], sender=SavingsDeposit)
+def mark_rollup_day_dirty(sender, instance, created=False, **kwargs):
+    if not created:
+        date_field = {MicroLoan: 'approved_at', LoanPayment: 'payment_date', SavingsDeposit: 'deposit_date'}[sender]
+        DailyPortfolioRollup.mark_dirty([DailyPortfolioRollup.local_day(getattr(instance, date_field))])
+
+
+@receiver(post_save, sender=UserProfile)
+def mark_segment_days_dirty(sender, instance, created, **kwargs):
+    """
+    Rollups group facts by the borrower's current segment, so moving a
+    borrower dirties every day they have facts on
+    """
+    if not created and getattr(instance, '_segment_changed', False):
+        DailyPortfolioRollup.mark_user_dirty(instance.user_id)
+
+
+# ============================================
+# DASHBOARD CACHE
+# ============================================
+
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=MicroLoan)
+@receiver([post_save, post_delete], sender=LoanPayment)
+@receiver([post_save, post_delete], sender=MobileMoneyAccount)
+@receiver([post_save, post_delete], sender=SocialVouch)
+def invalidate_dashboard_sections(sender, instance, created=False, **kwargs):
+    # Profile edits reach the KPIs through the stored score, which
+    # CreditScoreCalculator invalidates itself; only new profiles count here
+    if sender is UserProfile and kwargs.get('signal') is post_save and not created:
+        return
+    sections = dashboard_cache.sections_for(sender)
+    if sections:
+        dashboard_cache.invalidate(*sections)
+
+
+# ============================================
+# PRICING POLICY CACHE
+# ============================================
+
+@receiver([post_save, post_delete], sender=PricingPolicy)
+@receiver([post_save, post_delete], sender=PricingTier)
+def invalidate_pricing(sender, **kwargs):
+    pricing.invalidate()
@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+import threading
 
-# Create your tests here.
+import numpy as np
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import batch_scoring, dashboard_cache, dashboard_sections, exports, kpis, loan_ml_predictor, loan_queue, pricing
+from .forest_engine import ForestEngine
+from .management.commands.extract_user_ml_data import extract_features_many, extract_user_features
+from .models import (
+    UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount,
+    SocialVouch, SavingsDeposit, CreditScoreCalculator, CreditScoreComponents,
+    CreditScoreHistory, PricingPolicy, PricingTier, LoanApprovalEngine, LoanApplicationJob,
+    LoanPaymentService, SavingsAccount, SavingsCheckpoint, DailyPortfolioRollup, RollupDirtyDay
+)
+
+
+def legacy_calculate_score(user):
+    """
+    The original per-loan scoring loop, kept as the reference for parity tests
+    """
+    profile = user.userprofile
+    score = 300
+
+    loans = MicroLoan.objects.filter(user=user).exclude(status__in=['pending', 'rejected'])
+    payment_score = 0
+    for loan in loans:
+        payments = loan.payments.all()
+        if payments.exists():
+            on_time_payments = payments.filter(was_on_time=True).count()
+            total_payments = payments.count()
+            points_per_payment = 200 / total_payments if total_payments > 0 else 0
+            payment_score += on_time_payments * points_per_payment
+        late_payments = payments.filter(was_on_time=False).count()
+        payment_score -= (late_payments * 50)
+        if loan.status == 'defaulted':
+            payment_score -= 100
+    score += max(0, min(200, payment_score))
+
+    active_loans = loans.filter(status='active')
+    if active_loans.exists():
+        total_borrowed = sum(loan.amount for loan in active_loans)
+        max_borrowing_capacity = profile.monthly_income * 3 if profile.monthly_income else 50000
+        utilization = float(total_borrowed) / float(max_borrowing_capacity)
+        if utilization < 0.3:
+            score += 100
+        elif utilization < 0.5:
+            score += 50
+        elif utilization < 0.7:
+            score += 20
+    else:
+        score += 50
+
+    account_age = (timezone.now() - profile.account_created).days
+    if account_age > 365:
+        score += 80
+    elif account_age > 180:
+        score += 60
+    elif account_age > 90:
+        score += 40
+    elif account_age > 30:
+        score += 20
+
+    vouch_count = SocialVouch.objects.filter(vouchee=user, is_active=True).count()
+    if vouch_count >= 5:
+        score += 60
+    elif vouch_count >= 3:
+        score += 40
+    elif vouch_count >= 1:
+        score += 20
+    score -= SocialVouch.objects.filter(voucher=user, vouchee_defaulted=True).count() * 30
+
+    savings = SavingsDeposit.objects.filter(user=user)
+    if savings.exists():
+        total_saved = sum(s.amount for s in savings)
+        if total_saved > 50000:
+            score += 50
+        elif total_saved > 20000:
+            score += 30
+        elif total_saved > 5000:
+            score += 15
+
+    if profile.is_verified:
+        score += 30
+    score += MobileMoneyAccount.objects.filter(user=user, is_verified=True).count() * 10
+    score += 10 * (profile.id_verified + profile.address_verified + profile.income_verified)
+
+    return max(300, min(850, score))
+
+
+def seed_scoring_data(num_users=40, seed=7):
+    """
+    Deterministic users with a spread of loans, payments, vouches, savings and accounts
+    """
+    rng = random.Random(seed)
+    users = [User.objects.create(username=f'seed_{i}') for i in range(num_users)]
+    for i, user in enumerate(users):
+        UserProfile.objects.filter(user=user).update(
+            monthly_income=rng.choice([None, Decimal('0'), Decimal('15000'), Decimal('80000.50')]),
+            is_verified=rng.random() < 0.5,
+            id_verified=rng.random() < 0.5,
+            address_verified=rng.random() < 0.5,
+            income_verified=rng.random() < 0.5,
+            account_created=timezone.now() - timedelta(days=rng.choice([5, 45, 100, 200, 400])),
+        )
+        for _ in range(rng.randint(0, 8)):
+            amount = Decimal(rng.randint(5, 300) * 500)
+            loan = MicroLoan.objects.create(
+                user=user,
+                amount=amount,
+                interest_rate=Decimal('12.0'),
+                duration_days=30,
+                status=rng.choice(['pending', 'rejected', 'active', 'paid', 'defaulted']),
+                score_at_application=300,
+            )
+            for _ in range(rng.randint(0, 4)):
+                LoanPayment.objects.create(
+                    loan=loan,
+                    amount=Decimal('1000'),
+                    payment_method='cash',
+                    was_on_time=rng.random() < 0.7,
+                    days_from_due=0,
+                    transaction_reference='TXN',
+                )
+        for _ in range(rng.randint(0, 6)):
+            SavingsDeposit.objects.create(user=user, amount=Decimal(rng.randint(-2, 30) * 1000), balance_after=0)
+        for _ in range(rng.randint(0, 2)):
+            MobileMoneyAccount.objects.create(
+                user=user, provider='airtel_money', phone_number=f'0999{i:04d}',
+                is_verified=rng.random() < 0.7,
+            )
+    for voucher in users:
+        for vouchee in rng.sample(users, rng.randint(0, 6)):
+            if vouchee != voucher:
+                SocialVouch.objects.create(
+                    voucher=voucher, vouchee=vouchee, trust_level=2, relationship='friend',
+                    is_active=rng.random() < 0.8, vouchee_defaulted=rng.random() < 0.1,
+                )
+    return users
+
+
+def temp_path(test, name):
+    """
+    A path in a temporary directory removed when the test finishes
+    """
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return os.path.join(directory.name, name)
+
+
+class CreditScoreCalculatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data()
+
+    def test_matches_legacy_per_loan_scoring(self):
+        for user in self.users:
+            user = User.objects.get(pk=user.pk)
+            self.assertEqual(CreditScoreCalculator.calculate_score(user), legacy_calculate_score(user), user.username)
+
+    def test_score_many_matches_single_user_scores(self):
+        scores = CreditScoreCalculator.score_many([u.pk for u in self.users])
+        for user in self.users:
+            self.assertEqual(scores[user.pk], legacy_calculate_score(User.objects.get(pk=user.pk)))
+
+    def test_query_count_does_not_grow_with_loans(self):
+        user = User.objects.create(username='heavy')
+        for _ in range(30):
+            loan = MicroLoan.objects.create(
+                user=user, amount=Decimal('5000'), interest_rate=Decimal('12.0'),
+                duration_days=30, status='paid', score_at_application=300,
+            )
+            LoanPayment.objects.create(
+                loan=loan, amount=Decimal('5600'), payment_method='cash',
+                was_on_time=True, days_from_due=-1, transaction_reference='TXN',
+            )
+        with self.assertNumQueries(2):
+            CreditScoreCalculator.score_many([user.pk])
+
+    def test_breakdown_page_agrees_with_stored_score(self):
+        user = User.objects.get(pk=self.users[3].pk)
+        self.client.force_login(user)
+        response = self.client.get(reverse('score_breakdown'))
+        self.assertEqual(response.status_code, 200)
+
+        breakdown = response.context['breakdown']
+        total = breakdown['base_score']
+        for factor in CreditScoreCalculator.FACTORS:
+            total += breakdown[factor]
+        expected = int(legacy_calculate_score(user))
+        self.assertEqual(int(max(300, min(850, total))), expected)
+        self.assertEqual(response.context['current_score'], expected)
+        self.assertEqual(UserProfile.objects.get(user=user).current_credit_score, expected)
+
+    def test_get_score_serves_fresh_stored_score(self):
+        user = User.objects.get(pk=self.users[0].pk)
+        score = CreditScoreCalculator.get_score(user)
+        user = User.objects.select_related('userprofile').get(pk=user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(CreditScoreCalculator.get_score(user), score)
+
+    def test_profile_saves_do_not_keep_an_old_score_fresh(self):
+        user = User.objects.get(pk=self.users[0].pk)
+        CreditScoreCalculator.get_score(user)
+        two_days_ago = timezone.now() - timedelta(days=2)
+        UserProfile.objects.filter(user=user).update(
+            score_computed_at=two_days_ago, account_created=timezone.now() - timedelta(days=400))
+        user.last_login = timezone.now()
+        user.save()  # As on login
+        UserProfile.objects.get(user=user).save()
+        self.assertEqual(UserProfile.objects.get(user=user).score_computed_at, two_days_ago)
+
+        score = CreditScoreCalculator.get_score(User.objects.get(pk=user.pk))
+        self.assertEqual(score, CreditScoreCalculator.score_many([user.pk])[user.pk])
+
+    def test_score_inputs_mark_score_stale(self):
+        user = User.objects.get(pk=self.users[0].pk)
+        CreditScoreCalculator.get_score(user)
+        SavingsDeposit.objects.create(user=user, amount=Decimal('60000'), balance_after=0)
+        self.assertTrue(UserProfile.objects.get(user=user).score_is_stale)
+
+        CreditScoreCalculator.get_score(User.objects.get(pk=user.pk))
+        profile = UserProfile.objects.get(user=user)
+        profile.save()
+        self.assertFalse(UserProfile.objects.get(user=user).score_is_stale)
+        profile.monthly_income = Decimal('123456')
+        profile.save()
+        self.assertTrue(UserProfile.objects.get(user=user).score_is_stale)
+
+
+class CreditScoreComponentsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='borrower')
+        self.friend = User.objects.create(username='friend')
+        CreditScoreCalculator.calculate_score(self.user)
+        CreditScoreCalculator.calculate_score(self.friend)
+
+    def assertComponentsMatchRebuild(self, user):
+        stored = CreditScoreComponents.objects.get(user=user)
+        rebuilt = CreditScoreComponents.build([user.pk])[user.pk]
+        for field in CreditScoreComponents.STORED_FIELDS:
+            self.assertEqual(getattr(stored, field), getattr(rebuilt, field), field)
+
+    def test_writes_update_components_incrementally(self):
+        loan = MicroLoan.objects.create(
+            user=self.user, amount=Decimal('20000'), interest_rate=Decimal('12.0'),
+            duration_days=30, status='active', score_at_application=300,
+        )
+        for on_time in (True, True, False):
+            LoanPayment.objects.create(
+                loan=loan, amount=Decimal('1000'), payment_method='cash',
+                was_on_time=on_time, days_from_due=0, transaction_reference='TXN',
+            )
+        SavingsDeposit.objects.create(user=self.user, amount=Decimal('30000'), balance_after=0)
+        SavingsDeposit.objects.create(user=self.user, amount=Decimal('-1000'), balance_after=0)
+        MobileMoneyAccount.objects.create(user=self.user, provider='airtel_money', phone_number='0999', is_verified=True)
+        vouch = SocialVouch.objects.create(voucher=self.friend, vouchee=self.user, trust_level=3, relationship='friend')
+        vouch.vouchee_defaulted = True
+        vouch.save()
+        profile = UserProfile.objects.get(user=self.user)
+        profile.id_verified = profile.is_verified = True
+        profile.monthly_income = Decimal('10000')
+        profile.save()
+
+        self.assertComponentsMatchRebuild(self.user)
+        self.assertComponentsMatchRebuild(self.friend)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(CreditScoreCalculator.get_score(user), int(legacy_calculate_score(user)))
+
+    def test_check_command_reports_and_fixes_drift(self):
+        CreditScoreComponents.objects.filter(user=self.user).update(savings=50)
+        out = StringIO()
+        call_command('check_score_components', '--fix', stdout=out)
+        self.assertIn('1 drifted', out.getvalue())
+        self.assertComponentsMatchRebuild(self.user)
+        self.assertTrue(UserProfile.objects.get(user=self.user).score_is_stale)
+
+
+class RescoreAllCommandTests(TestCase):
+    def test_rescores_every_user_inline(self):
+        users = seed_scoring_data(num_users=12, seed=11)
+        UserProfile.objects.update(current_credit_score=0, score_is_stale=True)
+        checkpoint = temp_path(self, 'rescore.json')
+        out = StringIO()
+        call_command('rescore_all', '--workers', '1', '--chunk-size', '5', '--checkpoint', checkpoint, stdout=out)
+
+        self.assertIn('Rescored 12 users', out.getvalue())
+        self.assertFalse(os.path.exists(checkpoint))
+        for user in users:
+            profile = UserProfile.objects.get(user=user)
+            self.assertFalse(profile.score_is_stale)
+            self.assertEqual(profile.current_credit_score, int(legacy_calculate_score(User.objects.get(pk=user.pk))))
+
+
+class BatchScoringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=60, seed=5)
+
+    def test_matches_scalar_scores_exactly(self):
+        now = timezone.now()
+        user_ids = [u.pk for u in self.users]
+        expected = CreditScoreCalculator.score_many(user_ids, now)
+        ids, scores = batch_scoring.score_users(user_ids, now)
+        self.assertEqual(len(ids), len(user_ids))
+        for user_id, score in zip(ids.tolist(), scores.tolist()):
+            self.assertEqual(score, expected[user_id], user_id)
+
+    def test_handles_no_users(self):
+        ids, scores = batch_scoring.score_users([])
+        self.assertEqual(len(ids), 0)
+        self.assertEqual(len(scores), 0)
+
+
+class CreditScoreHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='historic')
+        # Points are placed relative to local noon today, not the wall clock
+        self.noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def add_points(self, *points):
+        for days_ago, hour, score in points:
+            CreditScoreHistory.objects.create(
+                user=self.user, score=score,
+                recorded_at=self.noon.replace(hour=hour) - timedelta(days=days_ago),
+            )
+
+    def test_point_written_only_when_score_changes(self):
+        SavingsDeposit.objects.create(user=self.user, amount=Decimal('60000'), balance_after=0)
+        CreditScoreCalculator.calculate_score(self.user)
+        CreditScoreCalculator.calculate_score(User.objects.get(pk=self.user.pk))
+        self.assertEqual(CreditScoreHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_series_keeps_last_score_per_day(self):
+        self.add_points((2, 9, 400), (2, 15, 420), (1, 9, 430))
+        series = CreditScoreHistory.series(self.user, granularity='day')
+        self.assertEqual([score for _, score in series], [420, 430])
+        self.assertEqual(CreditScoreHistory.score_at(self.user, self.noon - timedelta(days=1, hours=12)), 420)
+
+    def test_compaction_collapses_old_points(self):
+        self.add_points((200, 9, 400), (200, 15, 420), (199, 9, 420), (198, 9, 450), (1, 9, 460), (1, 10, 470))
+        call_command('compact_score_history', '--older-than-days', '90', stdout=StringIO())
+        scores = list(CreditScoreHistory.objects.filter(user=self.user).order_by('recorded_at').values_list('score', flat=True))
+        self.assertEqual(scores, [420, 450, 460, 470])
+
+    def test_endpoint_bounds_days(self):
+        self.add_points((1, 9, 460))
+        self.client.force_login(self.user)
+        url = reverse('score_history')
+        self.assertEqual(len(self.client.get(url, {'days': '99999999999'}).json()['points']), 1)
+        self.assertEqual(self.client.get(url, {'days': 'all'}).status_code, 400)
+
+
+class PricingPolicyTests(TestCase):
+    def setUp(self):
+        pricing.invalidate()
+        self.addCleanup(pricing.invalidate)  # The cache outlives the test transaction
+
+    def test_default_policy_matches_original_ladder(self):
+        expected = [
+            (300, 5000, '25.0'), (499, 5000, '25.0'), (500, 10000, '22.0'), (549, 10000, '22.0'),
+            (550, 25000, '18.0'), (600, 50000, '15.0'), (650, 100000, '12.0'),
+            (700, 250000, '8.0'), (749, 250000, '8.0'), (750, 500000, '5.0'), (850, 500000, '5.0'),
+        ]
+        for score, amount, rate in expected:
+            self.assertEqual(CreditScoreCalculator.get_max_loan_amount(score), amount, score)
+            self.assertEqual(CreditScoreCalculator.get_interest_rate(score), Decimal(rate), score)
+
+        quotes = pricing.price_many([score for score, _, _ in expected])
+        self.assertEqual(quotes['max_loan_amount'].tolist(), [amount for _, amount, _ in expected])
+        self.assertEqual(quotes['interest_rate'].tolist(), [float(rate) for _, _, rate in expected])
+        self.assertEqual(quotes['pricing_version'], 1)
+
+    def test_activating_new_version_reprices(self):
+        self.assertEqual(pricing.quote(620)['pricing_version'], 1)
+        policy = PricingPolicy.objects.create(version=2)
+        PricingTier.objects.create(policy=policy, min_score=0, max_loan_amount=8000, interest_rate=Decimal('20.00'))
+        PricingTier.objects.create(policy=policy, min_score=600, max_loan_amount=70000, interest_rate=Decimal('14.00'))
+        policy.activate()
+
+        self.assertEqual(pricing.quote(620), {
+            'max_loan_amount': 70000, 'interest_rate': Decimal('14.00'), 'pricing_version': 2,
+        })
+        self.assertFalse(PricingPolicy.objects.get(version=1).is_active)
+
+    def test_activated_tiers_are_frozen(self):
+        tier = PricingTier.objects.filter(policy__version=1).first()
+        tier.interest_rate = Decimal('1.00')
+        with self.assertRaises(ValidationError):
+            tier.save()
+        with self.assertRaises(ValidationError):
+            PricingTier.objects.create(policy=tier.policy, min_score=820, max_loan_amount=1, interest_rate=1)
+        with self.assertRaises(ValidationError):
+            tier.delete()
+        self.assertEqual(pricing.quote(tier.min_score)['interest_rate'], PricingTier.objects.get(pk=tier.pk).interest_rate)
+
+
+class LoanApprovalEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='applicant')
+        UserProfile.objects.filter(user=self.user).update(
+            id_verified=True, address_verified=True, income_verified=True, is_verified=True)
+        self.user = User.objects.select_related('userprofile').get(pk=self.user.pk)
+
+    def test_active_loan_rejected_without_scoring(self):
+        MicroLoan.objects.create(
+            user=self.user, amount=Decimal('5000'), interest_rate=Decimal('25.0'),
+            duration_days=30, status='active', score_at_application=300,
+        )
+        self.user = User.objects.select_related('userprofile').get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            result = LoanApprovalEngine.evaluate_application(self.user, Decimal('5000'))
+        self.assertFalse(result['approved'])
+        self.assertIn('active loan', result['reason'])
+        self.assertEqual(result['rejected_stage'], 'eligibility')
+        self.assertEqual(list(result['stage_ms']), ['documents', 'eligibility'])
+
+    def test_eligible_applicant_is_scored_and_priced(self):
+        result = LoanApprovalEngine.evaluate_application(self.user, Decimal('5000'))
+        self.assertTrue(result['approved'])
+        self.assertEqual(result['score'], UserProfile.objects.get(user=self.user).current_credit_score)
+        self.assertEqual(result['pricing_version'], 1)
+
+        result = LoanApprovalEngine.evaluate_application(self.user, Decimal('900000'))
+        self.assertFalse(result['approved'])
+        self.assertIn('max_amount', result)
+
+
+class LoanQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='queued')
+        profile = self.user.userprofile
+        profile.id_verified = profile.address_verified = profile.income_verified = profile.is_verified = True
+        profile.save()
+        self.client.force_login(self.user)
+
+    def test_apply_enqueues_and_worker_decides(self):
+        response = self.client.post(reverse('apply_loan'), {'amount': '5000', 'duration': '30'})
+        loan = MicroLoan.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('loan_detail', args=[loan.id]))
+        self.assertEqual(loan.status, 'pending')
+
+        status = self.client.get(reverse('loan_status', args=[loan.id])).json()
+        self.assertEqual(status['queue_status'], 'queued')
+        self.assertEqual(status['position'], 1)
+
+        # A second application waits for the first decision
+        self.client.post(reverse('apply_loan'), {'amount': '5000', 'duration': '30'})
+        self.assertEqual(MicroLoan.objects.filter(user=self.user).count(), 1)
+
+        job = loan_queue.claim_next('test')
+        self.assertEqual(job.loan, loan)
+        self.assertIsNone(loan_queue.claim_next('other'))
+        self.assertTrue(loan_queue.process(job))
+
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'active')
+        self.assertEqual(loan.pricing_version, 1)
+        self.assertEqual(SavingsDeposit.get_current_balance(self.user), Decimal('5000'))
+        status = self.client.get(reverse('loan_status', args=[loan.id])).json()
+        self.assertEqual((status['loan_status'], status['queue_status']), ('active', 'done'))
+        stats = loan_queue.queue_stats()
+        self.assertEqual(stats['decided_last_window'], 1)
+        self.assertEqual(stats['stages']['scoring']['runs'], 1)
+        self.assertEqual(stats['stages']['amount']['rejections'], 0)
+
+    def test_rejection_and_stale_claims(self):
+        loan = loan_queue.enqueue(self.user, Decimal('900000'), 30)
+        job = loan_queue.claim_next('dead-worker')
+        LoanApplicationJob.objects.filter(pk=job.pk).update(
+            started_at=timezone.now() - loan_queue.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(loan_queue.requeue_stale_claims(), 1)
+
+        call_command('process_loan_queue', once=True, stdout=StringIO())
+        loan.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(loan.status, 'rejected')
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+        self.assertTrue(job.decision_reason)
+        self.assertEqual(job.rejected_stage, 'amount')
+        self.assertIsNotNone(job.scoring_ms)
+        self.assertEqual(loan_queue.queue_stats()['stages']['amount']['rejections'], 1)
+
+    def test_requeued_claim_is_decided_once(self):
+        loan = loan_queue.enqueue(self.user, Decimal('5000'), 30)
+        slow = loan_queue.claim_next('slow')
+        LoanApplicationJob.objects.filter(pk=slow.pk).update(
+            started_at=timezone.now() - loan_queue.CLAIM_TIMEOUT - timedelta(seconds=1))
+        loan_queue.requeue_stale_claims()
+        fast = loan_queue.claim_next('fast')
+
+        with self.assertLogs('core.loan_queue', 'WARNING'):
+            self.assertFalse(loan_queue.process(slow))  # Its claim was lost
+        self.assertTrue(loan_queue.process(fast))
+        with self.assertLogs('core.loan_queue', 'WARNING'):
+            self.assertFalse(loan_queue.process(slow))
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'active')
+        self.assertEqual(SavingsDeposit.objects.filter(user=self.user, transaction_type='LOAN_DEPOSIT').count(), 1)
+        job = LoanApplicationJob.objects.get(pk=fast.pk)
+        self.assertEqual((job.status, job.worker, job.rejected_stage), ('done', 'fast', ''))
+
+    def test_backoff_and_attempt_cap(self):
+        loan = loan_queue.enqueue(self.user, Decimal('5000'), 30)
+        LoanApplicationJob.objects.filter(loan=loan).update(not_before=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(loan_queue.claim_next('test'))
+        self.assertEqual(loan_queue.retry_delay(1), loan_queue.RETRY_DELAY)
+        self.assertEqual(loan_queue.retry_delay(20), loan_queue.MAX_RETRY_DELAY)
+
+        LoanApplicationJob.objects.filter(loan=loan).update(
+            status='processing', attempts=loan_queue.MAX_ATTEMPTS,
+            started_at=timezone.now() - loan_queue.CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual(loan_queue.requeue_stale_claims(), 0)
+        loan.refresh_from_db()
+        self.assertEqual((loan.status, loan.application_job.status), ('rejected', 'failed'))
+
+    def test_failed_job_rejects_its_loan(self):
+        loan = loan_queue.enqueue(self.user, Decimal('5000'), 30)
+        UserProfile.objects.filter(user=self.user).delete()  # Makes the decision raise
+        with self.assertLogs('core.loan_queue', 'ERROR'):
+            self.assertFalse(loan_queue.process(loan_queue.claim_next('test')))
+
+        loan.refresh_from_db()
+        self.assertEqual((loan.status, loan.application_job.status), ('rejected', 'failed'))
+        self.assertFalse(loan_queue.has_open_application(self.user))
+
+
+class LoanPaymentServiceTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='payer')
+        self.loan = MicroLoan.objects.create(
+            user=self.user, amount=Decimal('5000'), interest_rate=Decimal('10.0'),
+            duration_days=30, status='active', score_at_application=500,
+            due_date=timezone.now().date() + timedelta(days=30),
+        )
+        SavingsDeposit.objects.create(user=self.user, amount=Decimal('10000'), balance_after=0)
+
+    def pay_concurrently(self, references, amount=Decimal('500')):
+        barrier = threading.Barrier(len(references))
+        results = []
+
+        def pay(reference):
+            try:
+                barrier.wait()
+                results.append(LoanPaymentService.post_payment(
+                    self.user, self.loan.pk, amount, 'airtel_money', reference))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=(reference,)) for reference in references]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_payments_keep_ledger_and_loan_consistent(self):
+        # 20 distinct payments of 500 against 5,500 due, plus retries of the first five
+        references = [f'TX{n}' for n in range(20)] + [f'TX{n}' for n in range(5)]
+        results = self.pay_concurrently(references)
+        self.assertEqual(len(results), len(references))
+
+        self.loan.refresh_from_db()
+        payments = LoanPayment.objects.filter(loan=self.loan)
+        paid = sum(p.amount for p in payments)
+        self.assertEqual(payments.count(), 11)
+        self.assertEqual(payments.values('transaction_reference').distinct().count(), 11)
+        self.assertEqual(self.loan.amount_paid, paid)
+        self.assertEqual(self.loan.amount_paid, self.loan.total_amount_due)
+        self.assertEqual(self.loan.status, 'paid')
+        self.assertEqual(sum(r['fully_paid'] for r in results if r['success'] and r['message'] != 'Payment already received.'), 1)
+
+        # Every deduction matches a payment and the running balance never skips a step
+        ledger = list(SavingsDeposit.objects.filter(user=self.user).order_by('pk'))
+        self.assertEqual(len(ledger), 12)
+        balance = Decimal('0')
+        for entry in ledger:
+            balance += entry.amount
+            self.assertEqual(entry.balance_after, balance)
+        self.assertEqual(SavingsDeposit.get_current_balance(self.user), Decimal('10000') - paid)
+
+    def test_rejects_overdraw_and_closed_loans(self):
+        result = LoanPaymentService.post_payment(self.user, self.loan.pk, Decimal('20000'), 'cash')
+        self.assertFalse(result['success'])
+        self.assertIn('Insufficient', result['message'])
+        MicroLoan.objects.filter(pk=self.loan.pk).update(status='paid')
+        result = LoanPaymentService.post_payment(self.user, self.loan.pk, Decimal('100'), 'cash')
+        self.assertFalse(result['success'])
+        self.assertFalse(LoanPayment.objects.exists())
+
+
+class SavingsAccountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='saver')
+
+    def test_balance_follows_ledger(self):
+        SavingsDeposit.objects.create(user=self.user, amount=Decimal('3000'), balance_after=0)
+        last = SavingsDeposit.objects.create(user=self.user, amount=Decimal('-500'), balance_after=0)
+        self.assertEqual(last.balance_after, Decimal('2500'))
+        with self.assertNumQueries(1):
+            self.assertEqual(SavingsDeposit.get_current_balance(self.user), Decimal('2500'))
+
+        last.delete()
+        self.assertEqual(SavingsAccount.objects.get(user=self.user).balance, Decimal('3000'))
+
+    def test_posted_amount_cannot_change(self):
+        deposit = SavingsDeposit.objects.create(user=self.user, amount=Decimal('1000'), balance_after=0)
+        deposit.amount = Decimal('5000')
+        with self.assertRaises(ValidationError):
+            deposit.save()
+        self.assertEqual(SavingsAccount.objects.get(user=self.user).balance, Decimal('1000'))
+
+        admin_user = User.objects.create(username='clerk', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:core_savingsdeposit_change', args=[deposit.pk]))
+        self.assertNotIn('name="amount"', response.content.decode())
+
+    def test_rebuild_command_repairs_drift(self):
+        SavingsDeposit.objects.create(user=self.user, amount=Decimal('3000'), balance_after=0)
+        SavingsAccount.objects.filter(user=self.user).update(balance=Decimal('1'))
+
+        out = StringIO()
+        call_command('rebuild_savings_accounts', check=True, stdout=out)
+        self.assertIn('1 differed', out.getvalue())
+        self.assertEqual(SavingsAccount.objects.get(user=self.user).balance, Decimal('1'))
+
+        call_command('rebuild_savings_accounts', stdout=StringIO())
+        self.assertEqual(SavingsAccount.objects.get(user=self.user).balance, Decimal('3000'))
+
+
+class SavingsCheckpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=15, seed=13)
+        cls.user_ids = [u.pk for u in cls.users]
+
+    def roll(self):
+        call_command('roll_savings_checkpoints', min_rows=1, settle_seconds=0, stdout=StringIO())
+
+    def assert_totals_match_ledger(self):
+        ledger = SavingsCheckpoint.ledger_totals(SavingsDeposit.objects.filter(user_id__in=self.user_ids))
+        zero = {'transaction_count': 0, 'balance': 0, 'total_deposited': 0}
+        for user_id, totals in SavingsCheckpoint.totals(self.user_ids).items():
+            expected = ledger.get(user_id, zero)
+            self.assertEqual(
+                [totals[f] for f in SavingsCheckpoint.TOTALS], [expected[f] for f in SavingsCheckpoint.TOTALS])
+
+    def test_checkpoint_plus_tail_matches_ledger_and_scores(self):
+        self.roll()
+        self.assertTrue(SavingsCheckpoint.objects.exists())
+        for user in self.users[:5]:
+            SavingsDeposit.objects.create(user=user, amount=Decimal('2500'), balance_after=0)
+        self.assert_totals_match_ledger()
+        for user in self.users:
+            user = User.objects.get(pk=user.pk)
+            self.assertEqual(CreditScoreCalculator.calculate_score(user), legacy_calculate_score(user))
+
+        self.roll()
+        self.assertLessEqual(
+            SavingsCheckpoint.objects.filter(user=self.users[0]).count(), 2)
+        self.assert_totals_match_ledger()
+
+    def test_editing_a_covered_row_drops_its_checkpoints(self):
+        self.roll()
+        deposit = SavingsDeposit.objects.filter(user_id__in=self.user_ids).order_by('pk').first()
+        deposit.delete()
+        self.assertFalse(SavingsCheckpoint.objects.filter(user_id=deposit.user_id).exists())
+        self.assert_totals_match_ledger()
+
+    def test_integrity_check_reports_and_fixes_bad_checkpoints(self):
+        self.roll()
+        checkpoint = SavingsCheckpoint.objects.first()
+        SavingsCheckpoint.objects.filter(pk=checkpoint.pk).update(balance=F('balance') + 1)
+
+        out = StringIO()
+        call_command('check_savings_checkpoints', fix=True, stdout=out)
+        self.assertIn('1 disagree', out.getvalue())
+        self.assertFalse(SavingsCheckpoint.objects.filter(user_id=checkpoint.user_id).exists())
+
+        out = StringIO()
+        call_command('check_savings_checkpoints', stdout=out)
+        self.assertIn('0 disagree', out.getvalue())
+
+
+class SavingsImportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        UserProfile.objects.filter(user=self.bob).update(phone_number='0888123456')
+        SavingsDeposit.objects.create(user=self.alice, amount=Decimal('1000'), balance_after=0)
+
+    def write_statement(self, text):
+        path = temp_path(self, 'statement.csv')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_command_imports_good_rows_and_reports_bad_ones(self):
+        path = self.write_statement(
+            'username,phone_number,amount\n'
+            'alice,,2500\n'
+            ',0888123456,"30,000"\n'
+            'alice,,-5\n'
+            'carol,,100\n'
+            'alice,,abc\n'
+            'alice,,500.50\n'
+        )
+        out = StringIO()
+        call_command('import_savings_deposits', path, batch_size=2, stdout=out)
+        self.assertIn('Imported 3 of 6 rows for 2 users', out.getvalue())
+        self.assertIn("line 5: unknown username 'carol'", out.getvalue())
+
+        ledger = list(SavingsDeposit.objects.filter(user=self.alice).order_by('pk').values_list('balance_after', flat=True))
+        self.assertEqual(ledger, [Decimal('1000'), Decimal('3500'), Decimal('4000.50')])
+        self.assertEqual(SavingsDeposit.get_current_balance(self.alice), Decimal('4000.50'))
+        self.assertEqual(SavingsDeposit.get_current_balance(self.bob), Decimal('30000'))
+
+        # Rescored once at the end, components included
+        for user in (self.alice, self.bob):
+            profile = UserProfile.objects.get(user=user)
+            self.assertFalse(profile.score_is_stale)
+            self.assertEqual(profile.current_credit_score, legacy_calculate_score(User.objects.get(pk=user.pk)))
+        self.assertEqual(CreditScoreComponents.objects.get(user=self.bob).savings_count, 1)
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        statement = StringIO('username,amount\nbob,700\n')
+        statement.name = 'statement.csv'
+        response = self.client.post(reverse('admin:core_savingsdeposit_import'), {'statement': statement})
+        self.assertRedirects(response, reverse('admin:core_savingsdeposit_changelist'))
+        self.assertEqual(SavingsDeposit.get_current_balance(self.bob), Decimal('700'))
+
+
+class ReconcileSavingsLedgerTests(TestCase):
+    def test_reports_and_fixes_divergent_balances(self):
+        users = [User.objects.create(username=f'ledger_{i}') for i in range(3)]
+        for user in users:
+            for amount in ('1000', '-200', '500'):
+                SavingsDeposit.objects.create(user=user, amount=Decimal(amount), balance_after=0)
+        tampered = SavingsDeposit.objects.filter(user=users[1]).order_by('pk')[1]
+        SavingsDeposit.objects.filter(pk=tampered.pk).update(balance_after=Decimal('12345'))
+
+        out = StringIO()
+        call_command('reconcile_savings_ledger', workers=1, users_per_task=1, stdout=out)
+        self.assertIn(f'deposit {tampered.pk} (user {users[1].pk}): balance_after=12345.00 expected=800', out.getvalue())
+        self.assertIn('1 divergent rows across 1 users', out.getvalue())
+
+        call_command('reconcile_savings_ledger', workers=1, fix=True, stdout=StringIO())
+        self.assertEqual(SavingsDeposit.objects.get(pk=tampered.pk).balance_after, Decimal('800'))
+        out = StringIO()
+        call_command('reconcile_savings_ledger', workers=1, stdout=out)
+        self.assertIn('0 divergent rows', out.getvalue())
+
+
+def temp_model(test, **kwargs):
+    """
+    (path, model) of a small forest saved for one test, dropped from the
+    shared registry and deleted afterwards
+    """
+    path = temp_path(test, 'model.pkl')
+    test.addCleanup(loan_ml_predictor.registry.clear)
+    return path, train_test_model(path, **kwargs)
+
+
+def train_test_model(path, n_estimators=5, random_state=0):
+    """
+    A small forest on the synthetic training data, saved like train_loan_model.py does
+    """
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    data = pd.read_csv(os.path.join(os.path.dirname(__file__), 'synthetic_loan_data.csv'))
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    model.fit(data.drop('target', axis=1).values, data['target'])
+    joblib.dump(model, path)
+    return model
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        self.path, _ = temp_model(self)
+
+    def test_model_is_loaded_once_and_shared(self):
+        first = loan_ml_predictor.LoanMLPredictor(self.path)
+        second = loan_ml_predictor.LoanMLPredictor(self.path)
+        self.assertIs(first.model, second.model)
+        stats = loan_ml_predictor.registry.stats(self.path)
+        self.assertEqual(stats['reloads'], 0)
+        self.assertGreater(stats['load_seconds'], 0)
+
+        result = first.predict_user(User.objects.create(username='ml').userprofile)
+        self.assertIn(result['prediction'], (0, 1))
+
+    def test_replacing_the_file_reloads(self):
+        model = loan_ml_predictor.LoanMLPredictor(self.path).model
+        replacement = self.path + '.new'
+        train_test_model(replacement, n_estimators=3)
+        os.replace(replacement, self.path)
+
+        reloaded = loan_ml_predictor.LoanMLPredictor(self.path).model
+        self.assertIsNot(reloaded, model)
+        self.assertEqual(len(reloaded.estimators_), 3)
+        self.assertEqual(loan_ml_predictor.registry.stats(self.path)['reloads'], 1)
+
+
+class ForestEngineTests(TestCase):
+    def setUp(self):
+        self.path, self.model = temp_model(self, n_estimators=9)
+
+    def test_probabilities_are_byte_identical_to_sklearn(self):
+        import pandas as pd
+
+        data = pd.read_csv(os.path.join(os.path.dirname(__file__), 'synthetic_loan_data.csv'))
+        X = data.drop('target', axis=1).values
+        X = np.vstack([X, X + np.random.default_rng(19).normal(0, 3, X.shape)])
+        engine = ForestEngine.from_sklearn(self.model)
+        self.assertEqual(engine.predict_proba(X).tobytes(), self.model.predict_proba(X).tobytes())
+        self.assertTrue(np.array_equal(engine.predict(X), self.model.predict(X)))
+        self.assertEqual(engine.predict_proba(X[:1]).tobytes(), self.model.predict_proba(X[:1]).tobytes())
+
+    def test_predictor_runs_the_exported_engine(self):
+        call_command('export_forest_engine', path=self.path, stdout=StringIO())
+        profile = User.objects.create(username='forest').userprofile
+        numpy_predictor = loan_ml_predictor.LoanMLPredictor(self.path, engine='numpy')
+        self.assertIsInstance(numpy_predictor.model, ForestEngine)
+        self.assertEqual(
+            numpy_predictor.predict_user(profile),
+            loan_ml_predictor.LoanMLPredictor(self.path).predict_user(profile),
+        )
+
+    def test_stale_export_falls_back_to_the_replaced_pkl(self):
+        call_command('export_forest_engine', path=self.path, stdout=StringIO())
+        retrained = train_test_model(self.path, n_estimators=3, random_state=1)
+        X = np.random.default_rng(21).uniform(0, 100, (40, self.model.n_features_in_))
+        numpy_predictor = loan_ml_predictor.LoanMLPredictor(self.path, engine='numpy')
+        with self.assertLogs('core.loan_ml_predictor', 'WARNING'):
+            labels, probas = numpy_predictor.predict_matrix(X)
+        self.assertNotIsInstance(numpy_predictor.model, ForestEngine)
+        self.assertTrue(np.array_equal(probas, retrained.predict_proba(X)[:, 1]))
+
+        call_command('export_forest_engine', path=self.path, stdout=StringIO())
+        self.assertIsInstance(numpy_predictor.model, ForestEngine)
+
+    def test_reexport_leaves_mapped_arrays_untouched(self):
+        directory = loan_ml_predictor.forest_path(self.path)
+        engine = ForestEngine.from_sklearn(self.model)
+        engine.save(directory)
+        mapped = ForestEngine.load(directory)
+        threshold = np.array(mapped.threshold)
+
+        for _ in range(3):
+            ForestEngine.from_sklearn(train_test_model(self.path, n_estimators=5)).save(directory)
+        self.assertTrue(np.array_equal(mapped.threshold, threshold))
+        self.assertEqual(len(ForestEngine.load(directory).roots), 5)
+        self.assertEqual(len([d for d in os.listdir(directory) if d.startswith('arrays-')]), 2)
+
+
+class PredictionCacheTests(TestCase):
+    def setUp(self):
+        self.path, self.model = temp_model(self)
+        self.X = np.random.default_rng(20).uniform(0, 100, (6, self.model.n_features_in_))
+
+    def test_repeated_rows_are_served_from_the_cache(self):
+        cache = loan_ml_predictor.PredictionCache()
+        predictor = loan_ml_predictor.LoanMLPredictor(self.path, prediction_cache=cache)
+        labels, probas = predictor.predict_matrix(self.X)
+        self.assertTrue(np.array_equal(probas, self.model.predict_proba(self.X)[:, 1]))
+        self.assertTrue(np.array_equal(labels, self.model.predict(self.X)))
+
+        cached_labels, cached_probas = predictor.predict_matrix(self.X[::-1])
+        self.assertTrue(np.array_equal(cached_probas, probas[::-1]))
+        self.assertTrue(np.array_equal(cached_labels, labels[::-1]))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (6, 6))
+
+    def test_lru_eviction_and_invalidation_on_reload(self):
+        cache = loan_ml_predictor.PredictionCache(max_size=4)
+        predictor = loan_ml_predictor.LoanMLPredictor(self.path, prediction_cache=cache)
+        predictor.predict_matrix(self.X)
+        self.assertEqual(cache.stats()['size'], 4)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+        replacement = self.path + '.new'
+        model = train_test_model(replacement, n_estimators=3, random_state=1)
+        os.replace(replacement, self.path)
+        _, probas = predictor.predict_matrix(self.X[-1:])
+        self.assertEqual(probas[0], model.predict_proba(self.X[-1:])[0, 1])
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_shared_entries_are_reused_across_processes(self):
+        writer = loan_ml_predictor.PredictionCache(shared=True)
+        loan_ml_predictor.LoanMLPredictor(self.path, prediction_cache=writer).predict_matrix(self.X)
+        reader = loan_ml_predictor.PredictionCache(shared=True)
+        _, probas = loan_ml_predictor.LoanMLPredictor(self.path, prediction_cache=reader).predict_matrix(self.X)
+        self.assertTrue(np.array_equal(probas, self.model.predict_proba(self.X)[:, 1]))
+        self.assertEqual(reader.stats()['shared_hits'], 6)
+        self.assertEqual(reader.stats()['misses'], 0)
+
+
+class MLFeatureExtractionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=12, seed=17)
+
+    def test_batch_matches_scalar_extraction(self):
+        profiles = UserProfile.objects.filter(user__in=self.users)
+        with self.assertNumQueries(5):
+            user_ids, matrix = extract_features_many(profiles)
+        self.assertEqual(user_ids, sorted(u.pk for u in self.users))
+        for user_id, row in zip(user_ids, matrix):
+            expected = np.array(extract_user_features(UserProfile.objects.get(user_id=user_id)), dtype=float)
+            self.assertTrue(np.array_equal(row, expected), user_id)
+
+    def test_query_count_is_fixed(self):
+        profiles = UserProfile.objects.filter(user__in=self.users[:2])
+        with self.assertNumQueries(5):
+            extract_features_many(profiles)
+
+
+class DashboardMLStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=10, seed=18)
+
+    def setUp(self):
+        self.path, _ = temp_model(self, n_estimators=7)
+        cache.clear()
+
+    def test_batch_stats_match_per_user_predictions(self):
+        predictor = loan_ml_predictor.LoanMLPredictor(self.path)
+        model = predictor.model
+        results = []
+        for profile in UserProfile.objects.all():
+            X = np.array(extract_user_features(profile), dtype=float).reshape(1, -1)
+            results.append((int(model.predict(X)[0]), float(model.predict_proba(X)[0][1])))
+
+        stats = dashboard_cache.get('ml_distribution', self.path)
+        self.assertEqual(stats['good'], sum(1 for label, _ in results if label == 1))
+        self.assertEqual(stats['risky'], sum(1 for label, _ in results if label != 1))
+        self.assertEqual(stats['avg_proba'], round(sum(p for _, p in results) / len(results), 2))
+
+        # Served from the cache until the TTL or the model file changes
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_cache.get('ml_distribution', self.path), stats)
+
+    def test_missing_model(self):
+        stats = dashboard_cache.get('ml_distribution', self.path + '.missing')
+        self.assertFalse(stats['available'])
+
+
+class DashboardSectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=15, seed=21)
+        cls.admin = User.objects.create(username='root', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def walk(self, section, **params):
+        rows, cursor = [], None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get(reverse('dashboard_section', args=[section]), query)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            rows.extend(data['results'])
+            cursor = data['next']
+            if not cursor:
+                return rows
+
+    def test_keyset_pages_cover_every_row_once_in_order(self):
+        # Scores tie heavily, so this also exercises the pk tie-breaker
+        rows = self.walk('users', sort='score', limit=4)
+        expected = list(UserProfile.objects.order_by('current_credit_score', 'pk').values_list('pk', flat=True))
+        self.assertEqual([row['id'] for row in rows], expected)
+
+        rows = self.walk('loans', sort='-amount', limit=7)
+        expected = list(MicroLoan.objects.order_by('-amount', '-pk').values_list('pk', flat=True))
+        self.assertEqual([row['id'] for row in rows], expected)
+
+    def test_filters_and_search(self):
+        rows = self.walk('loans', status='defaulted', q='seed_1')
+        expected = MicroLoan.objects.filter(status='defaulted', user__username__icontains='seed_1')
+        self.assertEqual({row['id'] for row in rows}, set(expected.values_list('pk', flat=True)))
+        self.assertTrue(all(row['status'] == 'defaulted' for row in rows))
+
+        rows = self.walk('payments', on_time='false', limit=50)
+        self.assertEqual(len(rows), LoanPayment.objects.filter(was_on_time=False).count())
+
+    def test_each_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            dashboard_sections.page('payments', {'limit': '10'})
+
+    def test_bad_requests(self):
+        url = reverse('dashboard_section', args=['loans'])
+        self.assertEqual(self.client.get(url, {'sort': 'status'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'nonsense'}).status_code, 400)
+        for data in ([{}, 1], ['2026-01-01T00:00:00+00:00', {}], [1, 2, 3], {'value': 1}, 7, [True, 1], [12.5, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400, data)
+        self.assertEqual(self.client.get(reverse('dashboard_section', args=['users']), {'min_score': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('dashboard_section', args=['ledgers'])).status_code, 404)
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_dashboard_renders_without_table_rows(self):
+        response = self.client.get(reverse('superuser_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'seed_0')
+        self.assertContains(response, 'id="loans-rows"')
+
+
+class PortfolioKPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=12, seed=22)
+        MicroLoan.objects.filter(pk__in=MicroLoan.objects.order_by('pk').values('pk')[:3]).update(
+            applied_at=timezone.now() - timedelta(days=3))
+
+    def test_one_query_per_table(self):
+        with self.assertNumQueries(5):
+            kpis.compute_kpis()
+
+    def test_matches_per_metric_queries(self):
+        result = kpis.compute_kpis()
+        today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        loans = MicroLoan.objects.all()
+        self.assertEqual(result.total_users, UserProfile.objects.count())
+        self.assertEqual(result.total_loans, loans.count())
+        self.assertEqual(result.active_loans, loans.filter(status='active').count())
+        self.assertEqual(result.active_loan_amount, sum(l.amount for l in loans.filter(status='active')))
+        self.assertEqual(result.defaulted_loans, loans.filter(status='defaulted').count())
+        self.assertEqual(result.today_loans, loans.filter(applied_at__gte=today_start).count())
+        self.assertEqual(result.today_loans, loans.count() - 3)
+        self.assertEqual(result.total_revenue, sum(p.amount for p in LoanPayment.objects.all()))
+        self.assertEqual(result.verified_mobile_accounts, MobileMoneyAccount.objects.filter(is_verified=True).count())
+        self.assertEqual(result.active_vouches, SocialVouch.objects.filter(is_active=True).count())
+        self.assertAlmostEqual(result.default_rate, result.defaulted_loans / result.total_loans * 100)
+
+    def test_json_endpoint(self):
+        admin = User.objects.create(username='kpi_admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        data = self.client.get(reverse('portfolio_kpis')).json()
+        self.assertEqual(data['total_loans'], MicroLoan.objects.count())
+        self.assertIn('default_rate', data)
+
+    def test_empty_portfolio(self):
+        MicroLoan.objects.all().delete()
+        MobileMoneyAccount.objects.all().delete()
+        result = kpis.compute_kpis()
+        self.assertEqual((result.default_rate, result.verification_rate), (0.0, 0.0))
+        self.assertEqual(result.active_loan_amount, Decimal('0'))
+
+
+class PortfolioRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=10, seed=23)
+        now = timezone.now()
+        for i, loan in enumerate(MicroLoan.objects.exclude(status__in=['pending', 'rejected']).order_by('pk')):
+            MicroLoan.objects.filter(pk=loan.pk).update(approved_at=now - timedelta(days=i % 4))
+        for i, payment in enumerate(LoanPayment.objects.order_by('pk')):
+            LoanPayment.objects.filter(pk=payment.pk).update(payment_date=now - timedelta(days=i % 3))
+        UserProfile.objects.filter(user__in=cls.users[:5]).update(district='Lilongwe', employment_status='employed')
+
+    def snapshot(self):
+        return {
+            (r['day'], r['district'], r['employment_status']): tuple(r[m] for m in DailyPortfolioRollup.METRICS)
+            for r in DailyPortfolioRollup.objects.values('day', 'district', 'employment_status', *DailyPortfolioRollup.METRICS)
+        }
+
+    def assert_matches_full_rebuild(self):
+        incremental = self.snapshot()
+        DailyPortfolioRollup.objects.all().delete()
+        call_command('rollup_portfolio_daily', full=True, stdout=StringIO())
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_totals_match_fact_tables(self):
+        call_command('rollup_portfolio_daily', stdout=StringIO())
+        totals = DailyPortfolioRollup.objects.aggregate(
+            loans=Sum('loans_originated'), disbursed=Sum('amount_disbursed'), repaid=Sum('amount_repaid'),
+            saved=Sum('amount_saved'), defaulted=Sum('loans_defaulted'))
+        originated = MicroLoan.objects.exclude(status__in=['pending', 'rejected'])
+        self.assertEqual(totals['loans'], originated.count())
+        self.assertEqual(totals['disbursed'], sum(loan.amount for loan in originated))
+        self.assertEqual(totals['defaulted'], originated.filter(status='defaulted').count())
+        self.assertEqual(totals['repaid'], sum(p.amount for p in LoanPayment.objects.all()))
+        self.assertEqual(totals['saved'], sum(d.amount for d in SavingsDeposit.objects.filter(transaction_type='DEPOSIT', amount__gt=0)))
+        self.assertTrue(DailyPortfolioRollup.objects.filter(district='Lilongwe', employment_status='employed').exists())
+
+    def test_incremental_runs_pick_up_new_and_changed_facts(self):
+        call_command('rollup_portfolio_daily', stdout=StringIO())
+        loan = MicroLoan.objects.filter(status='active').first()
+        LoanPayment.objects.create(
+            loan=loan, amount=Decimal('750'), payment_method='cash', was_on_time=True, days_from_due=0,
+            transaction_reference='TXN-NEW')
+        loan.status = 'defaulted'
+        loan.save()
+        SavingsDeposit.objects.filter(transaction_type='DEPOSIT', amount__gt=0).first().delete()
+
+        days, _ = DailyPortfolioRollup.pending_days()
+        self.assertLessEqual(len(days), 3)
+        call_command('rollup_portfolio_daily', stdout=StringIO())
+        self.assertFalse(RollupDirtyDay.objects.exists())
+        self.assertEqual(DailyPortfolioRollup.pending_days(), (set(), {}))
+        self.assert_matches_full_rebuild()
+
+    def test_moving_a_borrower_rebuilds_their_days(self):
+        call_command('rollup_portfolio_daily', stdout=StringIO())
+        profile = UserProfile.objects.get(user=MicroLoan.objects.filter(status='active').first().user)
+        profile.save()
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+        profile.district, profile.employment_status = 'Mzuzu', 'self_employed'
+        profile.save()
+        self.assertTrue(RollupDirtyDay.objects.exists())
+        call_command('rollup_portfolio_daily', stdout=StringIO())
+        self.assertTrue(DailyPortfolioRollup.objects.filter(district='Mzuzu').exists())
+        self.assert_matches_full_rebuild()
+
+    def test_trend_series(self):
+        call_command('rollup_portfolio_daily', stdout=StringIO())
+        today = timezone.localdate()
+        series = DailyPortfolioRollup.series(today - timedelta(days=6), today)
+        self.assertEqual(sum(day['repayments'] for day in series), LoanPayment.objects.count())
+        self.client.force_login(User.objects.create(username='trends', is_staff=True, is_superuser=True))
+        data = self.client.get(reverse('portfolio_trends'), {'days': 7, 'district': 'Lilongwe'}).json()
+        self.assertEqual(len(data['days']), len({r['day'] for r in DailyPortfolioRollup.objects.filter(district='Lilongwe').values('day')}))
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=8, seed=24)
+
+    def setUp(self):
+        cache.clear()
+        dashboard_cache.reset_stats()
+
+    def test_sections_are_cached_until_a_feeding_write(self):
+        first = dashboard_cache.get('kpis')
+        recent = dashboard_cache.get('recent_activity')
+        self.assertEqual(len(recent), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_cache.get('kpis'), first)
+            self.assertEqual(dashboard_cache.get('recent_activity'), recent)
+
+        loan = MicroLoan.objects.filter(status='active').first()
+        LoanPayment.objects.create(
+            loan=loan, amount=Decimal('500'), payment_method='cash', was_on_time=True, days_from_due=0,
+            transaction_reference='TXN-CACHE')
+        self.assertEqual(dashboard_cache.get('kpis').total_revenue, first.total_revenue + Decimal('500'))
+
+        stats = dashboard_cache.stats()
+        self.assertEqual((stats['kpis']['hits'], stats['kpis']['misses']), (1, 2))
+        self.assertEqual(stats['kpis']['hit_ratio'], round(1 / 3, 3))
+        self.assertEqual(stats['recent_activity']['misses'], 1)
+        self.assertGreater(stats['kpis']['invalidations'], 0)
+
+    def test_unrelated_writes_keep_sections(self):
+        dashboard_cache.get('recent_activity')
+        SocialVouch.objects.create(voucher=self.users[0], vouchee=self.users[1], trust_level=1, relationship='x')
+        self.users[0].save()  # As on login: re-saves the profile without changes
+        with self.assertNumQueries(0):
+            dashboard_cache.get('recent_activity')
+
+    def test_stored_scores_refresh_kpis_but_not_ml_distribution(self):
+        path, _ = temp_model(self)
+        distribution = dashboard_cache.get('ml_distribution', path)
+        average = dashboard_cache.get('kpis').average_credit_score
+
+        SavingsDeposit.objects.create(user=self.users[0], amount=Decimal('90000'), balance_after=0)
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_cache.get('ml_distribution', path), distribution)
+
+        profile = UserProfile.objects.get(user=self.users[0])
+        CreditScoreCalculator.store_score(profile, profile.current_credit_score + 40)
+        self.assertAlmostEqual(dashboard_cache.get('kpis').average_credit_score, average + 40 / len(self.users))
+
+    def test_stats_endpoint(self):
+        self.client.force_login(User.objects.create(username='cache_admin', is_staff=True, is_superuser=True))
+        self.client.get(reverse('superuser_dashboard'))
+        data = self.client.get(reverse('dashboard_cache_stats')).json()
+        self.assertEqual(set(data), {'kpis', 'ml_distribution', 'recent_activity'})
+        self.assertEqual(data['kpis']['rebuilds'], 1)
+
+
+class PortfolioExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_scoring_data(num_users=8, seed=25)
+        now = timezone.now()
+        for i, loan in enumerate(MicroLoan.objects.order_by('pk')):
+            MicroLoan.objects.filter(pk=loan.pk).update(applied_at=now - timedelta(days=i % 5))
+
+    def read(self, data):
+        return list(csv.DictReader(gzip.decompress(data).decode().splitlines()))
+
+    def test_stream_matches_table_in_small_chunks(self):
+        data = b''.join(exports.gzip_chunks(exports.csv_chunks('payments', rows_per_chunk=3)))
+        rows = self.read(data)
+        payments = LoanPayment.objects.select_related('loan__user').order_by('pk')
+        self.assertEqual([int(r['id']) for r in rows], [p.pk for p in payments])
+        first = payments[0]
+        self.assertEqual(rows[0]['username'], first.loan.user.username)
+        self.assertEqual(Decimal(rows[0]['amount']), first.amount)
+        self.assertEqual(rows[0]['payment_date'], first.payment_date.isoformat())
+
+    def test_formula_cells_are_escaped(self):
+        loan = MicroLoan.objects.filter(status='active').first()
+        LoanPayment.objects.create(
+            loan=loan, amount=Decimal('100'), payment_method='cash', was_on_time=True, days_from_due=-2,
+            transaction_reference='=HYPERLINK("http://x")')
+        rows = list(csv.DictReader(''.join(exports.csv_chunks('payments')).splitlines()))
+        self.assertEqual(rows[-1]['transaction_reference'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(rows[-1]['days_from_due'], '-2')
+
+    def test_date_and_status_filters(self):
+        today = timezone.localdate()
+        since = (today - timedelta(days=1)).isoformat()
+        rows = list(csv.DictReader(''.join(exports.csv_chunks('loans', since=since, status='active')).splitlines()))
+        expected = MicroLoan.objects.filter(applied_at__date__gte=since, status='active')
+        self.assertTrue(rows)
+        self.assertEqual({int(r['id']) for r in rows}, set(expected.values_list('pk', flat=True)))
+        with self.assertRaises(ValueError):
+            exports.csv_chunks('loans', until='yesterday')
+
+    def test_endpoint_streams_gzip_for_staff(self):
+        url = reverse('export_table', args=['savings'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create(username='finance', is_staff=True))
+        response = self.client.get(url, {'status': 'DEPOSIT'})
+        self.assertTrue(response.streaming)
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        rows = self.read(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), SavingsDeposit.objects.filter(transaction_type='DEPOSIT').count())
+        self.assertEqual(self.client.get(url, {'since': '2026-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_table', args=['users'])).status_code, 404)
+
+    def test_command_writes_compressed_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'loans.csv.gz')
+            call_command('export_portfolio', 'loans', output=path, chunk_size=4, stdout=StringIO())
+            with open(path, 'rb') as f:
+                self.assertEqual(len(self.read(f.read())), MicroLoan.objects.count())
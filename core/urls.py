@@ -7,6 +7,13 @@ urlpatterns = [
 
     # Superuser Dashboard
     path('cashchangu/', views.superuser_dashboard, name='superuser_dashboard'),
+    path('cashchangu/kpis/', views.portfolio_kpis, name='portfolio_kpis'),
+    path('cashchangu/trends/', views.portfolio_trends, name='portfolio_trends'),
+    path('cashchangu/dashboard-cache/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
+    path('cashchangu/sections/<str:section>/', views.dashboard_section, name='dashboard_section'),
+    path('cashchangu/export/<str:table>/', views.export_table, name='export_table'),
+    path('cashchangu/loan-queue/', views.loan_queue_stats, name='loan_queue_stats'),
+    path('cashchangu/ml-cache/', views.ml_prediction_cache_stats, name='ml_prediction_cache_stats'),
     
     # Authentication
     path('', views.login_view, name='login'),
@@ -19,6 +26,7 @@ urlpatterns = [
     # Loans
     path('apply-loan/', views.apply_for_loan, name='apply_loan'),
     path('loan/<int:loan_id>/', views.loan_detail, name='loan_detail'),
+    path('loan/<int:loan_id>/status/', views.loan_status, name='loan_status'),
     path('loan/<int:loan_id>/pay/', views.make_payment, name='make_payment'),
     path('loan-history/', views.loan_history, name='loan_history'),
     
@@ -35,4 +43,5 @@ urlpatterns = [
     
     # Score
     path('score-breakdown/', views.score_breakdown, name='score_breakdown'),
+    path('score-history/', views.score_history, name='score_history'),
 ]
\ No newline at end of file
@@ -4,13 +4,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.utils import timezone
-from .loan_ml_predictor import LoanMLPredictor
 from datetime import timedelta
 from decimal import Decimal
 
 from .models import (
-    UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount,
-    SocialVouch, SavingsDeposit, CreditScoreCalculator, LoanApprovalEngine
+    MicroLoan, MobileMoneyAccount, SocialVouch, SavingsDeposit, CreditScoreCalculator
 )
 
 
@@ -19,13 +17,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.utils import timezone
-from .loan_ml_predictor import LoanMLPredictor
 from datetime import timedelta
 from decimal import Decimal
 from django.contrib.admin.views.decorators import staff_member_required
 from .models import (
-    UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount,
-    SocialVouch, SavingsDeposit, CreditScoreCalculator, LoanApprovalEngine
+    MicroLoan, MobileMoneyAccount, SocialVouch, SavingsDeposit, CreditScoreCalculator
 )
 from .forms import RegistrationForm, ProfileForm
 
@@ -34,15 +30,18 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.utils import timezone
-from .loan_ml_predictor import LoanMLPredictor
 from datetime import timedelta
 from decimal import Decimal
 from django.contrib.admin.views.decorators import staff_member_required
 from .models import (
-    UserProfile, MicroLoan, LoanPayment, MobileMoneyAccount,
-    SocialVouch, SavingsDeposit, CreditScoreCalculator, LoanApprovalEngine
+    MicroLoan, MobileMoneyAccount, SocialVouch, SavingsDeposit, CreditScoreCalculator,
+    CreditScoreHistory, LoanPaymentService, DailyPortfolioRollup
 )
 from .forms import RegistrationForm, ProfileForm
+from django.http import JsonResponse, StreamingHttpResponse
+from decimal import InvalidOperation
+from . import dashboard_cache, dashboard_sections, exports, kpis, loan_queue
+from .loan_ml_predictor import prediction_cache
 
 @login_required
 def profile_view(request):
@@ -51,7 +50,6 @@ def profile_view(request):
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
             form.save()
-            CreditScoreCalculator.calculate_score(request.user)
             messages.success(request, 'Profile updated successfully!')
             return redirect('profile')
         else:
@@ -75,93 +73,110 @@ def profile_view(request):
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Sum, Avg, Count, Q
 
 @staff_member_required
 def superuser_dashboard(request):
     if not request.user.is_superuser:
         return redirect('dashboard')
 
-    users = UserProfile.objects.select_related('user').all()
-    loans = MicroLoan.objects.select_related('user').all().order_by('-applied_at')
-    payments = LoanPayment.objects.select_related('loan', 'loan__user').all().order_by('-payment_date')
-    vouches = SocialVouch.objects.select_related('voucher', 'vouchee').all().order_by('-created_at')
-    savings = SavingsDeposit.objects.select_related('user').all().order_by('-deposit_date')
-    mobile_accounts = MobileMoneyAccount.objects.select_related('user').all().order_by('-created_at')
-
-    # Analytics calculations
-    today = timezone.now().date()
-    
-    # Loan analytics
-    active_loans_count = loans.filter(status='active').count()
-    total_loan_amount = loans.filter(status='active').aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Mobile money analytics
-    verified_mobile_count = mobile_accounts.filter(is_verified=True).count()
-    total_mobile_accounts = mobile_accounts.count()
-    verification_rate = (verified_mobile_count / total_mobile_accounts * 100) if total_mobile_accounts > 0 else 0
-    
-    # Today's activity
-    today_start = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
-    today_loans = loans.filter(applied_at__gte=today_start).count()
-    today_payments = payments.filter(payment_date__gte=today_start).count()
-    today_activity_count = today_loans + today_payments
-    ml_predictor = LoanMLPredictor()
-    user_profile = request.user.userprofile
-    ml_result = ml_predictor.predict_user(user_profile)
-    
-    # Revenue calculations
-    total_revenue = payments.aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Credit score analytics
-    average_credit_score = users.aggregate(Avg('current_credit_score'))['current_credit_score__avg'] or 0
-    
-    # Default rate
-    total_loans_count = loans.count()
-    defaulted_loans_count = loans.filter(status='defaulted').count()
-    default_rate = (defaulted_loans_count / total_loans_count * 100) if total_loans_count > 0 else 0
-    
-    # Vouch analytics
-    active_vouches_count = vouches.filter(is_active=True).count()
-
-    # ML model stats: show distribution of ML predictions for all users
-    ml_predictor = LoanMLPredictor()
-    ml_stats = {'good': 0, 'risky': 0, 'probas': []}
-    for u in users:
-        try:
-            ml_result = ml_predictor.predict_user(u)
-            if ml_result['prediction'] == 1:
-                ml_stats['good'] += 1
-            else:
-                ml_stats['risky'] += 1
-            ml_stats['probas'].append(ml_result['probability'])
-        except Exception:
-            pass
+    # Tables are served page by page by dashboard_section; the summary
+    # sections come from the dashboard cache
+    portfolio = dashboard_cache.get('kpis')
+    ml_stats = dashboard_cache.get('ml_distribution')
 
     context = {
-        'users': users,
-        'loans': loans,
-        'payments': payments,
-        'vouches': vouches,
-        'savings': savings,
-        'mobile_accounts': mobile_accounts,
-        'active_loans_count': active_loans_count,
-        'total_loan_amount': total_loan_amount,
-        'verified_mobile_count': verified_mobile_count,
-        'verification_rate': round(verification_rate, 1),
-        'today_activity_count': today_activity_count,
-        'total_revenue': total_revenue,
-        'average_credit_score': round(average_credit_score, 0),
-        'default_rate': round(default_rate, 1),
-        'active_vouches_count': active_vouches_count,
+        'total_users_count': portfolio.total_users,
+        'sections': {name: sorted(section.sorts) for name, section in dashboard_sections.SECTIONS.items()},
+        'active_loans_count': portfolio.active_loans,
+        'total_loan_amount': portfolio.active_loan_amount,
+        'verified_mobile_count': portfolio.verified_mobile_accounts,
+        'verification_rate': round(portfolio.verification_rate, 1),
+        'today_activity_count': portfolio.today_activity,
+        'total_revenue': portfolio.total_revenue,
+        'average_credit_score': round(portfolio.average_credit_score, 0),
+        'default_rate': round(portfolio.default_rate, 1),
+        'active_vouches_count': portfolio.active_vouches,
+        'recent_activity': dashboard_cache.get('recent_activity'),
         'current_date': timezone.now().strftime("%B %d, %Y"),
         'ml_good_count': ml_stats['good'],
         'ml_risky_count': ml_stats['risky'],
-        'ml_avg_proba': round(sum(ml_stats['probas'])/len(ml_stats['probas']), 2) if ml_stats['probas'] else 0,
+        'ml_avg_proba': ml_stats['avg_proba'],
     }
     return render(request, 'superuser_dashboard.html', context)
 
 
+@staff_member_required
+def portfolio_kpis(request):
+    """
+    The dashboard KPIs as JSON
+    """
+    return JsonResponse(kpis.compute_kpis().as_dict())
+
+
+@staff_member_required
+def dashboard_cache_stats(request):
+    """
+    Hit ratio and rebuild time of each cached dashboard section
+    """
+    return JsonResponse(dashboard_cache.stats())
+
+
+@staff_member_required
+def portfolio_trends(request):
+    """
+    Daily portfolio totals from the rollup tables, for trend charts.
+    ?days= (default 90), optional ?district= and ?employment_status=
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 90)), 1), 3660)
+    except ValueError:
+        return JsonResponse({'error': 'days must be an integer'}, status=400)
+    end = timezone.localdate()
+    segment = {key: request.GET[key] for key in ('district', 'employment_status') if request.GET.get(key)}
+    series = DailyPortfolioRollup.series(end - timedelta(days=days - 1), end, **segment)
+    return JsonResponse({'days': series})
+
+
+@staff_member_required
+def export_table(request, table):
+    """
+    Stream the loans, payments or savings table as CSV, gzip-compressed
+    unless ?gzip=0. ?since= and ?until= (YYYY-MM-DD, inclusive) and ?status=
+    (loan status; the loan's status for payments; transaction type for savings)
+    """
+    filters = {key: request.GET.get(key) for key in ('since', 'until', 'status')}
+    try:
+        chunks = exports.csv_chunks(table, **filters)
+    except KeyError:
+        return JsonResponse({'error': f"Unknown export {table!r}"}, status=404)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    filename = f"{table}-{timezone.localdate():%Y%m%d}.csv"
+    if request.GET.get('gzip') == '0':
+        response = StreamingHttpResponse((chunk.encode() for chunk in chunks), content_type='text/csv')
+    else:
+        filename += '.gz'
+        response = StreamingHttpResponse(exports.gzip_chunks(chunks), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def dashboard_section(request, section):
+    """
+    One keyset page of a superuser dashboard table as JSON
+    """
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Superuser access required'}, status=403)
+    try:
+        return JsonResponse(dashboard_sections.page(section, request.GET))
+    except KeyError:
+        return JsonResponse({'error': f"Unknown section {section!r}"}, status=404)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
 from .forms import RegistrationForm
 # ============================================
 # REGISTRATION VIEW
@@ -228,8 +243,8 @@ def dashboard(request):
     """
     profile = request.user.userprofile
     
-    # Recalculate current score
-    current_score = CreditScoreCalculator.calculate_score(request.user)
+    # Current score (recalculated only if its inputs changed)
+    current_score = CreditScoreCalculator.get_score(request.user)
     
     # Get max loan amount for their score
     max_loan = CreditScoreCalculator.get_max_loan_amount(current_score)
@@ -243,9 +258,7 @@ def dashboard(request):
     vouches_received = SocialVouch.objects.filter(vouchee=request.user, is_active=True).count()
     
     # Get savings
-    total_savings = sum(
-        s.amount for s in SavingsDeposit.objects.filter(user=request.user)
-    )
+    total_savings = SavingsDeposit.get_current_balance(request.user)
     
     # Score rating
     if current_score >= 740:
@@ -286,53 +299,30 @@ def apply_for_loan(request):
     Apply for a micro-loan
     """
     profile = request.user.userprofile
-    current_score = CreditScoreCalculator.calculate_score(request.user)
+    current_score = CreditScoreCalculator.get_score(request.user)
     max_loan = CreditScoreCalculator.get_max_loan_amount(current_score)
     
     if request.method == 'POST':
         try:
             amount = Decimal(request.POST.get('amount'))
             duration = int(request.POST.get('duration'))  # days
-            
-            # Evaluate application
-            result = LoanApprovalEngine.evaluate_application(request.user, amount)
-            
-            if not result['approved']:
-                messages.error(request, result['reason'])
-                return redirect('apply_for_loan')
-            
-            # Create loan
-            loan = MicroLoan.objects.create(
-                user=request.user,
-                amount=amount,
-                interest_rate=result['interest_rate'],
-                duration_days=duration,
-                status='approved',
-                score_at_application=result['score'],
-                approved_at=timezone.now(),
-                due_date=timezone.now().date() + timedelta(days=duration)
-            )
-            loan.status = 'active'
-            loan.save()
-            
-            # Add loan amount to savings
-            SavingsDeposit.objects.create(
-                user=request.user,
-                amount=amount,
-                transaction_type='LOAN_DEPOSIT',
-                balance_after=SavingsDeposit.get_current_balance(request.user) + amount
-            )
-            
-            # Recalculate credit score to reflect savings
-            CreditScoreCalculator.calculate_score(request.user)
-            
-            messages.success(request, f"Loan approved! MWK {amount:,.0f} at {result['interest_rate']}% interest.")
-            return redirect('dashboard')
-        
-        except ValueError:
+        except (TypeError, ValueError, InvalidOperation):
             messages.error(request, 'Invalid input. Please enter a valid loan amount or duration.')
-            return redirect('apply_for_loan')
-    
+            return redirect('apply_loan')
+
+        if amount <= 0 or duration <= 0:
+            messages.error(request, 'Loan amount and duration must be positive.')
+            return redirect('apply_loan')
+
+        if loan_queue.has_open_application(request.user):
+            messages.error(request, 'You already have an application being reviewed.')
+            return redirect('loan_history')
+
+        # Queue for a decision; process_loan_queue workers approve or reject it
+        loan = loan_queue.enqueue(request.user, amount, duration)
+        messages.info(request, f"Application for MWK {amount:,.0f} received. We'll have a decision shortly.")
+        return redirect('loan_detail', loan_id=loan.id)
+
     accounts = MobileMoneyAccount.objects.filter(user=request.user)
     
     context = {
@@ -354,93 +344,12 @@ def score_breakdown(request):
     Show detailed breakdown of how credit score is calculated
     """
     profile = request.user.userprofile
-    current_score = CreditScoreCalculator.calculate_score(request.user)
-    
-    # Calculate each factor's contribution
-    breakdown = {
-        'base_score': 300,
-        'payment_history': 0,
-        'credit_utilization': 0,
-        'account_age': 0,
-        'social_trust': 0,
-        'savings': 0,
-        'verification': 0,
-    }
-    
-    # Payment History (35%)
-    loans = MicroLoan.objects.filter(user=request.user, status__in=['paid', 'active', 'defaulted'])
-    if loans.exists():
-        paid_loans = loans.filter(status='paid').count()
-        defaulted_loans = loans.filter(status='defaulted').count()
-        payments = LoanPayment.objects.filter(loan__user=request.user)
-        
-        if payments.exists():
-            on_time_payments = payments.filter(was_on_time=True).count()
-            on_time_rate = on_time_payments / payments.count()
-            breakdown['payment_history'] += int(on_time_rate * 200)
-        
-        breakdown['payment_history'] -= (defaulted_loans * 100)
-        breakdown['payment_history'] += (paid_loans * 20)
-    
-    # Credit Utilization (30%)
-    active_loans = MicroLoan.objects.filter(user=request.user, status='active')
-    if active_loans.exists():
-        total_borrowed = sum(loan.amount for loan in active_loans)
-        max_capacity = profile.monthly_income * 3 if profile.monthly_income else 50000
-        utilization = float(total_borrowed) / float(max_capacity)
-        
-        if utilization < 0.3:
-            breakdown['credit_utilization'] = 100
-        elif utilization < 0.5:
-            breakdown['credit_utilization'] = 50
-        elif utilization < 0.7:
-            breakdown['credit_utilization'] = 20
-    else:
-        breakdown['credit_utilization'] = 50
-    
-    # Account Age (15%)
-    account_age = (timezone.now() - profile.account_created).days
-    if account_age > 365:
-        breakdown['account_age'] = 80
-    elif account_age > 180:
-        breakdown['account_age'] = 60
-    elif account_age > 90:
-        breakdown['account_age'] = 40
-    elif account_age > 30:
-        breakdown['account_age'] = 20
-    
-    # Social Trust (10%)
-    vouches = SocialVouch.objects.filter(vouchee=request.user, is_active=True)
-    vouch_count = vouches.count()
-    
-    if vouch_count >= 5:
-        breakdown['social_trust'] = 60
-    elif vouch_count >= 3:
-        breakdown['social_trust'] = 40
-    elif vouch_count >= 1:
-        breakdown['social_trust'] = 20
-    
-    bad_vouches = SocialVouch.objects.filter(voucher=request.user, vouchee_defaulted=True).count()
-    breakdown['social_trust'] -= (bad_vouches * 30)
-    
-    # Savings (5%)
-    savings = SavingsDeposit.objects.filter(user=request.user)
-    if savings.exists():
-        total_saved = sum(s.amount for s in savings)
-        
-        if total_saved > 50000:
-            breakdown['savings'] = 50
-        elif total_saved > 20000:
-            breakdown['savings'] = 30
-        elif total_saved > 5000:
-            breakdown['savings'] = 15
-    
-    # Verification (5%)
-    if profile.is_verified:
-        breakdown['verification'] = 30
+    result = CreditScoreCalculator.get_breakdown(request.user)
+    factors = result['factors']
     
-    mobile_accounts = MobileMoneyAccount.objects.filter(user=request.user, is_verified=True)
-    breakdown['verification'] += (mobile_accounts.count() * 10)
+    # Points contributed by each factor
+    breakdown = {'base_score': result['base_score']}
+    breakdown.update({factor: data['points'] for factor, data in factors.items()})
     
     # Tips to improve
     tips = []
@@ -457,21 +366,48 @@ def score_breakdown(request):
     if not profile.is_verified:
         tips.append("Verify your phone number and ID (+30 points)")
     
-    if mobile_accounts.count() < 2:
+    if factors['verification']['inputs']['verified_mobile_count'] < 2:
         tips.append("Link your mobile money accounts (+10 points each)")
     
     context = {
-        'current_score': current_score,
+        'current_score': profile.current_credit_score,
         'breakdown': breakdown,
+        'factors': factors,
         'tips': tips,
-        'account_age_days': account_age,
-        'vouch_count': vouch_count,
-        'loan_count': loans.count() if loans.exists() else 0,
+        'account_age_days': factors['account_age']['inputs']['account_age_days'],
+        'vouch_count': factors['social_trust']['inputs']['vouch_count'],
+        'loan_count': factors['payment_history']['inputs']['loans'],
     }
     
     return render(request, 'score_breakdown.html', context)
 
 
+# ============================================
+# CREDIT SCORE HISTORY (chart data)
+# ============================================
+
+@login_required
+def score_history(request):
+    """
+    Downsampled score trajectory as JSON, e.g. ?granularity=week&days=365
+    """
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in CreditScoreHistory.GRANULARITIES:
+        return JsonResponse({'error': 'Unknown granularity.'}, status=400)
+    try:
+        days = min(max(int(request.GET.get('days', 180)), 1), 3660)
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number.'}, status=400)
+
+    series = CreditScoreHistory.series(
+        request.user, start=timezone.now() - timedelta(days=days), granularity=granularity
+    )
+    return JsonResponse({
+        'granularity': granularity,
+        'points': [{'time': when.isoformat(), 'score': score} for when, score in series],
+    })
+
+
 # ============================================
 # ALL LOANS HISTORY
 # ============================================
@@ -525,6 +461,31 @@ def loan_detail(request, loan_id):
     return render(request, 'loan_detail.html', context)
 
 
+@login_required
+def loan_status(request, loan_id):
+    """
+    Decision status of a queued application, polled by the loan page
+    """
+    loan = get_object_or_404(MicroLoan.objects.select_related('application_job'), id=loan_id, user=request.user)
+    return JsonResponse(loan_queue.status(loan))
+
+
+@staff_member_required
+def loan_queue_stats(request):
+    """
+    Queue depth and decision latency for operators
+    """
+    return JsonResponse(loan_queue.queue_stats())
+
+
+@staff_member_required
+def ml_prediction_cache_stats(request):
+    """
+    Hit/miss counters of this process's ML prediction cache
+    """
+    return JsonResponse(prediction_cache.stats())
+
+
 # ============================================
 # MAKE PAYMENT
 # ============================================
@@ -543,57 +504,22 @@ def make_payment(request, loan_id):
     if request.method == 'POST':
         try:
             amount = Decimal(request.POST.get('amount'))
-            payment_method = request.POST.get('payment_method')
-            transaction_ref = request.POST.get('transaction_reference')
-            
-            # Check savings balance
-            current_balance = SavingsDeposit.get_current_balance(request.user)
-            if amount > current_balance:
-                messages.error(request, 'Insufficient savings balance for repayment.')
-                return redirect('make_payment', loan_id=loan.id)
-            
-            # Calculate if payment is on time
-            days_from_due = (timezone.now().date() - loan.due_date).days
-            was_on_time = days_from_due <= 0
-            
-            # Create payment
-            payment = LoanPayment.objects.create(
-                loan=loan,
-                amount=amount,
-                payment_method=payment_method,
-                transaction_reference=transaction_ref,
-                was_on_time=was_on_time,
-                days_from_due=days_from_due
-            )
-            
-            # Deduct from savings
-            SavingsDeposit.objects.create(
-                user=request.user,
-                amount=-amount,
-                transaction_type='REPAYMENT_DEDUCTION',
-                balance_after=current_balance - amount
-            )
-            
-            # Update loan
-            loan.amount_paid += amount
-            if loan.amount_paid >= loan.total_amount_due:
-                loan.status = 'paid'
-                loan.paid_at = timezone.now()
-                messages.success(request, "Congratulations! Loan fully paid. Your credit score will increase!")
-            else:
-                messages.success(request, f"Payment of MWK {amount:,.0f} received.")
-            
-            loan.save()
-            
-            # Recalculate credit score
-            CreditScoreCalculator.calculate_score(request.user)
-            
-            return redirect('loan_detail', loan_id=loan.id)
-        
-        except ValueError:
+        except (TypeError, ValueError, InvalidOperation):
             messages.error(request, 'Invalid repayment amount.')
             return redirect('make_payment', loan_id=loan.id)
-    
+
+        result = LoanPaymentService.post_payment(
+            request.user, loan.id, amount,
+            payment_method=request.POST.get('payment_method'),
+            transaction_reference=request.POST.get('transaction_reference', ''),
+        )
+        if not result['success']:
+            messages.error(request, result['message'])
+            return redirect('make_payment', loan_id=loan.id)
+
+        messages.success(request, result['message'])
+        return redirect('loan_detail', loan_id=loan.id)
+
     remaining = loan.total_amount_due - loan.amount_paid
     current_balance = SavingsDeposit.get_current_balance(request.user)
     
@@ -641,8 +567,6 @@ def vouch_for_user(request):
             
             if created:
                 messages.success(request, f"You vouched for {vouchee.username}! Their credit score will increase.")
-                # Recalculate their score
-                CreditScoreCalculator.calculate_score(vouchee)
             else:
                 messages.info(request, "You already vouched for this user.")
             
@@ -673,22 +597,15 @@ def add_savings(request):
     if request.method == 'POST':
         amount = Decimal(request.POST.get('amount'))
         
-        # Get current balance
-        last_deposit = SavingsDeposit.objects.filter(user=request.user).order_by('-deposit_date').first()
-        current_balance = last_deposit.balance_after if last_deposit else Decimal('0')
-        
-        # Create deposit
+        # Create deposit (posts to the savings account and sets balance_after)
         deposit = SavingsDeposit.objects.create(
             user=request.user,
             amount=amount,
-            balance_after=current_balance + amount
+            balance_after=0  # Set from the savings account on save
         )
         
         messages.success(request, f"MWK {amount:,.0f} saved! Your credit score will improve.")
         
-        # Recalculate score
-        CreditScoreCalculator.calculate_score(request.user)
-        
         return redirect('savings_history')
     
     return render(request, 'add_savings.html')
@@ -705,12 +622,12 @@ def savings_history(request):
     """
     deposits = SavingsDeposit.objects.filter(user=request.user).order_by('-deposit_date')
     
-    total = sum(d.amount for d in deposits)
-    current_balance = deposits.first().balance_after if deposits.exists() else 0
+    # Deposits net of deductions, so the same as the balance
+    current_balance = SavingsDeposit.get_current_balance(request.user)
     
     context = {
         'deposits': deposits,
-        'total_deposits': total,
+        'total_deposits': current_balance,
         'current_balance': current_balance,
     }
     
@@ -740,7 +657,6 @@ def verify_mobile_money(request):
         
         if created:
             messages.success(request, "Mobile money account added! +10 credit score points.")
-            CreditScoreCalculator.calculate_score(request.user)
         else:
             messages.info(request, "This account is already linked.")
         
@@ -78,6 +78,28 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Loan queue workers write from several processes: take the write
+            # lock when a transaction starts and wait for it instead of failing
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # On disk rather than in memory so concurrency tests can use threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+
+# Cache
+# Per-process memory, so nothing external is needed. The dashboard cache
+# (core/dashboard_cache.py) invalidates on writes; with several processes
+# use a shared backend (FileBasedCache, Redis) so they see each other's.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cashchangu',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
     }
 }
 